@@ -2,26 +2,28 @@
     HydrogenMaser.py : get the status of the hydrogen maser
 
 Usage:
-    HydrogenMaser.py [--setting file]
+    HydrogenMaser.py [--setting file] [--follow] [--interval seconds]
 
     HydrogenMaser.py -h | --help
 
 Options:
-    --setting file  : the path to the setting file
-    -h --help       : Show this screen and exit.
+    --setting file      : the path to the setting file
+    --follow            : keep running and print each newly recorded status
+    --interval seconds  : polling interval in the follow mode [default: 10]
+    -h --help           : Show this screen and exit.
 
 """
 import dataclasses
 import sys
-from datetime import date, time, datetime
 import pathlib as p
 from typing import Dict, Any
 
 from docopt import docopt
-from schema import Schema, Or, And, Use, SchemaError
+from schema import Schema, Or, And, Use, Optional, SchemaError
 
-from VERAStatus.HydrogenMaserServer import report_parameters, get, MaserSettings, read_settings
-from VERAStatus.Utility import in_jst, Error, DataReadError, read_json
+from VERAStatus.HydrogenMaserServer import report_parameters, get_latest_status, MaserSettings, read_settings, \
+    StatusFollower
+from VERAStatus.Utility import Error, DataReadError, read_json
 
 
 def main() -> None:
@@ -33,14 +35,33 @@ def main() -> None:
         settings: MaserSettings = \
             read_settings(read_json(options.setting_file)["H_maser_settings"])
 
-        status = get(settings, in_jst(datetime.combine(date.today(), time())))
-        for param in report_parameters():
-            print(param['label'] + ':',
-                  status[-1][param['label']], param['unit'])
+        if options.follow:
+            StatusFollower(settings).follow(display_status, options.interval)
+            return
+
+        status = get_latest_status(settings)
+        if status is None:
+            raise DataReadError(f"no hydrogen maser data in {settings.data_prefix_directory}.")
+        display_status(status)
 
     except Error as e:
         print(e.args[0])
         sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+def display_status(status: Dict[str, Any]) -> None:
+    """
+    日報用パラメータの表示
+    Args:
+        status(Dict[str, Any]): 状態
+    """
+    print(status['time'])
+    for param in report_parameters():
+        print(param['label'] + ':',
+              status[param['label']], param['unit'])
+    sys.stdout.flush()
 
 
 @dataclasses.dataclass
@@ -49,6 +70,8 @@ class Options:
     オプション格納
     """
     setting_file: p.Path
+    follow: bool  # 追記を待ち続けて表示するかどうか
+    interval: float  # 追記を確かめる間隔(秒)
 
 
 def read_options() -> Options:
@@ -63,6 +86,10 @@ def read_options() -> Options:
         "--setting": Or(None, And(Use(p.Path), lambda path: path.is_file(),
                                   error=f"The specified file {args['--setting']}"
                                         + " does not exist.\n")),
+        "--follow": bool,
+        "--interval": And(Use(float), lambda interval: interval > 0.0,
+                          error=f"The specified interval {args['--interval']} is not a positive number.\n"),
+        Optional("--help"): bool,
     })
 
     try:
@@ -77,7 +104,7 @@ def read_options() -> Options:
         print(e.args[0])
         exit(1)
 
-    return Options(args["--setting"])
+    return Options(args["--setting"], args["--follow"], args["--interval"])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,215 @@
+"""
+Cacheモジュール
+
+書き込みの終わった過去の日のデータ(secZ・気象)を、
+日とデータ種別ごとにローカルディスクにキャッシュする。
+キャッシュはユーザごとの、所有者だけが読み書きできるディレクトリに置く。
+"""
+from __future__ import annotations
+__all__ = ["CacheEntry", "DayCache", "day_cache", "cached_day"]
+
+import dataclasses
+import os
+import pathlib as p
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from .Server import ServerSettings
+from .Utility import DataWriteError, cache_directory, datetime2doy_string, doy_string2datetime, dump_pickle, \
+    get_now, incremented_day, load_pickle, private_directory
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheEntry:
+    """
+    キャッシュされた1日分のデータ
+    """
+    records: Any  # パース済みのデータ
+    created: datetime  # キャッシュ作成時刻
+
+
+class DayCache:
+    """
+    日・データ種別ごとのディスクキャッシュ。
+    合計サイズが上限を超えたら最近使われていないものから消す。
+    """
+
+    def __init__(self, directory: p.Path, max_bytes: int = 64 * 1024 * 1024,
+                 closing_margin: timedelta = timedelta(hours=1), enabled: bool = True):
+        """
+        Args:
+            directory(pathlib.Path): キャッシュディレクトリ。
+                所有者だけが読み書きできるように作る。
+            max_bytes(int, optional): キャッシュの合計サイズ上限(byte)
+            closing_margin(datetime.timedelta, optional):
+                日が終わってからログが確定したとみなすまでの余裕
+            enabled(bool, optional): Falseならキャッシュを使わない
+        """
+        self.directory: p.Path = directory
+        self.max_bytes: int = max_bytes
+        self.closing_margin: timedelta = closing_margin
+        self.enabled: bool = enabled
+
+    def is_closed(self, day: datetime) -> bool:
+        """
+        その日のログの書き込みが終わっているかどうか
+        Args:
+            day(datetime.datetime): 日の任意の時刻
+
+        Returns:
+            UTCの日の終わりから余裕時間が過ぎていればTrue(bool)
+        """
+        day_start: datetime = doy_string2datetime(datetime2doy_string(day))
+        return incremented_day(day_start) + self.closing_margin <= get_now()
+
+    def path(self, server_settings: ServerSettings, day: datetime, kind: str) -> p.Path:
+        """
+        キャッシュファイルのパス
+        Args:
+            server_settings(ServerSettings): サーバ設定
+            day(datetime.datetime): 日の任意の時刻
+            kind(str): データ種別
+
+        Returns:
+            キャッシュファイルのパス(pathlib.Path)
+        """
+        return self.server_directory(server_settings) / f"{datetime2doy_string(day)}.{kind}.pickle"
+
+    def server_directory(self, server_settings: ServerSettings) -> p.Path:
+        """
+        サーバごとのキャッシュディレクトリ
+        Args:
+            server_settings(ServerSettings): サーバ設定
+
+        Returns:
+            ディレクトリのパス(pathlib.Path)
+        """
+        return self.directory / f"{server_settings.host}_{server_settings.port}"
+
+    def private_server_directory(self, server_settings: ServerSettings) -> p.Path:
+        """
+        サーバごとのキャッシュディレクトリを、所有者だけが読み書きできるように作る
+        Args:
+            server_settings(ServerSettings): サーバ設定
+
+        Returns:
+            ディレクトリのパス(pathlib.Path)
+
+        Raises:
+            DataWriteError: キャッシュディレクトリが他人の所有か、作れない
+        """
+        private_directory(self.directory)
+        return private_directory(self.server_directory(server_settings))
+
+    def load(self, server_settings: ServerSettings, day: datetime, kind: str) -> Optional[CacheEntry]:
+        """
+        キャッシュを読む。読めたら最終使用時刻を更新する。
+        Args:
+            server_settings(ServerSettings): サーバ設定
+            day(datetime.datetime): 日の任意の時刻
+            kind(str): データ種別
+
+        Returns:
+            キャッシュ(CacheEntry)。ないか壊れていればNone。
+        """
+        if not self.enabled:
+            return None
+        try:
+            self.private_server_directory(server_settings)
+        except DataWriteError:
+            return None
+        file: p.Path = self.path(server_settings, day, kind)
+        entry: Optional[CacheEntry] = load_pickle(file)
+        if not isinstance(entry, CacheEntry):
+            return None
+        try:
+            os.utime(file)
+        except OSError:
+            pass
+        return entry
+
+    def store(self, server_settings: ServerSettings, day: datetime, kind: str, records: Any) -> None:
+        """
+        キャッシュを書く。書けなかった場合はキャッシュしないだけで、
+        例外は出さない。
+        Args:
+            server_settings(ServerSettings): サーバ設定
+            day(datetime.datetime): 日の任意の時刻
+            kind(str): データ種別
+            records(Any): パース済みのデータ
+        """
+        if not self.enabled:
+            return
+        try:
+            self.private_server_directory(server_settings)
+        except DataWriteError:
+            return
+        if dump_pickle(self.path(server_settings, day, kind), CacheEntry(records, get_now())):
+            self.evict()
+
+    def invalidate(self, server_settings: ServerSettings, day: datetime) -> None:
+        """
+        1日分のキャッシュを全データ種別について消す
+        Args:
+            server_settings(ServerSettings): サーバ設定
+            day(datetime.datetime): 日の任意の時刻
+        """
+        for file in self.server_directory(server_settings).glob(f"{datetime2doy_string(day)}.*.pickle"):
+            try:
+                file.unlink()
+            except FileNotFoundError:
+                continue
+
+    def evict(self) -> None:
+        """
+        合計サイズが上限以下になるまで、最近使われていないキャッシュから消す
+        """
+        files: List[Tuple[float, int, p.Path]] = list()
+        for file in self.directory.glob("*/*.pickle"):
+            try:
+                stat: os.stat_result = file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        total_size: int = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files):
+            if total_size <= self.max_bytes:
+                return
+            try:
+                file.unlink()
+            except OSError:
+                continue
+            total_size -= size
+
+
+day_cache: DayCache = DayCache(cache_directory() / "days")  # 共有のキャッシュ
+
+
+def cached_day(server_settings: ServerSettings, day: datetime, kind: str, fetch: Callable[[], T],
+               cacheable: Callable[[T], bool] = lambda records: True) -> T:
+    """
+    書き込みの終わった日ならキャッシュから、
+    そうでなければサーバからデータを得る。
+    書き込みの終わった日のデータをサーバから得たときはキャッシュに入れる。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        day(datetime.datetime): 日の任意の時刻
+        kind(str): データ種別
+        fetch(Callable[[], T]): サーバからデータを得る関数
+        cacheable(Callable[[T], bool], optional): 得たデータをキャッシュしてよいか判定する関数。
+            取得の一部が失敗したかもしれないデータはキャッシュしない。
+
+    Returns:
+        データ(T)
+    """
+    if not day_cache.enabled or not day_cache.is_closed(day):
+        return fetch()
+    entry: Optional[CacheEntry] = day_cache.load(server_settings, day, kind)
+    if entry is not None:
+        return entry.records
+    records: T = fetch()
+    if cacheable(records):
+        day_cache.store(server_settings, day, kind, records)
+    return records
@@ -0,0 +1,299 @@
+"""
+Daemonモジュール
+
+状態の取得を定期的に走らせて最新の結果をメモリに保持し、
+ローカルのHTTP/JSON APIで提供する。
+クライアントが何人いても、サーバへの問い合わせは更新間隔ごとに1回で済む。
+"""
+from __future__ import annotations
+__all__ = ["Snapshot", "HotCache", "RefreshJob", "StatusDaemon", "to_json_value"]
+
+import dataclasses
+from datetime import date, datetime
+from email.utils import format_datetime
+import hashlib
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .Utility import get_now
+
+
+def to_json_value(value: Any) -> Any:
+    """
+    状態オブジェクトをJSONにできる値にする。
+    データクラスは辞書に、時刻はISO 8601文字列に、NumPyの値はPythonの値にする。
+    欠測のNaN(と無限大)はJSONにないのでNone(null)にする。
+    Args:
+        value(Any): 値
+
+    Returns:
+        JSONにできる値(Any)
+    """
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {field.name: to_json_value(getattr(value, field.name)) for field in dataclasses.fields(value)}
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(key): to_json_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, np.generic):
+        return to_json_value(value.item())
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """
+    If-None-MatchヘッダがETagと一致するか。RFC 9110の弱い比較で、W/の有無は問わない。
+    Args:
+        etag(str): ETag(引用符つき)
+        if_none_match(str): If-None-Matchヘッダの値
+
+    Returns:
+        "*"か、どれかのタグがETagと一致すればTrue(bool)
+    """
+    tags: List[str] = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags:
+        return True
+    opaque_tags: List[str] = [tag[2:] if tag.startswith("W/") else tag for tag in tags + [etag]]
+    return opaque_tags[-1] in opaque_tags[:-1]
+
+
+@dataclasses.dataclass(frozen=True)
+class Snapshot:
+    """
+    保持している1種類の状態
+    """
+    body: bytes  # JSON本体
+    etag: str  # 本体のハッシュから作ったETag(引用符つき)
+    modified: datetime  # 本体が最後に変わった時刻
+    refreshed: datetime  # 最後に取得に成功した時刻
+    error: Optional[str] = None  # 最後の取得が失敗していればそのメッセージ
+
+
+class HotCache:
+    """
+    名前ごとに最新の状態を保持するスレッドセーフなキャッシュ
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, Snapshot] = dict()
+        self._errors: Dict[str, Tuple[datetime, str]] = dict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def update(self, name: str, value: Any) -> Snapshot:
+        """
+        状態を更新する。JSON本体が変わらなければETagと更新時刻はそのままにする。
+        Args:
+            name(str): 状態の名前
+            value(Any): 状態
+
+        Returns:
+            更新後の状態(Snapshot)
+        """
+        body: bytes = json.dumps(to_json_value(value), ensure_ascii=False, sort_keys=True,
+                                 allow_nan=False).encode("utf-8")
+        etag: str = f'"{hashlib.sha1(body).hexdigest()}"'
+        now: datetime = get_now()
+        with self._lock:
+            previous: Optional[Snapshot] = self._snapshots.get(name)
+            modified: datetime = now if previous is None or previous.etag != etag else previous.modified
+            snapshot: Snapshot = Snapshot(body, etag, modified, now)
+            self._snapshots[name] = snapshot
+            self._errors.pop(name, None)
+        return snapshot
+
+    def fail(self, name: str, message: str) -> None:
+        """
+        取得の失敗を記録する。保持している状態はそのまま提供し続ける。
+        Args:
+            name(str): 状態の名前
+            message(str): エラーメッセージ
+        """
+        with self._lock:
+            self._errors[name] = (get_now(), message)
+
+    def get(self, name: str) -> Optional[Snapshot]:
+        """
+        状態を得る
+        Args:
+            name(str): 状態の名前
+
+        Returns:
+            状態(Snapshot)。まだ取得に成功していなければNone。
+            最後の取得が失敗していればエラーメッセージつき。
+        """
+        with self._lock:
+            snapshot: Optional[Snapshot] = self._snapshots.get(name)
+            error: Optional[Tuple[datetime, str]] = self._errors.get(name)
+        if snapshot is None or error is None:
+            return snapshot
+        return dataclasses.replace(snapshot, error=error[1])
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        保持している状態の一覧
+        Returns:
+            名前ごとのETag・更新時刻・エラー(Dict[str, Dict[str, Any]])
+        """
+        with self._lock:
+            names: List[str] = sorted(set(self._snapshots) | set(self._errors))
+            return {name: {
+                "etag": self._snapshots[name].etag if name in self._snapshots else None,
+                "modified": self._snapshots[name].modified.isoformat() if name in self._snapshots else None,
+                "refreshed": self._snapshots[name].refreshed.isoformat() if name in self._snapshots else None,
+                "error": self._errors[name][1] if name in self._errors else None,
+            } for name in names}
+
+
+@dataclasses.dataclass(frozen=True)
+class RefreshJob:
+    """
+    定期的に走らせる状態の取得
+    """
+    name: str  # 状態の名前(APIのパス /status/<name>)
+    fetch: Callable[[], Any]  # 状態を取得する関数
+    interval: float  # 取得の間隔(秒)
+
+
+class StatusDaemon:
+    """
+    取得ジョブを定期的に走らせ、結果をHTTP/JSON APIで提供するデーモン。
+
+    GET /status/<name> で最新の状態を返し、If-None-MatchがETagと一致すれば304を返す。
+    GET /status で保持している状態の一覧を返す。
+    """
+
+    def __init__(self, jobs: List[RefreshJob], host: str = "127.0.0.1", port: int = 8080):
+        """
+        Args:
+            jobs(List[RefreshJob]): 取得ジョブ
+            host(str, optional): 待ち受けアドレス
+            port(int, optional): 待ち受けポート。0なら空いているポート。
+        """
+        self.jobs: List[RefreshJob] = jobs
+        self.cache: HotCache = HotCache()
+        self._stop: threading.Event = threading.Event()
+        self._threads: List[threading.Thread] = list()
+        self.server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), status_request_handler(self.cache))
+        self.server.daemon_threads = True
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """
+        待ち受けアドレスとポート
+        """
+        return self.server.server_address[:2]
+
+    def refresh(self, job: RefreshJob) -> None:
+        """
+        ジョブを1回走らせて結果をキャッシュに入れる。
+        失敗は記録だけして例外は出さない。
+        Args:
+            job(RefreshJob): 取得ジョブ
+        """
+        try:
+            self.cache.update(job.name, job.fetch())
+        except Exception as e:
+            self.cache.fail(job.name, f"{type(e).__name__}: {e.args[0] if len(e.args) > 0 else e}")
+
+    def run_job(self, job: RefreshJob) -> None:
+        """
+        停止されるまで、間隔ごとにジョブを走らせる
+        Args:
+            job(RefreshJob): 取得ジョブ
+        """
+        while not self._stop.is_set():
+            self.refresh(job)
+            self._stop.wait(job.interval)
+
+    def start(self) -> None:
+        """
+        取得ジョブとHTTPサーバをそれぞれのスレッドで開始する
+        """
+        self._threads = [threading.Thread(target=self.run_job, args=(job,), name=f"refresh-{job.name}",
+                                          daemon=True) for job in self.jobs]
+        self._threads.append(threading.Thread(target=self.server.serve_forever, name="http", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """
+        取得ジョブとHTTPサーバを止める
+        """
+        self._stop.set()
+        self.server.shutdown()
+        self.server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=10.0)
+
+    def serve_forever(self) -> None:
+        """
+        開始して、割り込まれるまで待つ
+        """
+        self.start()
+        try:
+            self._stop.wait()
+        finally:
+            self.stop()
+
+
+def status_request_handler(cache: HotCache) -> type:
+    """
+    キャッシュの状態を返すHTTPリクエストハンドラのクラス
+    Args:
+        cache(HotCache): 状態のキャッシュ
+
+    Returns:
+        リクエストハンドラのクラス(type)
+    """
+
+    class StatusRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            path: str = self.path.split("?")[0].rstrip("/")
+            if path in ("", "/status"):
+                self.send_json(HTTPStatus.OK, json.dumps(cache.summary(), sort_keys=True).encode("utf-8"))
+                return
+            if not path.startswith("/status/"):
+                self.send_json(HTTPStatus.NOT_FOUND, b'{"error": "not found"}')
+                return
+            snapshot: Optional[Snapshot] = cache.get(path[len("/status/"):])
+            if snapshot is None:
+                self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, b'{"error": "not available yet"}')
+                return
+            headers: Dict[str, str] = {"ETag": snapshot.etag,
+                                       "Last-Modified": format_datetime(snapshot.modified, usegmt=True),
+                                       "Cache-Control": "no-cache"}
+            if snapshot.error is not None:
+                error: str = snapshot.error.replace('"', "'").replace("\n", " ")
+                headers["Warning"] = f'110 - "{error.encode("latin-1", errors="replace").decode("latin-1")}"'
+            if etag_matches(snapshot.etag, self.headers.get("If-None-Match", "")):
+                self.send_json(HTTPStatus.NOT_MODIFIED, None, headers)
+                return
+            self.send_json(HTTPStatus.OK, snapshot.body, headers)
+
+        def send_json(self, status: HTTPStatus, body: Optional[bytes], headers: Optional[Dict[str, str]] = None
+                      ) -> None:
+            self.send_response(status)
+            for key, value in (headers or dict()).items():
+                self.send_header(key, value)
+            if body is None:
+                self.end_headers()
+                return
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format_str: str, *args: Any) -> None:
+            pass
+
+    return StatusRequestHandler
@@ -1,20 +1,65 @@
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 import dataclasses
+import hashlib
 import os
 import pathlib as p
+import tempfile
+import threading
 import datetime as d
-from typing import Dict, Any
+import time
+from functools import partial, lru_cache
+from itertools import chain
+from typing import Dict, Any, List, Callable, Optional, Tuple
 
-from .Utility import in_jst, round_float, Torr2PaCoefficient
+import numpy as np
+
+from .Utility import in_jst, round_array, get_now, Torr2PaCoefficient, JST, UTC, \
+    string_digits, digits2number, cache_directory, private_directory, load_pickle, dump_pickle, DataWriteError
 
 
 @dataclasses.dataclass
 class MaserSettings:
     data_prefix_directory: p.Path
+    # ファイルカタログの保存先。Noneならユーザごとのキャッシュディレクトリ。
+    catalog_file: Optional[p.Path] = None
+    # バイナリアーカイブの保存先。Noneならユーザごとのキャッシュディレクトリ。
+    archive_directory: Optional[p.Path] = None
 
 
 def read_settings(settings_dict: Dict[str, Any]) -> MaserSettings:
+    catalog_file = settings_dict.get("catalog_file")
+    archive_directory = settings_dict.get("archive_directory")
     return MaserSettings(
-        p.Path(settings_dict[os.name]["os_root"]) / settings_dict["data_prefix_directory"])
+        p.Path(settings_dict[os.name]["os_root"]) / settings_dict["data_prefix_directory"],
+        None if catalog_file is None else p.Path(catalog_file),
+        None if archive_directory is None else p.Path(archive_directory))
+
+
+def data_key(settings: MaserSettings):
+    # データディレクトリごとにキャッシュを分けるための名前
+    return hashlib.sha1(str(settings.data_prefix_directory.resolve()).encode()).hexdigest()[:16]
+
+
+def maser_cache_file(settings: MaserSettings, name, create=True):
+    # 所有者だけが読み書きできるキャッシュディレクトリ中のパス。使えなければNone。
+    # createがFalseなら、キャッシュディレクトリがまだないときは作らずにNone。
+    directory = cache_directory() / 'maser'
+    if not create and not directory.is_dir():
+        return None
+    try:
+        return private_directory(directory) / f"{name}_{data_key(settings)}"
+    except DataWriteError:
+        return None
+
+
+def archive_directory(settings: MaserSettings, create=False):
+    # アーカイブはデータファイルの隣には置かず、
+    # 指定がなければキャッシュディレクトリに置く。
+    # 読むだけのときはキャッシュディレクトリを作らない。
+    if settings.archive_directory is not None:
+        return settings.archive_directory
+    return maser_cache_file(settings, 'archive', create)
 
 
 def status_parameters():
@@ -83,85 +128,633 @@ def status_parameters():
     ]
 
 
-def data_file_paths(settings: MaserSettings):
-    directories = settings.data_prefix_directory.glob(r"*")
-    return sum([directory.glob(r"hm_only_mdata*.txt")
-                for directory in directories], [])
+@lru_cache(maxsize=64)
+def jst_day_base(year, month, day):
+    return d.datetime(year, month, day, tzinfo=JST)
+
+
+def maser_time2datetime(year, month_day_hour_minute, ten_seconds):
+    # year: 西暦の下2桁, month_day_hour_minute: MMDDhhmm, ten_seconds: 10秒単位の秒
+    return jst_day_base(2000 + int(year), int(month_day_hour_minute[0:2]), int(month_day_hour_minute[2:4])) \
+        .replace(hour=int(month_day_hour_minute[4:6]), minute=int(month_day_hour_minute[6:8]),
+                 second=int(ten_seconds) * 10)
 
 
 def file_name2_date_from(file_name):
-    date = in_jst(
-        d.datetime.strptime('20' + file_name[13:23] + '00',
-                            '%Y%m%d%H%M%S'))
-    date += d.timedelta(seconds=int(file_name[23]) * 10)
-    return date
+    return maser_time2datetime(file_name[13:15], file_name[15:23], file_name[23])
 
 
-def data_file_info(settings: MaserSettings):
-    paths = data_file_paths(settings)
-    dates = [file_name2_date_from(os.path.basename(file_path))
-             for file_path in paths]
-    paths_dates = [{'path': path, 'date_from': date_from}
-                   for path, date_from in zip(paths, dates)]
-    sorted_path_dates = sorted(paths_dates, key=lambda x: x['date_from'])
-    for index, file_info in enumerate(sorted_path_dates[:-1]):
-        file_info['date_until'] = sorted_path_dates[index + 1]['date_from']
-    sorted_path_dates[-1]['date_until'] = \
-        in_jst(d.datetime.now())
-    return sorted_path_dates
+class FileCatalog:
+    # データファイルの開始時刻順の一覧。
+    # サブディレクトリの最終更新時刻を覚えておき、
+    # 変わったディレクトリだけ読み直す。
+    def __init__(self, settings: MaserSettings):
+        self.settings = settings
+        self.directories: Dict[str, Tuple[int, List[Tuple[str, d.datetime]]]] = {}
+        self.date_from: List[d.datetime] = []
+        self.paths: List[p.Path] = []
+        self.lock = threading.Lock()
+        self.load()
+
+    def catalog_file(self) -> Optional[p.Path]:
+        # 既定の保存先は、所有者だけが読み書きできるキャッシュディレクトリ。
+        # 使えなければNone(保存しない)。
+        if self.settings.catalog_file is not None:
+            return self.settings.catalog_file
+        catalog_file = maser_cache_file(self.settings, 'catalog')
+        return None if catalog_file is None else catalog_file.with_suffix('.pickle')
+
+    def load(self):
+        catalog_file = self.catalog_file()
+        directories = None if catalog_file is None else load_pickle(catalog_file)
+        self.directories = directories if isinstance(directories, dict) else {}
+        self.build_index()
+
+    def save(self):
+        catalog_file = self.catalog_file()
+        if catalog_file is not None:
+            dump_pickle(catalog_file, self.directories)
+
+    def refresh(self) -> 'FileCatalog':
+        with self.lock:
+            directories = {}
+            changed = False
+            try:
+                entries = [entry for entry in os.scandir(self.settings.data_prefix_directory) if entry.is_dir()]
+            except OSError:
+                entries = []
+            for entry in entries:
+                mtime = entry.stat().st_mtime_ns
+                cached = self.directories.get(entry.name)
+                if cached is not None and cached[0] == mtime:
+                    directories[entry.name] = cached
+                    continue
+                directories[entry.name] = (mtime, scan_directory(p.Path(entry.path)))
+                changed = True
+            if changed or directories.keys() != self.directories.keys():
+                self.directories = directories
+                self.build_index()
+                self.save()
+        return self
+
+    def build_index(self):
+        files = sorted((date_from, self.settings.data_prefix_directory / directory / name)
+                       for directory, (_, directory_files) in self.directories.items()
+                       for name, date_from in directory_files)
+        self.date_from = [date_from for date_from, _ in files]
+        self.paths = [path for _, path in files]
 
+    def files_between(self, date_from, date_until) -> List[p.Path]:
+        # ファイルの期間は次のファイルの開始時刻まで(最新のファイルは現在まで)
+        if len(self.paths) == 0 or date_from > in_jst(get_now()):
+            return []
+        first = max(bisect_left(self.date_from, date_from) - 1, 0)
+        last = bisect_left(self.date_from, date_until)
+        return self.paths[first:last]
 
-def data_files(file_info_list, date_from, date_until):
-    return [file_info['path'] for file_info in file_info_list
-            if date_from <= file_info['date_until']
-            and date_until > file_info['date_from']]
+    def latest(self) -> Optional[p.Path]:
+        return self.paths[-1] if len(self.paths) > 0 else None
+
+    def file_info(self) -> List[Dict[str, Any]]:
+        date_until = self.date_from[1:] + [in_jst(get_now())]
+        return [{'path': path, 'date_from': date_from, 'date_until': until}
+                for path, date_from, until in zip(self.paths, self.date_from, date_until)]
+
+
+def scan_directory(directory: p.Path) -> List[Tuple[str, d.datetime]]:
+    return [(path.name, file_name2_date_from(path.name)) for path in directory.glob(r"hm_only_mdata*.txt")]
+
+
+file_catalogs: Dict[p.Path, FileCatalog] = {}
+
+
+def file_catalog(settings: MaserSettings) -> FileCatalog:
+    if settings.data_prefix_directory not in file_catalogs:
+        file_catalogs[settings.data_prefix_directory] = FileCatalog(settings)
+    return file_catalogs[settings.data_prefix_directory].refresh()
+
+
+def data_file_info(settings: MaserSettings):
+    return file_catalog(settings).file_info()
 
 
 def line2status(line):
     cols = [value_string.strip() for value_string in line.strip().split("\t")]
-    parameters = status_parameters()
     status = {}
-    for param, col in zip(parameters, cols):
+    value_params = []
+    values = []
+    for param, col in zip(status_parameters(), cols):
         if param['label'] == 'time':
-            status[param['label']] = in_jst(
-                d.datetime.strptime(
-                    '20' + col[0] + col[2:11] + '00',
-                    '%Y%m%d%H%M%S'))
-            status[param['label']] += d.timedelta(
-                seconds=int(col[11]) * 10)
+            status[param['label']] = maser_time2datetime(col[0] + col[2], col[3:11], col[11])
             continue
+        value_params.append(param)
         if param['label'] == 'H_pressure_cell':
-            status[param['label']] = round_float(
-                float(col) * 0.001 * Torr2PaCoefficient, param['accuracy'])
+            values.append(float(col) * 0.001 * Torr2PaCoefficient)
             continue
-        status[param['label']] = round_float(col, param['accuracy'])
-    return status
+        values.append(float(col))
+    # 1行の全パラメータを、それぞれの桁でまとめて丸める
+    rounded = round_array(values, np.array([param['accuracy'] for param in value_params], dtype=np.int64))
+    for param, value in zip(value_params, rounded.tolist()):
+        status[param['label']] = int(value) if param['accuracy'] >= 0 else value
+    return {param['label']: status[param['label']] for param in status_parameters() if param['label'] in status}
 
 
-def get(settings: MaserSettings, date_from, date_until=in_jst(d.datetime.now())):
+def get(settings: MaserSettings, date_from, date_until=None):
+    if date_until is None:
+        date_until = in_jst(get_now())
     return get_status(settings, date_from, date_until)
 
 
-def read(path, date_from, date_until, step_interval):
+def read(path, date_from, date_until, step_interval, archive_directory=None):
+    columns = read_columns_between(path, date_from, date_until, archive_directory)
+    return columns.decimated(step_interval).to_status_list()
+
+
+def line2time(line):
+    # line2statusの'time'と同じ値を、時刻列だけを見て得る。時刻が読めない行ならNone。
+    cols = line.split('\t')
+    if len(cols) < 2:
+        return None
+    col = cols[1].strip()
+    if len(col) != 12:
+        return None
+    try:
+        return maser_time2datetime(col[0] + col[2], col[3:11], col[11])
+    except ValueError:
+        return None
+
+
+def line_start_after(f, position):
+    # position以降で最初の行頭のオフセット
+    if position == 0:
+        return 0
+    f.seek(position - 1)
+    f.readline()
+    return f.tell()
+
+
+def time_after(f, offset, limit):
+    # offsetからlimitまでで、時刻の読める最初の行の時刻と行頭のオフセット。
+    # なければ(None, limit)。
+    f.seek(offset)
+    while offset < limit:
+        date_time = line2time(f.readline().decode('ascii', errors='ignore'))
+        if date_time is not None:
+            return date_time, offset
+        offset = f.tell()
+    return None, limit
+
+
+def seek_time(f, date_time, file_size, linear_scan_bytes=4096):
+    # 時刻順に並んだファイルで、date_time以降の最初の行頭のオフセットを二分探索する。
+    # 時刻の読めない行は飛ばす。
+    # highからfound_offsetまでは時刻の読めない行だけ
+    low, high, found_offset = 0, file_size, file_size
+    while high - low > linear_scan_bytes:
+        probe = line_start_after(f, (low + high) // 2)
+        if probe >= high:
+            break
+        probe_time, offset = time_after(f, probe, high)
+        if probe_time is not None and probe_time < date_time:
+            low = offset
+            continue
+        high = probe
+        if probe_time is not None:
+            found_offset = offset
+    f.seek(low)
+    while f.tell() < high:
+        offset = f.tell()
+        line_time = line2time(f.readline().decode('ascii', errors='ignore'))
+        if line_time is not None and line_time >= date_time:
+            return offset
+    return found_offset
+
+
+def read_lines_between(path, date_from, date_until):
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        offset_from = seek_time(f, date_from, file_size)
+        offset_until = seek_time(f, date_until, file_size)
+        if offset_until <= offset_from:
+            return []
+        f.seek(offset_from)
+        return f.read(offset_until - offset_from).decode('ascii', errors='ignore').splitlines()
+
+
+def read_last_line(path, block_size=4096):
+    # 改行で終わった行のうち、lines2columnsが捨てない最後の行。
+    # 改行のない末尾は書き込み中の行かもしれないので使わない。
+    with open(path, 'rb') as f:
+        position = os.fstat(f.fileno()).st_size
+        tail = b''
+        terminated = False
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + tail).split(b'\n')
+            if not terminated:
+                if len(lines) == 1:
+                    tail = lines[0]
+                    continue
+                lines, terminated = lines[:-1], True
+            # 先頭の断片は、ファイルの先頭まで読むまで行の途中かもしれない
+            for line in reversed(lines if position == 0 else lines[1:]):
+                text = line.decode('ascii', errors='ignore').rstrip('\r')
+                if len(lines2columns([text])) > 0:
+                    return text
+            tail = lines[0]
+        return None
+
+
+def get_latest_status(settings: MaserSettings):
+    for path in reversed(file_catalog(settings).paths):
+        line = read_last_line(path)
+        if line is not None:
+            return line2status(line)
+    return None
+
+
+@dataclasses.dataclass
+class StatusColumns:
+    # status_parameters()のラベルごとの配列。'time'はUTCのdatetime64[s]。
+    columns: Dict[str, np.ndarray]
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def select(self, index) -> 'StatusColumns':
+        return StatusColumns({label: column[index] for label, column in self.columns.items()})
+
+    def decimated(self, step_interval) -> 'StatusColumns':
+        return self.select(slice(None, None, step_interval))
+
+    def to_status_list(self) -> List[Dict[str, Any]]:
+        labels = list(self.columns.keys())
+        values = [datetime642jst_list(column) if label == 'time' else column.tolist()
+                  for label, column in self.columns.items()]
+        return [dict(zip(labels, row)) for row in zip(*values)]
+
+
+def empty_columns():
+    return StatusColumns(
+        {param['label']: np.array([], dtype='datetime64[s]') if param['label'] == 'time'
+         else np.array([], dtype=np.int64 if param['accuracy'] >= 0 else np.float64)
+         for param in status_parameters()})
+
+
+def datetime2datetime64(date_time):
+    return np.datetime64(date_time.astimezone(UTC).replace(tzinfo=None), 's')
+
+
+def datetime642jst_list(times):
+    return [date_time.replace(tzinfo=UTC).astimezone(JST) for date_time in times.astype(d.datetime).tolist()]
+
+
+def decode_time_column(time_strings):
+    # line2statusの時刻列の一括変換。
+    # 時刻列は年の十の位・1文字・年の一の位・月日時分・10秒単位の秒。
+    # 時刻と、line2statusが変換できる時刻文字列かどうかの配列を返す。
+    strings = np.char.strip(np.asarray(time_strings, dtype='U13'))
+    digits = string_digits(strings.astype('U12'), 12)
+    years = 2000 + digits[:, 0] * 10 + digits[:, 2]
+    months = digits2number(digits, 3, 5)
+    days = digits2number(digits, 5, 7)
+    hours = digits2number(digits, 7, 9)
+    minutes = digits2number(digits, 9, 11)
+    valid = (np.char.str_len(strings) == 12) \
+        & np.all((0 <= digits[:, [0, 2] + list(range(3, 12))]) & (digits[:, [0, 2] + list(range(3, 12))] <= 9),
+                 axis=1) \
+        & (1 <= months) & (months <= 12) & (1 <= days) & (hours < 24) & (minutes < 60) & (digits[:, 11] < 6)
+    months = np.where(valid, months, 1)
+    days = np.where(valid, days, 1)
+    month_starts = (years - 1970).astype('datetime64[Y]').astype('datetime64[M]') \
+        + (months - 1).astype('timedelta64[M]')
+    dates = month_starts.astype('datetime64[D]') + (days - 1).astype('timedelta64[D]')
+    valid &= dates.astype('datetime64[M]') == month_starts
+    seconds = hours * 3600 + minutes * 60 + digits[:, 11] * 10
+    wall_times = dates.astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+    return wall_times - np.timedelta64(9, 'h'), valid
+
+
+def decode_float_column(value_strings):
+    # 数値の列の一括変換。数値と、floatにできる文字列かどうかの配列を返す。
+    strings = np.char.strip(np.asarray(value_strings))
+    try:
+        return strings.astype(np.float64), np.ones(len(strings), dtype=bool)
+    except ValueError:
+        pass
+    values = np.full(len(strings), np.nan)
+    valid = np.zeros(len(strings), dtype=bool)
+    for index, string in enumerate(strings.tolist()):
+        try:
+            values[index] = float(string)
+            valid[index] = True
+        except ValueError:
+            continue
+    return values, valid
+
+
+def lines2columns(lines):
+    # 列が足りない行と、時刻や数値が読めない行は捨てる
+    parameters = status_parameters()
+    width = len(parameters)
+    rows = [cols[:width] for cols in (line.rstrip('\r\n').split('\t') for line in lines if line.strip() != '')
+            if len(cols) >= width]
+    if len(rows) == 0:
+        return empty_columns()
+    columns = {}
+    valid = np.ones(len(rows), dtype=bool)
+    for param, column in zip(parameters, zip(*rows)):
+        values, column_valid = \
+            decode_time_column(column) if param['label'] == 'time' else decode_float_column(column)
+        columns[param['label']] = values
+        valid &= column_valid
+    for param in parameters:
+        values = columns[param['label']][valid]
+        if param['label'] != 'time':
+            if param['label'] == 'H_pressure_cell':
+                values = values * 0.001 * Torr2PaCoefficient
+            values = round_array(values, param['accuracy'])
+        columns[param['label']] = values
+    return StatusColumns(columns)
+
+
+def read_columns(path):
     with open(path, 'r') as f:
-        lines = f.readlines()
-        status_list = []
-        for index, line in enumerate(lines):
-            if index % step_interval == 0:
-                status = line2status(line)
-                if date_from <= status['time'] < date_until:
-                    status_list.append(status)
-        return status_list
+        return lines2columns(f.readlines())
+
+
+def concatenate_columns(columns_list):
+    if len(columns_list) == 0:
+        return empty_columns()
+    return StatusColumns({label: np.concatenate([columns.columns[label] for columns in columns_list])
+                          for label in columns_list[0].columns})
+
+
+def read_columns_between(path, date_from, date_until, archive_directory=None):
+    archive = None if archive_directory is None else archive_path(path, archive_directory)
+    if archive is not None and is_archive_up_to_date(path, archive):
+        return read_archive_between(archive, date_from, date_until)
+    return lines2columns(read_lines_between(path, date_from, date_until))
+
+
+def archive_dtype():
+    # 'time'はUNIX時刻(秒)、整数に丸めるパラメータはint64、それ以外はfloat32
+    return np.dtype([(param['label'], np.int64 if param['label'] == 'time' or param['accuracy'] >= 0
+                      else np.float32)
+                     for param in status_parameters()])
+
+
+def archive_path(path, archive_directory):
+    path = p.Path(path)
+    return p.Path(archive_directory) / path.parent.name / (path.stem + '.npy')
+
+
+def is_archive_up_to_date(path, archive):
+    try:
+        return os.path.getmtime(archive) >= os.path.getmtime(path)
+    except OSError:
+        return False
+
+
+def write_archive(path, archive):
+    columns = read_columns(path)
+    records = np.empty(len(columns), dtype=archive_dtype())
+    for label, column in columns.columns.items():
+        records[label] = column.astype(np.int64) if label == 'time' else column
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    # 同じディレクトリの一意な一時ファイルに書いてから置き換える
+    with tempfile.NamedTemporaryFile(dir=archive.parent, prefix=archive.stem, suffix='.npy',
+                                     delete=False) as f:
+        temporary_file = f.name
+    try:
+        np.save(temporary_file, records)
+        os.replace(temporary_file, archive)
+    except BaseException:
+        os.unlink(temporary_file)
+        raise
+
+
+def read_archive_between(archive, date_from, date_until):
+    # メモリマップした配列の時刻列を二分探索して範囲を切り出す。
+    # float32の列は元の桁で丸め直す。
+    records = np.load(archive, mmap_mode='r')
+    times = records['time']
+    first = np.searchsorted(times, datetime2datetime64(date_from).astype(np.int64), side='left')
+    last = np.searchsorted(times, datetime2datetime64(date_until).astype(np.int64), side='left')
+    selected = records[first:last]
+    columns = {}
+    for param in status_parameters():
+        column = selected[param['label']]
+        if param['label'] == 'time':
+            columns['time'] = column.astype('datetime64[s]')
+        elif param['accuracy'] >= 0:
+            columns[param['label']] = np.array(column)
+        else:
+            columns[param['label']] = round_array(column.astype(np.float64), param['accuracy'])
+    return StatusColumns(columns)
+
+
+def convert_archives(settings: MaserSettings, include_latest=False):
+    # 古くなったか、まだないアーカイブを作る。
+    # 書き込み中の最新ファイルは既定では変換しない。
+    directory = archive_directory(settings, create=True)
+    if directory is None:
+        raise DataWriteError("no private directory for the archives")
+    paths = file_catalog(settings).paths
+    if not include_latest:
+        paths = paths[:-1]
+    converted = []
+    for path in paths:
+        archive = archive_path(path, directory)
+        if not is_archive_up_to_date(path, archive):
+            write_archive(path, archive)
+            converted.append(archive)
+    return converted
+
+
+def map_files(function, file_paths, processes=None):
+    # processesが2以上で複数ファイルあれば、ファイルごとにプロセスプールで処理する。
+    # 結果はファイル順。
+    if processes is None or processes <= 1 or len(file_paths) <= 1:
+        return [function(path) for path in file_paths]
+    with ProcessPoolExecutor(max_workers=min(processes, len(file_paths))) as executor:
+        return list(executor.map(function, file_paths))
+
+
+def get_status_columns(settings: MaserSettings, date_from, date_until, processes=None):
+    file_paths = file_catalog(settings).files_between(date_from, date_until)
+    return concatenate_columns(map_files(
+        partial(read_columns_between, date_from=date_from, date_until=date_until,
+                archive_directory=archive_directory(settings)), file_paths, processes))
 
 
-def get_status(settings: MaserSettings, date_from, date_until, step_interval=10):
-    file_paths = data_files(data_file_info(settings), date_from, date_until)
-    return sum([read(path, date_from, date_until, step_interval)
-                for path in file_paths], [])
+def get_status(settings: MaserSettings, date_from, date_until, step_interval=10, processes=None):
+    file_paths = file_catalog(settings).files_between(date_from, date_until)
+    if processes is None or processes <= 1:
+        return list(chain.from_iterable(read(path, date_from, date_until, step_interval,
+                                             archive_directory(settings))
+                                        for path in file_paths))
+    # ワーカーからは辞書でなく配列で受け取り、まとめて辞書リストにする
+    columns_list = map_files(partial(read_columns_between, date_from=date_from, date_until=date_until,
+                                     archive_directory=archive_directory(settings)),
+                             file_paths, processes)
+    return list(chain.from_iterable(columns.decimated(step_interval).to_status_list()
+                                    for columns in columns_list))
+
+
+@dataclasses.dataclass
+class StatusAggregate:
+    # 時間窓ごとの集計。'time'以外のラベルごとの配列を持つ。
+    bucket_start: np.ndarray  # 窓の開始時刻(UTCのdatetime64[s])
+    count: np.ndarray  # 窓内のデータ数
+    minimum: Dict[str, np.ndarray]
+    maximum: Dict[str, np.ndarray]
+    total: Dict[str, np.ndarray]
+    last: Dict[str, np.ndarray]
+
+    def __len__(self):
+        return len(self.bucket_start)
+
+    def mean(self, label):
+        return self.total[label] / self.count
+
+    def to_status_list(self) -> List[Dict[str, Any]]:
+        labels = list(self.minimum.keys())
+        values = [{'min': self.minimum[label].tolist(), 'max': self.maximum[label].tolist(),
+                   'mean': self.mean(label).tolist(), 'last': self.last[label].tolist()}
+                  for label in labels]
+        return [dict([('time', bucket_start), ('count', count)]
+                     + [(label, {key: value[index] for key, value in label_values.items()})
+                        for label, label_values in zip(labels, values)])
+                for index, (bucket_start, count)
+                in enumerate(zip(datetime642jst_list(self.bucket_start), self.count.tolist()))]
+
+
+def reduce_buckets(bucket_start, count, minimum, maximum, total, last):
+    # 時刻順に並んだ窓の開始時刻が同じ要素どうしをまとめる
+    if len(bucket_start) == 0:
+        return StatusAggregate(bucket_start, count, minimum, maximum, total, last)
+    starts = np.flatnonzero(np.r_[True, bucket_start[1:] != bucket_start[:-1]])
+    ends = np.r_[starts[1:], len(bucket_start)] - 1
+    return StatusAggregate(
+        bucket_start[starts], np.add.reduceat(count, starts),
+        {label: np.minimum.reduceat(values, starts) for label, values in minimum.items()},
+        {label: np.maximum.reduceat(values, starts) for label, values in maximum.items()},
+        {label: np.add.reduceat(values, starts) for label, values in total.items()},
+        {label: values[ends] for label, values in last.items()})
+
+
+def aggregate_columns(columns: StatusColumns, window: d.timedelta) -> StatusAggregate:
+    window_seconds = int(window.total_seconds())
+    times = columns.columns['time'].astype(np.int64)
+    bucket_start = (times - times % window_seconds).astype('datetime64[s]')
+    values = {label: column.astype(np.float64) for label, column in columns.columns.items() if label != 'time'}
+    return reduce_buckets(bucket_start, np.ones(len(times), dtype=np.int64), values, values, values, values)
+
+
+def merge_aggregates(aggregates) -> StatusAggregate:
+    if len(aggregates) == 0:
+        return aggregate_columns(empty_columns(), d.timedelta(seconds=1))
+
+    def concatenate(name):
+        return {label: np.concatenate([getattr(aggregate, name)[label] for aggregate in aggregates])
+                for label in aggregates[0].minimum}
+
+    return reduce_buckets(np.concatenate([aggregate.bucket_start for aggregate in aggregates]),
+                          np.concatenate([aggregate.count for aggregate in aggregates]),
+                          concatenate('minimum'), concatenate('maximum'), concatenate('total'),
+                          concatenate('last'))
+
+
+def aggregate_file(path, date_from, date_until, window, archive_directory=None):
+    return aggregate_columns(read_columns_between(path, date_from, date_until, archive_directory), window)
+
+
+def get_status_aggregate(settings: MaserSettings, date_from, date_until,
+                         window=d.timedelta(minutes=10), processes=None) -> StatusAggregate:
+    # ファイルごとに集計してから併合するので、
+    # 一度に持つ生データは1ファイル分の範囲だけ
+    file_paths = file_catalog(settings).files_between(date_from, date_until)
+    return merge_aggregates(map_files(
+        partial(aggregate_file, date_from=date_from, date_until=date_until, window=window,
+                archive_directory=archive_directory(settings)),
+        file_paths, processes))
+
+
+def last_line_end(path, size, block_size=4096):
+    # size以前で最後の改行の次のオフセット。改行がなければ0。
+    with open(path, 'rb') as f:
+        position = size
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            index = f.read(read_size).rfind(b'\n')
+            if index >= 0:
+                return position + index + 1
+        return 0
+
+
+def latest_data_file(settings: MaserSettings):
+    return file_catalog(settings).latest()
+
+
+class StatusFollower:
+    # 最新のデータファイルに追記される行だけを読み、
+    # 新しいファイルができたら乗り換える
+    def __init__(self, settings: MaserSettings, from_beginning=False):
+        self.settings = settings
+        self.path = latest_data_file(settings)
+        self.offset = 0
+        self.partial_line = b''
+        if self.path is not None and not from_beginning:
+            # 書きかけの行の途中からは読まない
+            self.offset = last_line_end(self.path, os.path.getsize(self.path))
+
+    def poll(self) -> List[Dict[str, Any]]:
+        if self.path is None:
+            self.path = latest_data_file(self.settings)
+            if self.path is None:
+                return []
+        status_list = self.read_appended()
+        if len(status_list) > 0:
+            return status_list
+        # 追記がないときだけ、ファイルの切り替わりを確かめる
+        latest_path = latest_data_file(self.settings)
+        if latest_path is None or latest_path == self.path:
+            return status_list
+        # 古いファイルの改行のない末尾は書きかけの行なので捨てる
+        status_list = self.read_appended()
+        self.path, self.offset, self.partial_line = latest_path, 0, b''
+        return status_list + self.read_appended()
+
+    def read_appended(self) -> List[Dict[str, Any]]:
+        # 改行で終わった行だけを変換し、列が足りない行や読めない行は捨てる。
+        # 変換し終えてから読み出し位置を進める。
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []
+        offset, partial_line = (0, b'') if size < self.offset else (self.offset, self.partial_line)
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            lines = (partial_line + f.read(size - offset)).split(b'\n')
+        status_list = lines2columns([line.decode('ascii', errors='ignore') for line in lines[:-1]]).to_status_list()
+        self.offset, self.partial_line = size, lines[-1]
+        return status_list
+
+    def follow(self, callback: Callable[[Dict[str, Any]], None], poll_interval=10.0,
+               stop: Callable[[], bool] = lambda: False) -> None:
+        while not stop():
+            for status in self.poll():
+                callback(status)
+            time.sleep(poll_interval)
 
 
 def report_parameters():
     report_params = \
-        filter(lambda x: x.secz_1day('daily_report_index') is not None,
+        filter(lambda x: x.get('daily_report_index') is not None,
                status_parameters())
     return sorted(report_params, key=lambda x: x['daily_report_index'])
@@ -4,26 +4,106 @@ Logモジュール
 観測ログを扱う。
 """
 from __future__ import annotations
+import dataclasses
 from datetime import datetime
-from typing import List, Tuple
+import pathlib as p
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, TypeVar, Union
 
+from VERAStatus.Server import ServerSettings, get_command_bytes
 from VERAStatus.Utility import time_string2datetime
 
+T = TypeVar("T")
 
-def extract_lines(lines: List[str], key: str) -> List[Tuple[datetime, str]]:
+
+def extract_lines(lines: Iterable[str], key: str) -> List[Tuple[datetime, str]]:
     """
     ログファイルの行から、キーが一致する行の時刻と値文字列を取り出す
     Args:
-        lines(Line[str]): ログファイルの行リスト
+        lines(Iterable[str]): ログファイルの行
         key(str): キー
 
     Returns:
         時刻・値文字列タプルのリスト
     """
-    line_candidates: List[List[str]] = \
-        [line.strip().split("/") for line in lines if key in line]
-    return [(time_string2datetime(time_str.strip()), value.strip())
-            for time_str, keyword, value in line_candidates if keyword == key]
+    return list(iterate_lines(lines, key))
+
+
+def iterate_lines(lines: Iterable[Union[str, bytes]], key: str) -> Iterator[Tuple[datetime, str]]:
+    """
+    ログファイルの行を1行ずつ読みながら、
+    キーが一致する行の時刻と値文字列を逐次取り出す。
+    ファイルオブジェクトやSSHチャネルのファイルをそのまま渡せば、
+    全体を読み込まずに処理できる。
+    Args:
+        lines(Iterable[Union[str, bytes]]): ログファイルの行(bytesはUTF-8として読む)
+        key(str): キー
+
+    Yields:
+        時刻・値文字列タプル(Tuple[datetime, str])
+    """
+    marker: str = f"/{key}/"
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        position: int = line.find(marker)
+        if position < 0:
+            continue
+        yield time_string2datetime(line[:position].strip()), line[position + len(marker):].strip()
+
+
+def split_line(line: Union[str, bytes]) -> Tuple[str, str, str]:
+    """
+    ログファイルの1行を、時刻文字列・キー・値文字列に分ける。
+    値文字列中の"/"はそのまま残す。
+    Args:
+        line(Union[str, bytes]): ログファイルの1行(bytesはUTF-8として読む)
+
+    Returns:
+        時刻文字列・キー・値文字列のタプル。キーのない行はキーが空文字列になる。
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    first: int = line.find("/")
+    second: int = line.find("/", first + 1) if first >= 0 else -1
+    if second < 0:
+        return line.strip(), "", ""
+    return line[:first].strip(), line[first + 1:second], line[second + 1:].strip()
+
+
+def dispatch_lines(lines: Iterable[Union[str, bytes]], parsers: Mapping[str, Callable[[datetime, str], T]]
+                   ) -> Dict[str, List[T]]:
+    """
+    ログファイルを1回だけ読み、
+    キーごとの変換関数で変換した結果をキーごとに振り分ける
+    Args:
+        lines(Iterable[Union[str, bytes]]): ログファイルの行
+        parsers(Mapping[str, Callable[[datetime, str], T]]): キーと、
+            時刻・値文字列を変換する関数の対応
+
+    Returns:
+        キーごとの変換結果リストの辞書(Dict[str, List[T]])。該当行のないキーは空リスト。
+    """
+    outputs: Dict[str, List[T]] = {key: list() for key in parsers}
+    for line in lines:
+        time_str, key, value = split_line(line)
+        parser: Callable[[datetime, str], T] = parsers.get(key)
+        if parser is not None:
+            outputs[key].append(parser(time_string2datetime(time_str), value))
+    return outputs
+
+
+def extract_keys(lines: Iterable[Union[str, bytes]], keys: Iterable[str]) -> Dict[str, List[Tuple[datetime, str]]]:
+    """
+    ログファイルを1回だけ読み、複数のキーについて時刻と値文字列を取り出す
+    Args:
+        lines(Iterable[Union[str, bytes]]): ログファイルの行
+        keys(Iterable[str]): キー
+
+    Returns:
+        キーごとの時刻・値文字列タプルリストの辞書(Dict[str, List[Tuple[datetime, str]]])
+    """
+    return dispatch_lines(lines, {key: lambda date_time, value: (date_time, value) for key in keys})
 
 
 def line2data(line: str, separator=None) -> Tuple[datetime, str, List[str]]:
@@ -41,3 +121,119 @@ def line2data(line: str, separator=None) -> Tuple[datetime, str, List[str]]:
     if separator is None:
         time_string2datetime(time_str.strip()), key, data_str_list.split()
     return time_string2datetime(time_str.strip()), key, data_str_list.split(separator)
+
+
+def tail_command(file: p.PurePath, offset: int) -> str:
+    """
+    サーバ上のファイルのinode番号とサイズを1行目に出力し、続けてbyte位置以降の内容を
+    その時点のサイズまで出力するコマンド。ファイルがなければ何も出力しない。
+    シングルクォートを含まないので、そのまま"ssh clock -f '...'"に渡せる。
+    Args:
+        file(pathlib.PurePath): サーバ上のファイルパス
+        offset(int): 読み出し開始のbyte位置
+
+    Returns:
+        コマンド(str)
+    """
+    return (f"f={file}; if [ -f $f ]; then s=$(stat -c %s $f); echo $(stat -c %i $f) $s; "
+            f"if [ $s -gt {offset} ]; then tail -c +{offset + 1} $f | head -c $((s-{offset})); fi; fi")
+
+
+@dataclasses.dataclass
+class LogTail:
+    """
+    書き込み中のサーバ上のログファイルについて、
+    読み終えた位置とそれまでの変換結果を覚えておき、
+    追記された分だけを読み出して変換する。
+    """
+    file: p.PurePath  # サーバ上のファイルパス
+    offset: int = 0  # 変換を終えた最後の行の次のbyte位置
+    inode: Optional[int] = None  # ファイルのinode番号。変わったら最初から読み直す。
+    records: List[Any] = dataclasses.field(default_factory=list)  # これまでの変換結果
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def reset(self) -> None:
+        """
+        読み出し位置と変換結果を捨てる
+        """
+        self.offset, self.inode, self.records = 0, None, list()
+
+    def apply(self, output: bytes, parse: Callable[[List[str]], List[T]],
+              merge: Callable[[List[T], List[T]], List[T]]) -> bool:
+        """
+        tail_commandの出力を変換結果に反映する。
+        最後の改行より後の書きかけの行は次回に回す。
+        Args:
+            output(bytes): tail_commandの出力
+            parse(Callable[[List[str]], List[T]]): 行リストを変換する関数
+            merge(Callable[[List[T], List[T]], List[T]]):
+                これまでの変換結果と新たな変換結果を合わせる関数
+
+        Returns:
+            反映できればTrue。ファイルが置き換わっていたか切り詰められていて、
+            最初から読み直す必要があればFalse。(bool)
+        """
+        if len(output) == 0:
+            return True
+        header, _, data = output.partition(b"\n")
+        inode, size = (int(value) for value in header.split())
+        if self.inode is not None and (inode != self.inode or size < self.offset):
+            self.reset()
+            return False
+        end: int = data.rfind(b"\n") + 1
+        # 変換が失敗したら読み出し位置を進めず、次回同じ行から読み直す
+        records: List[T] = merge(self.records, parse(data[:end].decode("utf-8", errors="replace").splitlines()))
+        self.offset, self.inode, self.records = self.offset + end, inode, records
+        return True
+
+    def update(self, server_settings: ServerSettings, parse: Callable[[List[str]], List[T]],
+               merge: Callable[[List[T], List[T]], List[T]] = lambda records, new_records: records + new_records,
+               wrap: Callable[[str], str] = lambda command: command) -> List[T]:
+        """
+        追記された分をサーバから読み出して変換し、これまでの変換結果に合わせる。
+        Args:
+            server_settings(ServerSettings): サーバ設定
+            parse(Callable[[List[str]], List[T]]): 行リストを変換する関数
+            merge(Callable[[List[T], List[T]], List[T]], optional):
+                これまでの変換結果と新たな変換結果を合わせる関数。
+                デフォルトは連結。
+            wrap(Callable[[str], str], optional):
+                コマンドを別サーバ経由で走らせる場合などの変換関数
+
+        Returns:
+            これまでのすべての変換結果(List[T])
+        """
+        with self.lock:
+            while not self.apply(get_command_bytes(server_settings, wrap(tail_command(self.file, self.offset))),
+                                 parse, merge):
+                pass
+            return list(self.records)
+
+
+# 書き込み中のログファイルの読み出し状態
+log_tails: Dict[Tuple[ServerSettings, str, p.PurePath], LogTail] = dict()
+log_tails_lock: threading.Lock = threading.Lock()
+
+
+def log_tail(server_settings: ServerSettings, kind: str, file: p.PurePath, max_files: int = 3) -> LogTail:
+    """
+    サーバ・データ種別・ファイルごとの読み出し状態。
+    サーバ・データ種別ごとに、最近使ったファイルの状態だけを残す。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        kind(str): データ種別
+        file(pathlib.PurePath): サーバ上のファイルパス
+        max_files(int, optional): サーバ・データ種別ごとに残すファイル数
+
+    Returns:
+        読み出し状態(LogTail)
+    """
+    key: Tuple[ServerSettings, str, p.PurePath] = (server_settings, kind, file)
+    with log_tails_lock:
+        tail: LogTail = log_tails.pop(key, None) or LogTail(file)
+        log_tails[key] = tail
+        same_kind: List[Tuple[ServerSettings, str, p.PurePath]] = \
+            [other for other in log_tails if other[:2] == key[:2]]
+        for other in same_kind[:-max_files]:
+            del log_tails[other]
+        return tail
@@ -6,13 +6,16 @@ Query モジュール
 from __future__ import annotations
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Mapping, Optional
 
 from . import Schedule as Sched
 from . import SecZ
 from .Server import ServerSettings
-from .Utility import doy_string2datetime, get_now, async_execution, incremented_day
-from .VERAStatus import VERAStatus
+from .Utility import doy_string2datetime, get_now, async_execution, incremented_day, gather_tasks, \
+    datetime2doy_string, Error, deadline_scope, executor_scope, timeout2deadline
+from .VERAStatus import VERAStatus, ObservationInfo, SecZData, StationStatus
 
 
 def get_status(doy_string: str, server_settings: ServerSettings) -> VERAStatus:
@@ -22,13 +25,180 @@ def get_status(doy_string: str, server_settings: ServerSettings) -> VERAStatus:
     return get_status_today(today, server_settings)
 
 
-def get_status_today(today: datetime, server_settings: ServerSettings) -> VERAStatus:
-    task1 = asyncio.ensure_future(Sched.get_observations(today, today, server_settings))
-    task2 = asyncio.ensure_future(SecZ.require_secz(today, server_settings))
-    obs_info_list, secz_info_list = async_execution([task1, task2])
+def get_status_today(today: datetime, server_settings: ServerSettings,
+                     timeout: Optional[float] = None) -> VERAStatus:
+    """
+    指定された日の観測情報とsecZ情報を、
+    スケジュールとsecZ・気象データの取得を並行させて得る。
+    Args:
+        today(datetime.datetime): 日時
+        server_settings(ServerSettings): サーバ設定
+        timeout(float, optional): 各取得タスクのタイムアウト秒数
+
+    Returns:
+        状態(VERAStatus)
+    """
+    return async_execution([get_status_today_async(today, server_settings, timeout)])[0]
+
+
+async def get_status_today_async(today: datetime, server_settings: ServerSettings,
+                                 timeout: Optional[float] = None) -> VERAStatus:
+    """
+    指定された日の観測情報とsecZ情報を得るコルーチン。
+    どちらかの取得が失敗したらもう一方はキャンセルされる。
+    Args:
+        today(datetime.datetime): 日時
+        server_settings(ServerSettings): サーバ設定
+        timeout(float, optional): 各取得タスクのタイムアウト秒数
+
+    Returns:
+        状態(VERAStatus)
+    """
+    obs_info_list: List[ObservationInfo]
+    secz_info_list: List[SecZData]
+    obs_info_list, secz_info_list = await gather_tasks([
+        Sched.get_observations_async(today, incremented_day(today), server_settings, timeout),
+        SecZ.generate_secz_async(today, server_settings, timeout)])
     return VERAStatus(obs_info_list, secz_info_list)
 
 
+def days_in_range(date_from: datetime, date_until: datetime) -> List[datetime]:
+    """
+    時刻範囲にかかるUTCの日の開始時刻のリスト
+    Args:
+        date_from(datetime.datetime): 開始時刻(含む)
+        date_until(datetime.datetime): 終了時刻(含まない)
+
+    Returns:
+        日の開始時刻のリスト(List[datetime.datetime])
+    """
+    day: datetime = doy_string2datetime(datetime2doy_string(date_from))
+    days: List[datetime] = list()
+    while day < date_until:
+        days.append(day)
+        day = incremented_day(day)
+    return days
+
+
+def get_status_between(date_from: datetime, date_until: datetime, server_settings: ServerSettings,
+                       timeout: Optional[float] = None, max_concurrency: int = 4) -> VERAStatus:
+    """
+    期間にかかる各日の観測情報とsecZ情報をまとめて得る。
+    Args:
+        date_from(datetime.datetime): 開始時刻(含む)
+        date_until(datetime.datetime): 終了時刻(含まない)
+        server_settings(ServerSettings): サーバ設定
+        timeout(float, optional): 各取得タスクのタイムアウト秒数
+        max_concurrency(int, optional): 同時に取得するsecZの日数の上限
+
+    Returns:
+        時刻順に併合した状態(VERAStatus)
+    """
+    return async_execution([get_status_between_async(
+        date_from, date_until, server_settings, timeout, max_concurrency)])[0]
+
+
+async def get_status_between_async(date_from: datetime, date_until: datetime, server_settings: ServerSettings,
+                                   timeout: Optional[float] = None, max_concurrency: int = 4) -> VERAStatus:
+    """
+    期間にかかる各日の観測情報とsecZ情報を得るコルーチン。
+    観測情報は期間全体を1回でまとめて取得し、
+    secZ情報(と気象データ)は日ごとのログファイルを並行して取得する。
+    どれかの取得が失敗したら残りはキャンセルされる。
+    Args:
+        date_from(datetime.datetime): 開始時刻(含む)
+        date_until(datetime.datetime): 終了時刻(含まない)
+        server_settings(ServerSettings): サーバ設定
+        timeout(float, optional): 各取得タスクのタイムアウト秒数
+        max_concurrency(int, optional): 同時に取得するsecZの日数の上限
+
+    Returns:
+        時刻順に併合した状態(VERAStatus)
+    """
+    if date_until <= date_from:
+        raise ValueError(f"the query range [{date_from}, {date_until}) is empty.")
+    days: List[datetime] = days_in_range(date_from, date_until)
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def generate_secz_day(day: datetime) -> List[SecZData]:
+        async with semaphore:
+            return await SecZ.generate_secz_async(day, server_settings, timeout)
+
+    results: List[List] = await gather_tasks(
+        [Sched.get_observations_async(days[0], incremented_day(days[-1]), server_settings, timeout)]
+        + [generate_secz_day(day) for day in days])
+    secz_list: List[SecZData] = sorted((secz for secz_day in results[1:] for secz in secz_day),
+                                       key=lambda secz: secz.date_time)
+    return VERAStatus(sorted(results[0]), secz_list)
+
+
+def get_station_statuses(date_from: datetime, date_until: datetime, stations: Mapping[str, ServerSettings],
+                         timeout: Optional[float] = None, station_timeout: Optional[float] = None,
+                         max_concurrency: int = 4) -> Dict[str, StationStatus]:
+    """
+    複数局の期間の状態を、局ごとに並行して得る。
+    Args:
+        date_from(datetime.datetime): 開始時刻(含む)
+        date_until(datetime.datetime): 終了時刻(含まない)
+        stations(Mapping[str, ServerSettings]): 局名とサーバ設定
+        timeout(float, optional): 各取得タスクのタイムアウト秒数
+        station_timeout(float, optional): 局ごとのタイムアウト秒数。
+            局の通信もこの時刻で打ち切る。
+        max_concurrency(int, optional): 局ごとに同時に取得するsecZの日数の上限
+
+    Returns:
+        局名ごとの状態(Dict[str, StationStatus])。失敗した局はエラーメッセージを持つ。
+    """
+    return async_execution([get_station_statuses_async(
+        date_from, date_until, stations, timeout, station_timeout, max_concurrency)])[0]
+
+
+async def get_station_statuses_async(date_from: datetime, date_until: datetime,
+                                     stations: Mapping[str, ServerSettings],
+                                     timeout: Optional[float] = None, station_timeout: Optional[float] = None,
+                                     max_concurrency: int = 4) -> Dict[str, StationStatus]:
+    """
+    複数局の期間の状態を、局ごとに並行して得るコルーチン。
+    ある局の失敗やタイムアウトはその局の結果に記録し、ほかの局の取得は続ける。
+    Args:
+        date_from(datetime.datetime): 開始時刻(含む)
+        date_until(datetime.datetime): 終了時刻(含まない)
+        stations(Mapping[str, ServerSettings]): 局名とサーバ設定
+        timeout(float, optional): 各取得タスクのタイムアウト秒数
+        station_timeout(float, optional): 局ごとのタイムアウト秒数
+        max_concurrency(int, optional): 局ごとに同時に取得するsecZの日数の上限
+
+    Returns:
+        局名ごとの状態(Dict[str, StationStatus])。失敗した局はエラーメッセージを持つ。
+    """
+    async def get_station_status(station: str, server_settings: ServerSettings) -> StationStatus:
+        try:
+            # 打ち切り時刻はスレッドで走る通信にも渡り、
+            # 局の待ち時間だけでなく通信そのものを止める
+            with deadline_scope(timeout2deadline(station_timeout)):
+                status: VERAStatus = await asyncio.wait_for(get_status_between_async(
+                    date_from, date_until, server_settings, timeout, max_concurrency), station_timeout)
+        except asyncio.TimeoutError:
+            return StationStatus(station, None, f"{station}: timed out after {station_timeout} s.")
+        except Error as e:
+            return StationStatus(station, None, f"{station}: {e.args[0] if len(e.args) > 0 else e}")
+        except Exception as e:
+            return StationStatus(station, None, f"{station}: {type(e).__name__}: {e}")
+        return StationStatus(station, status)
+
+    # 局ごとの取得がスレッド数で待たされないよう、
+    # 全局の同時取得数に見合うエクゼキュータをこの呼び出しだけで使う。
+    # 打ち切られた局のスレッドの終わりは待たない(イベントループを止めない)。
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max(1, len(stations)) * (max_concurrency + 1))
+    try:
+        with executor_scope(executor):
+            statuses: List[StationStatus] = list(await asyncio.gather(
+                *[get_station_status(station, server_settings) for station, server_settings in stations.items()]))
+    finally:
+        executor.shutdown(wait=False)
+    return {station_status.station: station_status for station_status in statuses}
+
+
 def get_status_today_synchronous(today: datetime, server_settings: ServerSettings) -> VERAStatus:
     # return VERAStatus(Sched.get_observations(today, incremented_day(today), server_settings),
     #                  SecZ.require_secz(today, server_settings))
@@ -39,4 +209,5 @@ def get_status_today_synchronous(today: datetime, server_settings: ServerSetting
 def get_status_synchronous(date_from: datetime, date_until: datetime,
                            server_settings: ServerSettings) -> VERAStatus:
     return VERAStatus(Sched.get_observations(date_from, date_until, server_settings),
-                      SecZ.require_secz(date_from, server_settings))
+                      [secz for day in days_in_range(date_from, date_until)
+                       for secz in SecZ.require_secz(day, server_settings)])
@@ -6,13 +6,13 @@ Scheduleモジュール
 """
 from __future__ import annotations
 from datetime import datetime
-import pathlib as p
-from typing import List
+from typing import List, Optional
 
+from .ScheduleIndex import schedule_index
 from .Server import ServerSettings
+from .Utility import run_blocking
 from .VERAStatus import Observations, ObservationInfo
-from .Vex import make_observation_info, download_files_between, schedule_files_between,\
-    schedule_file2observation_info
+from .Vex import make_observation_info, download_files_between
 
 
 def keywords() -> List[str]:
@@ -51,7 +51,10 @@ def read_observations_old(date_from: datetime, date_until: datetime,
 def read_observations(date_from: datetime, date_until: datetime,
                       server_settings: ServerSettings) -> List[ObservationInfo]:
     """
-    指定期間を含む日の観測情報
+    指定期間を含む日の観測情報。
+    スケジュールファイルの索引から得るので、
+    サーバへの問い合わせは索引の更新(ディレクトリ一覧と、
+    新しいか変更されたファイルの読み出し)だけになる。
     Args:
         date_from(datetime.datetime): 開始日時
         date_until(datetime.datetime): 終了日時
@@ -60,10 +63,7 @@ def read_observations(date_from: datetime, date_until: datetime,
     Returns:
         観測情報(Observations)
     """
-    schedule_files: List[p.PurePath] = schedule_files_between(
-        date_from, date_until, server_settings)
-    return [schedule_file2observation_info(server_settings, file)
-            for file in schedule_files]
+    return schedule_index(server_settings).observations_between(date_from.date(), date_until.date())
 
 
 def get_observations(date_from: datetime, date_until: datetime,
@@ -73,6 +73,23 @@ def get_observations(date_from: datetime, date_until: datetime,
     return sorted(obs_info_list)
 
 
+async def get_observations_async(date_from: datetime, date_until: datetime,
+                                 server_settings: ServerSettings,
+                                 timeout: Optional[float] = None) -> List[ObservationInfo]:
+    """
+    指定期間を含む日の観測情報を取得するコルーチン
+    Args:
+        date_from(datetime.datetime): 開始日時
+        date_until(datetime.datetime): 終了日時
+        server_settings(ServerSettings): サーバ設定
+        timeout(float, optional): タイムアウト秒数
+
+    Returns:
+        開始時刻順の観測情報(List[ObservationInfo])
+    """
+    return await run_blocking(get_observations, date_from, date_until, server_settings, timeout=timeout)
+
+
 def display_schedule(observations: Observations) -> None:
     """
     観測の表示
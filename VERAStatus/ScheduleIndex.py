@@ -0,0 +1,204 @@
+"""
+ScheduleIndexモジュール
+
+サーバのスケジュールディレクトリにあるvexファイルの索引を、
+観測日ごとにローカルディスクに持つ。
+索引の更新はディレクトリ一覧を属性つきで1回得るだけで、
+新しいか変更されたファイルだけを読み直す。
+"""
+from __future__ import annotations
+__all__ = ["ScheduleEntry", "ScheduleIndex", "schedule_index"]
+
+import dataclasses
+from datetime import date
+import logging
+import pathlib as p
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .Cache import day_cache
+from .Server import FileStat, ServerSettings, list_directory
+from .Utility import DataWriteError, dump_pickle, load_pickle
+from .VERAStatus import ObservationInfo
+from .Vex import schedule_file_date, schedule_files2observation_info
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class ScheduleEntry:
+    """
+    索引中の1つのスケジュールファイル
+    """
+    observation_date: date  # ファイル名からわかる観測開始日
+    mtime: int  # 最終更新時刻(UNIX時刻)
+    size: int  # サイズ(byte)
+    observation: Optional[ObservationInfo]  # 観測情報。読めないファイルならNone。
+
+
+class ScheduleIndex:
+    """
+    1つのサーバのスケジュールファイルの索引。
+    ファイル名ごとの観測情報を、最終更新時刻・サイズと一緒に覚えておく。
+    """
+
+    def __init__(self, server_settings: ServerSettings, index_file: Optional[p.Path],
+                 refresh_interval: float = 60.0, batch_size: int = 200):
+        """
+        Args:
+            server_settings(ServerSettings): サーバ設定
+            index_file(pathlib.Path, optional): 索引の保存先。他人が書き込めない場所に置く。
+                Noneなら保存しない。
+            refresh_interval(float, optional): この秒数のうちに更新していれば、
+                サーバに問い合わせない
+            batch_size(int, optional): 1回のコマンドで読むvexファイル数の上限
+        """
+        self.server_settings: ServerSettings = server_settings
+        self.index_file: Optional[p.Path] = index_file
+        self.refresh_interval: float = refresh_interval
+        self.batch_size: int = batch_size
+        self.entries: Dict[str, ScheduleEntry] = dict()
+        self.by_date: Dict[date, List[str]] = dict()
+        self.refreshed: Optional[float] = None  # 最後に更新した時刻(time.monotonic)
+        self.lock: threading.Lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        """
+        保存された索引を読む。読めなければ空の索引にする。
+        """
+        entries: Optional[Dict[str, ScheduleEntry]] = \
+            None if self.index_file is None else load_pickle(self.index_file)
+        self.entries = entries if isinstance(entries, dict) else dict()
+        self.build_by_date()
+
+    def save(self) -> None:
+        """
+        索引を保存する。保存できなければ保存しないだけで、例外は出さない。
+        """
+        if self.index_file is not None:
+            dump_pickle(self.index_file, self.entries)
+
+    def build_by_date(self) -> None:
+        """
+        観測日からファイル名への対応を作り直す
+        """
+        self.by_date = dict()
+        for file_name, entry in self.entries.items():
+            self.by_date.setdefault(entry.observation_date, []).append(file_name)
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        サーバのディレクトリ一覧と索引を比べ、
+        新しいか変更されたファイルを読み直し、消えたファイルを索引から除く。
+        Args:
+            force(bool, optional): Trueなら更新間隔にかかわらず更新する
+        """
+        with self.lock:
+            if not force and self.refreshed is not None \
+                    and time.monotonic() - self.refreshed < self.refresh_interval:
+                return
+            listing: Dict[str, Tuple[date, FileStat]] = dict()
+            for file_stat in list_directory(self.server_settings, self.server_settings.schedule_directory):
+                observation_date: Optional[date] = schedule_file_date(p.PurePosixPath(file_stat.filename))
+                if file_stat.filename.endswith(".vex") and observation_date is not None:
+                    listing[file_stat.filename] = (observation_date, file_stat)
+            changed: List[Tuple[str, date, FileStat]] = [
+                (file_name, observation_date, file_stat)
+                for file_name, (observation_date, file_stat) in listing.items()
+                if not self.is_current(file_name, file_stat)]
+            removed: List[str] = [file_name for file_name in self.entries if file_name not in listing]
+            for file_name in removed:
+                del self.entries[file_name]
+            for start in range(0, len(changed), self.batch_size):
+                self.parse(changed[start:start + self.batch_size])
+            if len(changed) > 0 or len(removed) > 0:
+                self.build_by_date()
+                self.save()
+            self.refreshed = time.monotonic()
+
+    def is_current(self, file_name: str, file_stat: FileStat) -> bool:
+        """
+        索引中のファイルがサーバのファイルと同じかどうか
+        Args:
+            file_name(str): ファイル名
+            file_stat(FileStat): サーバのファイルの属性
+
+        Returns:
+            最終更新時刻とサイズが一致すればTrue(bool)
+        """
+        entry: Optional[ScheduleEntry] = self.entries.get(file_name)
+        return entry is not None and entry.mtime == file_stat.st_mtime and entry.size == file_stat.st_size
+
+    def parse(self, changed: List[Tuple[str, date, FileStat]]) -> None:
+        """
+        ファイルを1回のコマンドでまとめて読んで観測情報にし、索引に入れる。
+        読めないファイルがあれば1つずつ読み直し、
+        読めないファイルは観測情報なしで索引に入れる。
+        Args:
+            changed(List[Tuple[str, datetime.date, FileStat]]): ファイル名・観測日・属性のリスト
+        """
+        files: List[p.PurePath] = \
+            [self.server_settings.schedule_directory / file_name for file_name, _, _ in changed]
+        try:
+            observations: List[Optional[ObservationInfo]] = list(schedule_files2observation_info(
+                self.server_settings, files, [file_stat for _, _, file_stat in changed]))
+        except (KeyError, ValueError, IndexError) as e:
+            if len(changed) == 1:
+                logger.warning("skipped unreadable schedule file %s: %s: %s", files[0], type(e).__name__, e)
+                observations = [None]
+            else:
+                for item in changed:
+                    self.parse([item])
+                return
+        for (file_name, observation_date, file_stat), observation in zip(changed, observations):
+            self.entries[file_name] = \
+                ScheduleEntry(observation_date, file_stat.st_mtime, file_stat.st_size, observation)
+
+    def observations_between(self, date_start: date, date_end: date) -> List[ObservationInfo]:
+        """
+        索引を更新してから、期間の日に観測開始日がある観測情報を得る
+        Args:
+            date_start(datetime.date): 期間開始日
+            date_end(datetime.date): 期間終了日(含まない)
+
+        Returns:
+            観測情報リスト(List[ObservationInfo])
+        """
+        self.refresh()
+        with self.lock:
+            if (date_end - date_start).days < len(self.by_date):
+                days: List[date] = [date.fromordinal(ordinal)
+                                    for ordinal in range(date_start.toordinal(), date_end.toordinal())]
+            else:
+                days = [day for day in self.by_date if date_start <= day < date_end]
+            entries: List[ScheduleEntry] = \
+                [self.entries[file_name] for day in days for file_name in sorted(self.by_date.get(day, []))]
+            return [entry.observation for entry in entries if entry.observation is not None]
+
+
+schedule_indices: Dict[ServerSettings, ScheduleIndex] = dict()  # サーバ設定ごとの索引
+schedule_indices_lock: threading.Lock = threading.Lock()
+
+
+def schedule_index(server_settings: ServerSettings) -> ScheduleIndex:
+    """
+    サーバ設定ごとに共有する索引。
+    索引はキャッシュディレクトリのサーバごとのディレクトリに保存する。
+    そのディレクトリが使えなければ保存しない。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+
+    Returns:
+        索引(ScheduleIndex)
+    """
+    with schedule_indices_lock:
+        if server_settings not in schedule_indices:
+            try:
+                index_file: Optional[p.Path] = \
+                    day_cache.private_server_directory(server_settings) / "schedule.index"
+            except DataWriteError:
+                index_file = None
+            schedule_indices[server_settings] = ScheduleIndex(server_settings, index_file)
+        return schedule_indices[server_settings]
@@ -4,17 +4,22 @@ SecZ module
 handling secz information
 """
 from __future__ import annotations
-__all__ = ["require_secz"]
+__all__ = ["require_secz", "generate_secz", "generate_secz_async"]
 
-from datetime import datetime
+import dataclasses
+from datetime import datetime, timedelta
 import pathlib as p
-from typing import List, Tuple, Union, Generator
+from typing import Callable, Dict, Iterable, List, Mapping, Tuple, TypeVar, Union, Generator, Optional
 
 from . import Server as Serv
-from .Log import extract_lines, line2data
-from .Server import ServerSettings, get_command_output
+from .Cache import cached_day, day_cache
+from .Log import dispatch_lines, log_tail
+from .Server import ServerSettings, stream_command_output
+from .Utility import run_blocking
 from .VERAStatus import SecZData
-from .Weather import Weather, require_weather_list
+from .Weather import Weather, require_weather_at
+
+T = TypeVar("T")
 
 
 def display_secz(secz_list: List[SecZData]) -> None:
@@ -57,7 +62,26 @@ def remote_file_path(date_time: datetime) -> p.PurePath:
 
 def require_secz(date_time: datetime, server_settings: ServerSettings) -> List[SecZData]:
     """
-    指定された日時を含む日のSecZ測定結果リスト
+    指定された日時を含む日のSecZ測定結果リスト。
+    書き込みの終わった日はキャッシュから得て、
+    書き込み中の日は前回から追記された分だけをサーバに問い合わせる。
+    Args:
+        date_time: 日時
+        server_settings: サーバ設定
+
+    Returns:
+        SecZ測定結果(List[SecZData]]
+    """
+    if not day_cache.is_closed(date_time):
+        return query_secz_growing(date_time, server_settings)
+    return cached_day(server_settings, date_time, "secz_download",
+                      lambda: download_secz(date_time, server_settings), has_weather)
+
+
+def download_secz(date_time: datetime, server_settings: ServerSettings) -> List[SecZData]:
+    """
+    指定された日時を含む日のSecZ測定結果リストを、
+    ログファイルをダウンロードして得る
     Args:
         date_time: 日時
         server_settings: サーバ設定
@@ -75,20 +99,21 @@ def require_secz(date_time: datetime, server_settings: ServerSettings) -> List[S
 
         data_keyword: str = "TSYS1"
         with open(file_path, mode="r") as f:
-            data_lines: List[Tuple[datetime, str]] = extract_lines(f.readlines(), data_keyword)
-            weather_list: List[Weather] = \
-                require_weather_list(server_settings, [date_time for date_time, _ in data_lines])
+            data_lines: List[Tuple[datetime, str]] = \
+                dispatch_lines(f, {data_keyword: lambda date_time_, value: (date_time_, value)})[data_keyword]
+            weather_list: List[Optional[Weather]] = \
+                require_weather_at(server_settings, [date_time for date_time, _ in data_lines])
             return [data2secz(date_time, data_str_line, weather)
                     for (date_time, data_str_line), weather in zip(data_lines, weather_list)]
 
 
-def data2secz(date_time: datetime, data_str_line: str, weather: Weather) -> SecZData:
+def data2secz(date_time: datetime, data_str_line: str, weather: Optional[Weather]) -> SecZData:
     """
     secZログファイル内の時刻・値文字列と同時刻の気象データからsecZデータにする。
     Args:
         date_time(datetime.datetime): 時刻
         data_str_line(str): 値文字列
-        weather(Weather): 気象データ
+        weather(Optional[Weather]): 気象データ
 
     Returns:
         secZデータ(SecZData)
@@ -105,18 +130,56 @@ def data2secz(date_time: datetime, data_str_line: str, weather: Weather) -> SecZ
                     weather)
 
 
-def secz_query_command(date_time: datetime) -> str:
+def secz_query_command(date_time: datetime, keys: Iterable[str] = ("TSYS1",)) -> str:
     """
-    指定された日時を含む日のSecZ測定結果の問い合わせコマンド
+    指定された日時を含む日のSecZログから、
+    キーの一致する行を取り出す問い合わせコマンド
     Args:
         date_time: 日時
+        keys(Iterable[str], optional): キー。複数あれば1回のgrepでまとめて取り出す。
+
+    Returns:
+        SecZ問い合わせコマンド(str)。
+        ログファイルがまだなければ何も出力せず正常終了する。
+    """
+    key_list: List[str] = list(keys)
+    file: p.PurePath = remote_file_path(date_time)
+    if len(key_list) == 1:
+        return rf"test ! -f {file} || grep {key_list[0]} {file}"
+    return rf'test ! -f {file} || egrep "/({"|".join(key_list)})/" {file}'
+
+
+def query_secz_log(date_time: datetime, server_settings: ServerSettings,
+                   parsers: Mapping[str, Callable[[datetime, str], T]]) -> Dict[str, List[T]]:
+    """
+    指定された日時を含む日のSecZログを1回だけ問い合わせ、
+    届いた行から順にキーごとに変換して振り分ける
+    Args:
+        date_time(datetime.datetime): 日時
+        server_settings(ServerSettings): サーバ設定
+        parsers(Mapping[str, Callable[[datetime, str], T]]): キーと、
+            時刻・値文字列を変換する関数の対応
+
+    Returns:
+        キーごとの変換結果リストの辞書(Dict[str, List[T]])
+    """
+    return dispatch_lines(stream_command_output(server_settings, secz_query_command(date_time, parsers.keys())),
+                          parsers)
+
+
+def tsys1_value2secz_data(date_time: datetime, value: str) -> List[Union[datetime, str, float]]:
+    """
+    TSYS1行の時刻と値文字列を測定結果リストにする
+    Args:
+        date_time(datetime.datetime): 時刻
+        value(str): 値文字列
 
     Returns:
-        SecZ問い合わせコマンド(str)
+        測定結果リスト
     """
-    data_keyword: str = "TSYS1"
-    date_str: str = date_time.strftime("%Y%j")
-    return rf"grep {data_keyword} /usr2/log/days/{date_str}/{date_str}.SECZ.log"
+    data_str: List[str] = value.split()
+    return [date_time, float(data_str[0]), float(data_str[1]), float(data_str[2]),
+            float(data_str[3]), float(data_str[4]), data_str[5], data_str[6]]
 
 
 def acquire_secz_data(date_time: datetime, server_settings: ServerSettings
@@ -130,10 +193,7 @@ def acquire_secz_data(date_time: datetime, server_settings: ServerSettings
     Yields:
         測定結果リスト
     """
-    for line in get_command_output(server_settings, secz_query_command(date_time)):
-        date_time, _, data_str = line2data(line)
-        yield [date_time, float(data_str[0]), float(data_str[1]), float(data_str[2]),
-               float(data_str[3]), float(data_str[4]), data_str[5], data_str[6]]
+    yield from query_secz_log(date_time, server_settings, {"TSYS1": tsys1_value2secz_data})["TSYS1"]
     # data_line: List[Tuple[datetime, str, List[str]]] =\
     #     [line2data(line) for line in get_command_output(server_settings, secz_query_command(date_time))]
 
@@ -150,39 +210,179 @@ def assemble_secz_data() -> Generator[None, Union[List[Union[datetime, str, floa
     return SecZData(*secz_data_list)
 
 
-def generate_secz(date_time: datetime, server_settings: ServerSettings
-                  ) -> List[SecZData]:
+def assemble_secz_list(secz_data_lists: List[List[Union[datetime, str, float]]],
+                       weather_list: List[Optional[Weather]]) -> List[SecZData]:
     """
-    指定された日時を含む日のSecZオブジェクト
+    secZ測定結果リストと、それに1対1で対応する気象データリストから、
+    secZオブジェクトのリストを組み立てる
     Args:
-        date_time(datetime.datetime): 日時
-        server_settings(ServerSettings): サーバ設定
+        secz_data_lists(List[List[Union[datetime, str, float]]]): 測定結果リストのリスト
+        weather_list(List[Optional[Weather]]): 各測定時刻の気象データリスト
 
     Returns:
-
+        secZオブジェクトのリスト(List[SecZData])
     """
-    date_time_list: List[datetime] = list()
     secz_makers: List[Generator[None, Union[List[Union[datetime, str, float]], Weather], SecZData]] = list()
-
-    for secz_data_list in acquire_secz_data(date_time, server_settings):
+    for secz_data_list in secz_data_lists:
         secz_maker: Generator[None, Union[List[Union[datetime, str, float]], Weather], SecZData] =\
             assemble_secz_data()
-        # secz_maker: Generator[None, Union[List[Union[datetime, str, float]], Weather], SecZData] = secz_maker_factory()
         next(secz_maker)
         secz_maker.send(secz_data_list)
-        date_time_list.append(secz_data_list[0])
         secz_makers.append(secz_maker)
 
     secz_list: List[SecZData] = list()
-    for weather, secz_maker in zip(require_weather_list(server_settings, date_time_list), secz_makers):
+    for weather, secz_maker in zip(weather_list, secz_makers):
         try:
             secz_maker.send(weather)
-            # secz_maker.send(None)
         except StopIteration as e:
             secz_list.append(e.value)
 
     return secz_list
 
 
+def generate_secz(date_time: datetime, server_settings: ServerSettings,
+                  weather_tolerance: timedelta = timedelta(seconds=30), interpolate: bool = False
+                  ) -> List[SecZData]:
+    """
+    指定された日時を含む日のSecZオブジェクト。
+    書き込みの終わった日はキャッシュから得て、
+    書き込み中の日は前回から追記された分だけをサーバに問い合わせる。
+    Args:
+        date_time(datetime.datetime): 日時
+        server_settings(ServerSettings): サーバ設定
+        weather_tolerance(datetime.timedelta, optional): 測定時刻と気象データの時刻の許容差
+        interpolate(bool, optional): Trueなら気象データを測定時刻に線形補間する。
+
+    Returns:
+        secZオブジェクトのリスト(List[SecZData])
+    """
+    if not day_cache.is_closed(date_time):
+        return query_secz_growing(date_time, server_settings, weather_tolerance, interpolate)
+    return cached_day(server_settings, date_time, secz_kind(weather_tolerance, interpolate),
+                      lambda: query_secz(date_time, server_settings, weather_tolerance, interpolate), has_weather)
+
+
+def has_weather(secz_list: List[SecZData]) -> bool:
+    """
+    すべてのsecZ測定結果に気象データが対応しているか。
+    気象データの欠けた結果は、気象データの取得の失敗かもしれないので、
+    キャッシュしない。
+    Args:
+        secz_list(List[SecZData]): secZ測定結果リスト
+
+    Returns:
+        気象データのない測定結果がなければTrue(bool)
+    """
+    return all(secz.weather is not None for secz in secz_list)
+
+
+def secz_kind(weather_tolerance: timedelta, interpolate: bool) -> str:
+    """
+    気象データを対応させたsecZオブジェクトのデータ種別。
+    気象データの対応のさせ方ごとに分ける。
+    Args:
+        weather_tolerance(datetime.timedelta): 測定時刻と気象データの時刻の許容差
+        interpolate(bool): 気象データを測定時刻に線形補間するかどうか
+
+    Returns:
+        データ種別(str)
+    """
+    return f"secz_{weather_tolerance.total_seconds():g}s" + ("_interpolated" if interpolate else "")
+
+
+def query_secz(date_time: datetime, server_settings: ServerSettings,
+               weather_tolerance: timedelta = timedelta(seconds=30), interpolate: bool = False
+               ) -> List[SecZData]:
+    """
+    指定された日時を含む日のSecZオブジェクトを、サーバへの問い合わせで得る
+    Args:
+        date_time(datetime.datetime): 日時
+        server_settings(ServerSettings): サーバ設定
+        weather_tolerance(datetime.timedelta, optional): 測定時刻と気象データの時刻の許容差
+        interpolate(bool, optional): Trueなら気象データを測定時刻に線形補間する。
+
+    Returns:
+        secZオブジェクトのリスト(List[SecZData])
+    """
+    secz_data_lists: List[List[Union[datetime, str, float]]] = \
+        list(acquire_secz_data(date_time, server_settings))
+    date_time_list: List[datetime] = [secz_data_list[0] for secz_data_list in secz_data_lists]
+    return assemble_secz_list(secz_data_lists, require_weather_at(
+        server_settings, date_time_list, weather_tolerance, interpolate))
+
+
+def query_secz_growing(date_time: datetime, server_settings: ServerSettings,
+                       weather_tolerance: timedelta = timedelta(seconds=30), interpolate: bool = False
+                       ) -> List[SecZData]:
+    """
+    書き込み中の日のSecZオブジェクトを、
+    前回の問い合わせからログに追記された分だけ取得して、
+    それまでの分に合わせて得る。
+    前回は気象データがまだなかった測定には、改めて気象データを対応させる。
+    Args:
+        date_time(datetime.datetime): 日時
+        server_settings(ServerSettings): サーバ設定
+        weather_tolerance(datetime.timedelta, optional): 測定時刻と気象データの時刻の許容差
+        interpolate(bool, optional): Trueなら気象データを測定時刻に線形補間する。
+
+    Returns:
+        その日のこれまでのsecZオブジェクトのリスト(List[SecZData])
+    """
+    def parse(lines: List[str]) -> List[SecZData]:
+        secz_data_lists: List[List[Union[datetime, str, float]]] = \
+            dispatch_lines(lines, {"TSYS1": tsys1_value2secz_data})["TSYS1"]
+        return assemble_secz_list(secz_data_lists, require_weather_at(
+            server_settings, [secz_data_list[0] for secz_data_list in secz_data_lists], weather_tolerance,
+            interpolate))
+
+    def merge(secz_list: List[SecZData], new_secz_list: List[SecZData]) -> List[SecZData]:
+        return rejoin_weather(secz_list, server_settings, weather_tolerance, interpolate) + new_secz_list
+
+    return log_tail(server_settings, secz_kind(weather_tolerance, interpolate), remote_file_path(date_time)) \
+        .update(server_settings, parse, merge)
+
+
+def rejoin_weather(secz_list: List[SecZData], server_settings: ServerSettings,
+                   weather_tolerance: timedelta = timedelta(seconds=30), interpolate: bool = False
+                   ) -> List[SecZData]:
+    """
+    気象データのないsecZオブジェクトに、改めて気象データを対応させる
+    Args:
+        secz_list(List[SecZData]): secZオブジェクトのリスト
+        server_settings(ServerSettings): サーバ設定
+        weather_tolerance(datetime.timedelta, optional): 測定時刻と気象データの時刻の許容差
+        interpolate(bool, optional): Trueなら気象データを測定時刻に線形補間する。
+
+    Returns:
+        secZオブジェクトのリスト(List[SecZData])
+    """
+    missing: List[int] = [index for index, secz in enumerate(secz_list) if secz.weather is None]
+    if len(missing) == 0:
+        return secz_list
+    weather_list: List[Optional[Weather]] = require_weather_at(
+        server_settings, [secz_list[index].date_time for index in missing], weather_tolerance, interpolate)
+    rejoined: List[SecZData] = list(secz_list)
+    for index, weather in zip(missing, weather_list):
+        if weather is not None:
+            rejoined[index] = dataclasses.replace(secz_list[index], weather=weather)
+    return rejoined
+
+
+async def generate_secz_async(date_time: datetime, server_settings: ServerSettings,
+                              timeout: Optional[float] = None) -> List[SecZData]:
+    """
+    指定された日時を含む日のSecZオブジェクトを取得するコルーチン。
+    secZデータを取得してから、その時刻の気象データを取得する。
+    Args:
+        date_time(datetime.datetime): 日時
+        server_settings(ServerSettings): サーバ設定
+        timeout(float, optional): タイムアウト秒数
+
+    Returns:
+        secZオブジェクトのリスト(List[SecZData])
+    """
+    return await run_blocking(generate_secz, date_time, server_settings, timeout=timeout)
+
+
 def secz_maker_factory() -> Generator[None, Union[List[Union[datetime, str, float]], Weather], SecZData]:
     yield from assemble_secz_data()
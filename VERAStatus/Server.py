@@ -4,17 +4,25 @@ Serverモジュール
 スケジュール・気象データアクセスサーバ(たいていoperation)へのsshアクセスを行う。
 """
 from __future__ import annotations
+import atexit
+import codecs
+import contextvars
 import dataclasses
 import os
 import pathlib as p
+import queue
+import socket
 import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import List, Tuple, Dict, Any, Generator
+from typing import List, Tuple, Dict, Any, Generator, Callable, Optional, Collection, Iterator
 
 import paramiko as pa
 from paramiko import SSHException, AuthenticationException
 
-from VERAStatus.Utility import DataReadError
+from VERAStatus.Utility import DataReadError, remaining_time
 
 FileStat = pa.SFTPAttributes
 FileWithStat = Tuple[p.Path, FileStat]
@@ -30,27 +38,433 @@ class ServerSettings:
     user: str  # ユーザ名
     password: str  # パスワード
     schedule_directory: p.PurePath  # サーバ上のパス
+    proxy: Optional[ServerSettings] = None  # 踏み台サーバ。あればその上のチャネルで接続する。
+    weather_server: Optional[ServerSettings] = None  # 踏み台経由で接続する気象データサーバ
+    compress: bool = False  # Trueならsshトランスポートを圧縮する
 
 
 def server_settings_dict2settings(settings_dict: Dict[str, Any]) -> ServerSettings:
     """
-    設定辞書を設定クラスに格納
+    設定辞書を設定クラスに格納。
+    設定辞書に"compress"があれば、sshトランスポートの圧縮の有無にする。
+    設定辞書に"weather_server"(host, port, user, password)があれば、
+    このサーバを踏み台にする気象データサーバ設定にする。
     Args:
         settings_dict(Dict[str, Any]: 設定辞書
 
     Returns:
         設定クラス(ServerSettings)
     """
-    return ServerSettings(settings_dict["host"],
-                          int(settings_dict["port"]),
-                          settings_dict["user"],
-                          settings_dict["password"],
-                          p.PurePosixPath(settings_dict["schedule_path"]))
+    server_settings: ServerSettings = ServerSettings(settings_dict["host"],
+                                                     int(settings_dict["port"]),
+                                                     settings_dict["user"],
+                                                     settings_dict["password"],
+                                                     p.PurePosixPath(settings_dict["schedule_path"]),
+                                                     compress=bool(settings_dict.get("compress", False)))
+    if "weather_server" not in settings_dict:
+        return server_settings
+    weather_dict: Dict[str, Any] = settings_dict["weather_server"]
+    return dataclasses.replace(server_settings, weather_server=ServerSettings(
+        weather_dict["host"],
+        int(weather_dict.get("port", 22)),
+        weather_dict.get("user", server_settings.user),
+        weather_dict.get("password", server_settings.password),
+        server_settings.schedule_directory,
+        proxy=server_settings,
+        compress=bool(weather_dict.get("compress", server_settings.compress))))
+
+
+def station_settings_dict2settings(settings_dict: Dict[str, Any]) -> Dict[str, ServerSettings]:
+    """
+    設定辞書の"stations"(局名と各局のサーバ設定辞書)を、局名ごとの設定クラスに格納
+    Args:
+        settings_dict(Dict[str, Any]: 設定辞書
+
+    Returns:
+        局名ごとの設定クラス(Dict[str, ServerSettings])
+    """
+    return {station: server_settings_dict2settings(station_dict)
+            for station, station_dict in settings_dict.get("stations", dict()).items()}
+
+
+class ProxiedSSHClient(pa.SSHClient):
+    """
+    踏み台サーバのdirect-tcpipチャネル上のsshクライアント。
+    閉じるときに踏み台への接続を接続プールに戻す。
+    """
+
+    def __init__(self, jump_settings: ServerSettings, jump_client: pa.SSHClient):
+        """
+        Args:
+            jump_settings(ServerSettings): 踏み台サーバの設定
+            jump_client(paramiko.SSHClient):
+                接続プールから借りた踏み台サーバへの接続済みクライアント
+        """
+        super().__init__()
+        self.jump_settings: ServerSettings = jump_settings
+        self.jump_client: Optional[pa.SSHClient] = jump_client
+
+    def close(self) -> None:
+        super().close()
+        jump_client: Optional[pa.SSHClient] = self.jump_client
+        self.jump_client = None
+        if jump_client is not None:
+            connection_pool.release(self.jump_settings, jump_client)
+
+
+def connect(server_settings: ServerSettings) -> pa.SSHClient:
+    """
+    サーバにssh接続して認証済みのクライアントを作る。
+    踏み台サーバが設定されていれば、踏み台への接続を接続プールから借り、
+    そのdirect-tcpipチャネル上で接続する。
+    打ち切り時刻が設定されていれば(remaining_time)、
+    接続と認証の待ち時間をそれまでに限る。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+
+    Returns:
+        接続済みsshクライアント(paramiko.SSHClient)
+    """
+    if server_settings.proxy is None:
+        ssh: pa.SSHClient = pa.SSHClient()
+        sock: Optional[pa.Channel] = None
+    else:
+        jump_client: pa.SSHClient = connection_pool.acquire(server_settings.proxy)
+        try:
+            sock = jump_client.get_transport().open_channel(
+                "direct-tcpip", (server_settings.host, server_settings.port), ("127.0.0.1", 0),
+                timeout=remaining_time())
+        except BaseException:
+            jump_client.close()
+            raise
+        ssh = ProxiedSSHClient(server_settings.proxy, jump_client)
+    ssh.set_missing_host_key_policy(pa.AutoAddPolicy())
+    timeout: Optional[float] = remaining_time()
+    try:
+        ssh.connect(hostname=server_settings.host,
+                    port=server_settings.port,
+                    username=server_settings.user,
+                    password=server_settings.password,
+                    sock=sock,
+                    compress=server_settings.compress,
+                    timeout=timeout,
+                    banner_timeout=timeout,
+                    auth_timeout=timeout)
+    except BaseException:
+        ssh.close()
+        raise
+    return ssh
+
+
+def is_alive(ssh: pa.SSHClient) -> bool:
+    """
+    ssh接続が生きているかどうかの確認
+    Args:
+        ssh(paramiko.SSHClient): sshクライアント
+
+    Returns:
+        トランスポートが有効で、ignoreメッセージの送信に成功すればTrue(bool)
+    """
+    transport: Optional[pa.Transport] = ssh.get_transport()
+    if transport is None or not transport.is_active():
+        return False
+    try:
+        transport.send_ignore()
+    except (SSHException, EOFError, OSError):
+        return False
+    return True
+
+
+@dataclasses.dataclass
+class PooledConnection:
+    """
+    プール中の待機接続
+    """
+    client: pa.SSHClient  # 接続済みsshクライアント
+    last_used: float  # 最終使用時刻(time.monotonic)
+
+
+class ConnectionPool:
+    """
+    サーバ設定ごとに認証済みssh接続を保持して再利用するプール
+
+    取り出し時に待機時間切れの接続を閉じ、
+    生存確認に失敗した接続は捨てて張り直す。
+    """
+
+    def __init__(self, max_size: int = 4, idle_timeout: float = 300.0,
+                 connector: Callable[[ServerSettings], pa.SSHClient] = connect,
+                 health_check: Callable[[pa.SSHClient], bool] = is_alive):
+        """
+        Args:
+            max_size(int, optional): サーバ設定ごとに保持する待機接続の最大数
+            idle_timeout(float, optional): 待機接続を閉じるまでの秒数
+            connector(Callable[[ServerSettings], paramiko.SSHClient], optional): 接続関数
+            health_check(Callable[[paramiko.SSHClient], bool], optional): 生存確認関数
+        """
+        self.max_size: int = max_size
+        self.idle_timeout: float = idle_timeout
+        self._connector: Callable[[ServerSettings], pa.SSHClient] = connector
+        self._health_check: Callable[[pa.SSHClient], bool] = health_check
+        self._idle: Dict[ServerSettings, List[PooledConnection]] = dict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def acquire(self, server_settings: ServerSettings) -> pa.SSHClient:
+        """
+        プールから接続を取り出す。使える待機接続がなければ新たに接続する。
+        Args:
+            server_settings(ServerSettings): サーバ設定
+
+        Returns:
+            接続済みsshクライアント(paramiko.SSHClient)
+        """
+        while True:
+            # 閉じると踏み台への接続をプールに戻すので、ロックの外で閉じる
+            with self._lock:
+                expired: List[PooledConnection] = self._expire(server_settings)
+                idle: List[PooledConnection] = self._idle.get(server_settings, [])
+                pooled: Optional[PooledConnection] = idle.pop() if len(idle) > 0 else None
+            for expired_pooled in expired:
+                expired_pooled.client.close()
+            if pooled is None:
+                break
+            if self._health_check(pooled.client):
+                return pooled.client
+            pooled.client.close()
+        return self._connector(server_settings)
+
+    def release(self, server_settings: ServerSettings, client: pa.SSHClient) -> None:
+        """
+        使い終わった接続をプールに戻す。プールが一杯なら閉じる。
+        Args:
+            server_settings(ServerSettings): サーバ設定
+            client(paramiko.SSHClient): sshクライアント
+        """
+        with self._lock:
+            idle: List[PooledConnection] = self._idle.setdefault(server_settings, [])
+            if len(idle) < self.max_size:
+                idle.append(PooledConnection(client, time.monotonic()))
+                return
+        client.close()
+
+    @contextmanager
+    def connection(self, server_settings: ServerSettings) -> Generator[pa.SSHClient, None, None]:
+        """
+        プールから接続を借りるコンテキストマネージャ。
+        通信系の例外で抜けたときは接続を捨て、それ以外はプールに戻す。
+        Args:
+            server_settings(ServerSettings): サーバ設定
+
+        Yields:
+            接続済みsshクライアント(paramiko.SSHClient)
+        """
+        client: pa.SSHClient = self.acquire(server_settings)
+        try:
+            yield client
+        except (SSHException, EOFError, OSError):
+            client.close()
+            raise
+        except BaseException:
+            self.release(server_settings, client)
+            raise
+        self.release(server_settings, client)
+
+    def close_all(self) -> None:
+        """
+        待機中の接続をすべて閉じる。
+        閉じた接続がプールに戻した踏み台への接続も閉じる。
+        """
+        while True:
+            with self._lock:
+                idle_all: List[PooledConnection] = sum(self._idle.values(), [])
+                self._idle.clear()
+            if len(idle_all) == 0:
+                return
+            for pooled in idle_all:
+                pooled.client.close()
+
+    def _expire(self, server_settings: ServerSettings) -> List[PooledConnection]:
+        # 待機時間切れの接続をプールから外して返す。
+        # ロックを持って呼び、返った接続はロックの外で閉じる。
+        now: float = time.monotonic()
+        idle: List[PooledConnection] = self._idle.get(server_settings, [])
+        self._idle[server_settings] = \
+            [pooled for pooled in idle if now - pooled.last_used < self.idle_timeout]
+        return [pooled for pooled in idle if now - pooled.last_used >= self.idle_timeout]
+
+
+connection_pool: ConnectionPool = ConnectionPool()  # Serverモジュールの関数が共有する接続プール
+atexit.register(connection_pool.close_all)
+
+
+def drain_stderr(channel: pa.Channel, stderr: bytearray, max_stderr_bytes: int = 65536) -> None:
+    """
+    チャネルに届いている標準エラー出力を読み出す。
+    上限を超えた分は古いほうから捨てる。
+    Args:
+        channel(paramiko.Channel): チャネル
+        stderr(bytearray): 標準エラー出力を追記するバッファ
+        max_stderr_bytes(int, optional): 保持する標準エラー出力の上限(byte)
+    """
+    while channel.recv_stderr_ready():
+        stderr.extend(channel.recv_stderr(max_stderr_bytes))
+        if len(stderr) > max_stderr_bytes:
+            del stderr[:len(stderr) - max_stderr_bytes]
+
+
+def channel_chunks(channel: pa.Channel, stderr: bytearray, chunk_size: int = 32768
+                   ) -> Generator[bytes, None, None]:
+    """
+    チャネルの標準出力を届いた分からそのまま返す。
+    次が要求されるまで読み出さないので、
+    未読分はsshのウィンドウを上限にしてサーバ側で止まる。
+    Args:
+        channel(paramiko.Channel): タイムアウトを設定したチャネル
+        stderr(bytearray): 標準エラー出力を追記するバッファ
+        chunk_size(int, optional): 1回に読み出すbyte数
+
+    Yields:
+        出力のbyte列(bytes)
+
+    Raises:
+        DataReadError: 打ち切り時刻を過ぎた
+    """
+    poll_interval: Optional[float] = channel.gettimeout()
+    while True:
+        drain_stderr(channel, stderr)
+        settimeout_before_deadline(channel, poll_interval)
+        try:
+            data: bytes = channel.recv(chunk_size)
+        except socket.timeout:
+            continue
+        if len(data) == 0:
+            return
+        yield data
+
+
+def settimeout_before_deadline(channel: pa.Channel, timeout: Optional[float]) -> None:
+    """
+    チャネルのタイムアウトを、打ち切り時刻(remaining_time)を超えない秒数に設定する
+    Args:
+        channel(paramiko.Channel): チャネル
+        timeout(float, optional): タイムアウト秒数。Noneなら打ち切り時刻まで。
+
+    Raises:
+        DataReadError: 打ち切り時刻を過ぎた
+    """
+    remaining: Optional[float] = remaining_time()
+    channel.settimeout(remaining if timeout is None else timeout if remaining is None else min(timeout, remaining))
+
+
+def wait_exit_status(channel: pa.Channel, poll_interval: float) -> int:
+    """
+    コマンドの終了ステータスを、打ち切り時刻(remaining_time)まで待つ
+    Args:
+        channel(paramiko.Channel): チャネル
+        poll_interval(float): 打ち切り時刻を確認する間隔(秒)
+
+    Returns:
+        終了ステータス(int)
+
+    Raises:
+        DataReadError: 打ち切り時刻を過ぎた
+    """
+    while not channel.status_event.wait(poll_interval):
+        remaining_time()
+    return channel.recv_exit_status()
+
+
+def channel_lines(channel: pa.Channel, stderr: bytearray, chunk_size: int = 32768,
+                  encoding: str = "utf-8") -> Generator[str, None, None]:
+    """
+    チャネルの標準出力を届いた分から行にして返す。
+    次の行が要求されるまで読み出さないので、
+    未読分はsshのウィンドウを上限にしてサーバ側で止まる。
+    Args:
+        channel(paramiko.Channel): タイムアウトを設定したチャネル
+        stderr(bytearray): 標準エラー出力を追記するバッファ
+        chunk_size(int, optional): 1回に読み出すbyte数
+        encoding(str, optional): 出力の文字コード
+
+    Yields:
+        改行を除いた出力行(str)
+    """
+    decoder: codecs.IncrementalDecoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending: str = ""
+    for data in channel_chunks(channel, stderr, chunk_size):
+        lines: List[str] = (pending + decoder.decode(data)).split("\n")
+        pending = lines.pop()
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending != "":
+        yield pending
+
+
+def iterate_command(ssh: pa.SSHClient, command: str,
+                    accepted_exit_statuses: Optional[Collection[int]] = None,
+                    chunk_size: int = 32768, window_size: Optional[int] = None,
+                    poll_interval: float = 0.5,
+                    reader: Callable[[pa.Channel, bytearray, int], Iterator[Any]] = channel_lines
+                    ) -> Generator[Any, None, None]:
+    """
+    接続済みクライアントでコマンドを走らせ、出力を届いた分から1行ずつ返す。
+    打ち切り時刻が設定されていれば(remaining_time)、
+    その時刻でチャネルを閉じて打ち切る。
+    Args:
+        ssh(paramiko.SSHClient): sshクライアント
+        command(str): コマンド
+        accepted_exit_statuses(Collection[int], optional): 正常とみなす終了ステータス。
+            Noneなら確認しない。
+        chunk_size(int, optional): 1回に読み出すbyte数
+        window_size(int, optional): sshチャネルのウィンドウサイズ(byte)。
+            読み出していない出力の上限になる。
+        poll_interval(float, optional): 標準エラー出力を確認する間隔(秒)
+        reader(Callable[[paramiko.Channel, bytearray, int], Iterator[Any]], optional):
+            チャネルの読み出し関数。デフォルトは行ごと(channel_lines)。
+
+    Yields:
+        改行を除いた出力行(str)。readerを指定すればその出力。
+
+    Raises:
+        DataReadError: 終了ステータスが正常でない、または打ち切り時刻(remaining_time)を過ぎた
+    """
+    transport: Optional[pa.Transport] = ssh.get_transport()
+    if transport is None or not transport.is_active():
+        raise SSHException("ssh connection is not active")
+    channel: pa.Channel = transport.open_session(window_size=window_size, timeout=remaining_time())
+    stderr: bytearray = bytearray()
+    try:
+        settimeout_before_deadline(channel, poll_interval)
+        channel.exec_command(command)
+        channel.settimeout(poll_interval)
+        yield from reader(channel, stderr, chunk_size)
+        exit_status: int = wait_exit_status(channel, poll_interval)
+        drain_stderr(channel, stderr)
+    finally:
+        channel.close()
+    if accepted_exit_statuses is not None and exit_status not in accepted_exit_statuses:
+        raise DataReadError(f"'{command}' exited with status {exit_status}: "
+                            f"{stderr.decode('utf-8', errors='replace').strip()}")
+
+
+def run_command(ssh: pa.SSHClient, command: str) -> List[str]:
+    """
+    接続済みクライアントでコマンドを走らせて出力を得る
+    Args:
+        ssh(paramiko.SSHClient): sshクライアント
+        command(str): コマンド
+
+    Returns:
+        改行でsplitされたコマンド出力(List[str])
+    """
+    return list(iterate_command(ssh, command))
 
 
 def get_command_output(server_settings: ServerSettings, command: str) -> List[str]:
     """
-    サーバ上でコマンドを走らせて出力を得る
+    サーバ上でコマンドを走らせて出力を得る。
+    接続はプールから借り、
+    再利用した接続が切れていた場合は一度だけ張り直して再実行する。
     Args:
         server_settings(ServerSettings): サーバ設定
         command(Str): コマンド
@@ -62,31 +476,212 @@ def get_command_output(server_settings: ServerSettings, command: str) -> List[st
         DataReadError: 接続失敗
     """
     try:
-        with pa.SSHClient() as ssh:
-            ssh.set_missing_host_key_policy(pa.AutoAddPolicy())
-            ssh.connect(hostname=server_settings.host,
-                        port=server_settings.port,
-                        username=server_settings.user,
-                        password=server_settings.password)
-            stdin, stdout, stderr = ssh.exec_command(command)
-            # print(command, stdout)
-            return [f.split("\n")[0] for f in stdout]
+        try:
+            with connection_pool.connection(server_settings) as ssh:
+                return run_command(ssh, command)
+        except AuthenticationException:
+            raise
+        except SSHException:
+            with connection_pool.connection(server_settings) as ssh:
+                return run_command(ssh, command)
     except (SSHException, AuthenticationException, IOError) as e:
         raise DataReadError(e.args[0])
 
 
+def stream_command_output(server_settings: ServerSettings, command: str,
+                          accepted_exit_statuses: Optional[Collection[int]] = (0, 1),
+                          chunk_size: int = 32768, window_size: Optional[int] = None,
+                          reader: Callable[[pa.Channel, bytearray, int], Iterator[Any]] = channel_lines
+                          ) -> Generator[Any, None, None]:
+    """
+    サーバ上でコマンドを走らせ、出力を届いた分から1行ずつ返す。
+    終了ステータスはデフォルトでgrepの「一致なし」(1)まで正常とみなす。
+    まだ1行も返していないうちに再利用した接続が切れていた場合は、
+    一度だけ張り直して再実行する。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        command(str): コマンド
+        accepted_exit_statuses(Collection[int], optional): 正常とみなす終了ステータス。
+            Noneなら確認しない。
+        chunk_size(int, optional): 1回に読み出すbyte数
+        window_size(int, optional): sshチャネルのウィンドウサイズ(byte)。
+            読み出していない出力の上限になる。
+        reader(Callable[[paramiko.Channel, bytearray, int], Iterator[Any]], optional):
+            チャネルの読み出し関数。デフォルトは行ごと(channel_lines)。
+
+    Yields:
+        改行を除いた出力行(str)。readerを指定すればその出力。
+
+    Raises:
+        DataReadError: 接続失敗、または終了ステータスが正常でない(標準エラー出力を含む)
+    """
+    for retry in (False, True):
+        started: bool = False
+        try:
+            with connection_pool.connection(server_settings) as ssh:
+                for line in iterate_command(ssh, command, accepted_exit_statuses, chunk_size, window_size,
+                                            reader=reader):
+                    started = True
+                    yield line
+            return
+        except AuthenticationException as e:
+            raise DataReadError(e.args[0])
+        except SSHException as e:
+            if started or retry:
+                raise DataReadError(e.args[0] if len(e.args) > 0 else str(e))
+        except IOError as e:
+            raise DataReadError(str(e) or type(e).__name__)
+
+
+def get_command_bytes(server_settings: ServerSettings, command: str,
+                      accepted_exit_statuses: Optional[Collection[int]] = (0,)) -> bytes:
+    """
+    サーバ上でコマンドを走らせ、標準出力をそのままのbyte列で得る
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        command(str): コマンド
+        accepted_exit_statuses(Collection[int], optional): 正常とみなす終了ステータス。
+            Noneなら確認しない。
+
+    Returns:
+        標準出力(bytes)
+
+    Raises:
+        DataReadError: 接続失敗、または終了ステータスが正常でない
+    """
+    return b"".join(stream_command_output(server_settings, command, accepted_exit_statuses, reader=channel_chunks))
+
+
+def open_sftp(ssh: pa.SSHClient) -> pa.SFTPClient:
+    """
+    SFTPチャネルを開く。打ち切り時刻が設定されていれば(remaining_time)、
+    各要求の待ち時間をそれまでに限る。
+    Args:
+        ssh(paramiko.SSHClient): sshクライアント
+
+    Returns:
+        SFTPクライアント(paramiko.SFTPClient)
+    """
+    sftp: pa.SFTPClient = ssh.open_sftp()
+    sftp.get_channel().settimeout(remaining_time())
+    return sftp
+
+
+def list_directory(server_settings: ServerSettings, remote_directory: p.PurePath) -> List[FileStat]:
+    """
+    サーバ上のディレクトリのファイル一覧を、各ファイルの属性つきで1回の要求で得る
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        remote_directory(pathlib.PurePath): リモートディレクトリ
+
+    Returns:
+        ファイル属性のリスト(List[FileStat])。ファイル名はfilename属性。
+
+    Raises:
+        DataReadError: 接続失敗
+    """
+    try:
+        with connection_pool.connection(server_settings) as ssh:
+            with open_sftp(ssh) as sftp:
+                return sftp.listdir_attr(str(remote_directory))
+    except (SSHException, AuthenticationException, IOError) as e:
+        raise DataReadError(str(e) or type(e).__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class DownloadReport:
+    """
+    ダウンロードの集計
+    """
+    file_count: int  # ファイル数
+    total_bytes: int  # 合計サイズ(byte)
+    seconds: float  # 所要時間(秒)
+
+    @property
+    def throughput(self) -> float:
+        """
+        平均スループット(byte/s)
+        """
+        return self.total_bytes / self.seconds if self.seconds > 0 else float("inf")
+
+
+def get_files(ssh: pa.SSHClient, remote_directory: p.PurePath, remote_files: "queue.SimpleQueue[FileStat]",
+              local_directory: p.Path, downloaded_files: List[FileWithStat], failed: threading.Event) -> None:
+    """
+    1本のSFTPチャネルで、キューが空になるまでファイルをダウンロードする。
+    読み出しは先読み(prefetch)で要求をまとめて送る。
+    Args:
+        ssh(paramiko.SSHClient): sshクライアント
+        remote_directory(pathlib.PurePath): リモートディレクトリ
+        remote_files(queue.SimpleQueue[FileStat]): ダウンロードするファイルの属性のキュー
+        local_directory(pathlib.Path): ローカルディレクトリ
+        downloaded_files(List[FileWithStat]): ダウンロードしたファイル情報を追記するリスト
+        failed(threading.Event): ほかのチャネルで失敗したらセットされ、
+            残りのダウンロードをやめる
+    """
+    try:
+        with open_sftp(ssh) as sftp:
+            sftp.chdir(str(remote_directory))
+            while not failed.is_set():
+                try:
+                    file_stat: FileStat = remote_files.get_nowait()
+                except queue.Empty:
+                    return
+                local_file: p.Path = local_directory / file_stat.filename
+                downloaded_files.append((local_file, file_stat))
+                sftp.get(file_stat.filename, str(local_file))
+    except BaseException:
+        failed.set()
+        raise
+
+
+def get_files_parallel(ssh: pa.SSHClient, remote_directory: p.PurePath, remote_files: List[FileStat],
+                       local_directory: p.Path, downloaded_files: List[FileWithStat], parallel: int = 4) -> None:
+    """
+    同じ接続上に複数のSFTPチャネルを開き、ファイルを並行してダウンロードする。
+    ダウンロードしたファイル情報はリモートファイルの順に並べる。
+    Args:
+        ssh(paramiko.SSHClient): sshクライアント
+        remote_directory(pathlib.PurePath): リモートディレクトリ
+        remote_files(List[FileStat]): ダウンロードするファイルの属性リスト
+        local_directory(pathlib.Path): ローカルディレクトリ
+        downloaded_files(List[FileWithStat]): ダウンロードしたファイル情報を追記するリスト
+        parallel(int, optional): 同時にダウンロードするファイル数の上限
+    """
+    file_queue: "queue.SimpleQueue[FileStat]" = queue.SimpleQueue()
+    for file_stat in sorted(remote_files, key=lambda file_stat_: file_stat_.st_size or 0, reverse=True):
+        file_queue.put(file_stat)
+    failed: threading.Event = threading.Event()
+    workers: int = max(1, min(parallel, len(remote_files)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures: List[Future] = [executor.submit(contextvars.copy_context().run, get_files, ssh, remote_directory,
+                                                 file_queue, local_directory, downloaded_files, failed)
+                                 for _ in range(workers)]
+    for future in futures:
+        future.result()
+    order: Dict[str, int] = {file_stat.filename: index for index, file_stat in enumerate(remote_files)}
+    downloaded_files.sort(key=lambda file_with_stat: order[file_with_stat[1].filename])
+
+
 @contextmanager
 def download_files(server_settings: ServerSettings,
                    remote_directory: p.PurePath,
                    local_directory=p.Path(tempfile.gettempdir()),
-                   path_predicate=lambda x: True) -> Generator[List[FileWithStat], None, None]:
+                   path_predicate=lambda x: True,
+                   parallel: int = 4,
+                   report: Optional[Callable[[DownloadReport], None]] = None
+                   ) -> Generator[List[FileWithStat], None, None]:
     """
-    サーバ上からファイルをダウンロードする
+    サーバ上からファイルをダウンロードする。
+    ファイル属性はディレクトリ一覧と一緒に得て、
+    複数のファイルを同じ接続上で並行してダウンロードする。
     Args:
         server_settings(ServerSettings): サーバ設定
         remote_directory(pathlib.PurePath): リモートディレクトリ
         local_directory (pathlib.Path, optional): ローカルディレクトリ。デフォルトはOSのテンポラリディレクトリ。
         path_predicate(Callable[[p.PurePath], bool], optional): ファイル名フィルタ関数。デフォルトはTrueの定数関数。
+        parallel(int, optional): 同時にダウンロードするファイル数の上限
+        report(Callable[[DownloadReport], None], optional): ダウンロード後に集計を受け取る関数
 
     Returns:
         ダウンロードしたファイル情報(List[FileWithStat])
@@ -96,27 +691,20 @@ def download_files(server_settings: ServerSettings,
     """
     downloaded_files: List[FileWithStat] = []
     try:
-        with pa.SSHClient() as ssh:
-            ssh.set_missing_host_key_policy(pa.AutoAddPolicy())
-            ssh.connect(
-                hostname=server_settings.host,
-                port=server_settings.port,
-                username=server_settings.user,
-                password=server_settings.password)
-            with ssh.open_sftp() as sftp:
-                sftp.chdir(str(remote_directory))
-                remote_file_names: List[str] = [p.PurePath(file).name for file in sftp.listdir()
-                                                if path_predicate(p.PurePath(file))]
-                downloaded_files: List[FileWithStat] = []
-                for remote_file_name in remote_file_names:
-                    local_file: p.Path = local_directory / remote_file_name
-                    sftp.get(remote_file_name, local_file)
-                    file_stat: pa.SFTPAttributes = sftp.stat(remote_file_name)
-                    downloaded_files.append((local_file, file_stat))
-                yield downloaded_files
+        with connection_pool.connection(server_settings) as ssh:
+            with open_sftp(ssh) as sftp:
+                remote_files: List[FileStat] = [file_stat for file_stat in sftp.listdir_attr(str(remote_directory))
+                                                if path_predicate(p.PurePath(file_stat.filename))]
+            start: float = time.monotonic()
+            get_files_parallel(ssh, remote_directory, remote_files, local_directory, downloaded_files, parallel)
+            seconds: float = time.monotonic() - start
+        if report is not None:
+            report(DownloadReport(len(downloaded_files),
+                                  sum(file_stat.st_size or 0 for _, file_stat in downloaded_files), seconds))
+        yield downloaded_files
 
     except (SSHException, AuthenticationException, IOError) as e:
-        raise DataReadError(e.args[0])
+        raise DataReadError(str(e) or type(e).__name__)
     finally:
         for file, _ in downloaded_files:
             if file.is_file():
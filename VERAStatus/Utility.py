@@ -6,13 +6,24 @@ Utilityモジュール
 from __future__ import annotations
 import json
 import math
+import os
+import pickle
 import re
+import stat
+import tempfile
+import time
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import timezone, tzinfo, timedelta, datetime
 from decimal import Decimal, ROUND_HALF_UP
-from functools import reduce
+from functools import reduce, partial, lru_cache
 import pathlib as p
-from typing import Tuple, List, TypeVar, Dict, Any, Union
+from typing import Tuple, List, TypeVar, Dict, Any, Union, Callable, Optional, Awaitable, Generator
 import asyncio
+from bisect import bisect_left
+
+import numpy as np
 
 T = TypeVar("T")
 
@@ -75,6 +86,87 @@ def read_json(json_file) -> Dict[str, Any]:
         raise DataReadError(f"data readout failed: {json_file} (module {__name__}).")
 
 
+def cache_directory() -> p.Path:
+    """
+    ユーザごとのキャッシュディレクトリのパス。
+    XDG_CACHE_HOME(なければ~/.cache)の下のVERAStatus。
+    Returns:
+        ディレクトリのパス(pathlib.Path)
+    """
+    return p.Path(os.environ.get("XDG_CACHE_HOME") or p.Path.home() / ".cache") / "VERAStatus"
+
+
+def private_directory(directory: p.Path) -> p.Path:
+    """
+    所有者だけが読み書きできるディレクトリを作る。すでにあれば、
+    自分の所有で他人が書き込めないことを確かめる。
+    Args:
+        directory(pathlib.Path): ディレクトリ
+
+    Returns:
+        ディレクトリのパス(pathlib.Path)
+
+    Raises:
+        DataWriteError: 作れない、シンボリックリンクかディレクトリでない、
+            または他人の所有
+    """
+    try:
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        directory_stat: os.stat_result = os.lstat(directory)
+        if not stat.S_ISDIR(directory_stat.st_mode):
+            raise DataWriteError(f"{directory} is not a directory (module {__name__}).")
+        if hasattr(os, "getuid") and directory_stat.st_uid != os.getuid():
+            raise DataWriteError(f"{directory} is not owned by the current user (module {__name__}).")
+        if directory_stat.st_mode & 0o077 != 0:
+            os.chmod(directory, 0o700)
+    except OSError as e:
+        raise DataWriteError(f"cannot use {directory} as a private directory: {e} (module {__name__}).")
+    return directory
+
+
+def load_pickle(file: p.Path) -> Optional[Any]:
+    """
+    pickleファイルを読む。他人が書き込めない場所(private_directory)のファイルだけに使う。
+    Args:
+        file(pathlib.Path): ファイル
+
+    Returns:
+        読んだ値。ないか壊れていればNone。(Optional[Any])
+    """
+    try:
+        with open(file, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError):
+        return None
+
+
+def dump_pickle(file: p.Path, value: Any) -> bool:
+    """
+    値をpickleファイルに書く。
+    同じディレクトリの一時ファイルに書いてから置き換えるので、
+    同時に書くプロセスがあっても読む側が書きかけのファイルを見ることはない。
+    Args:
+        file(pathlib.Path): ファイル
+        value(Any): 値
+
+    Returns:
+        書けたらTrue(bool)
+    """
+    try:
+        f = tempfile.NamedTemporaryFile(dir=file.parent, prefix=f"{file.name}.", suffix=".tmp", delete=False)
+    except OSError:
+        return False
+    temporary_file: p.Path = p.Path(f.name)
+    try:
+        with f:
+            pickle.dump(value, f)
+        os.replace(temporary_file, file)
+    except (OSError, pickle.PicklingError):
+        temporary_file.unlink(missing_ok=True)
+        return False
+    return True
+
+
 def in_jst(date_time: datetime) -> datetime:
     """
     時刻をJSTに変換
@@ -133,6 +225,44 @@ def round_float(r: Union[int, float], order: int) -> Union[int, float]:
     return float(rounded)
 
 
+def round_array(values: Union[np.ndarray, List[float]], order: Union[int, np.ndarray]) -> np.ndarray:
+    """
+    実数配列の各要素を、10進でorderの桁まで四捨五入。round_floatの配列版で、
+    結果はround_floatと一致する。
+    orderが整数で0以上なら、round_floatと同じく整数に丸めた整数配列を返す。
+    ただしNaNや無限大を含むときは、それらを保ったまま実数配列を返す。
+    orderを配列で与えると要素(列)ごとの桁で丸め、実数配列を返す。
+    Args:
+        values(Union[numpy.ndarray, List[float]]): 実数配列、または実数リスト
+        order(Union[int, numpy.ndarray]): 基準の桁、または要素ごとの基準の桁の配列
+
+    Returns:
+        四捨五入された配列(numpy.ndarray)
+    """
+    relative_error_tolerance: float = 1.e-15
+    orders: np.ndarray = np.asarray(order, dtype=np.int64)
+    scale: np.ndarray = np.power(10.0, np.maximum(-orders, 0))
+    tolerant: np.ndarray = np.asarray(values, dtype=np.float64) * (1.0 + relative_error_tolerance)
+    scaled: np.ndarray = np.abs(tolerant * scale)
+    floor: np.ndarray = np.floor(scaled)
+    fraction: np.ndarray = scaled - floor
+    rounded: np.ndarray = np.sign(tolerant) * (floor + (fraction >= 0.5))
+    result: np.ndarray = rounded / scale
+
+    # 10倍のスケーリングの丸め誤差で結果が変わりうる、
+    # ちょうど半分付近の要素だけDecimalで丸め直す
+    ambiguous: np.ndarray = np.flatnonzero(np.abs(fraction - 0.5) < 1.e-6)
+    if len(ambiguous) > 0:
+        values_array: np.ndarray = np.broadcast_to(np.asarray(values, dtype=np.float64), result.shape)
+        orders_array: np.ndarray = np.broadcast_to(orders, result.shape)
+        for index in ambiguous:
+            result.flat[index] = round_float(values_array.flat[index], int(orders_array.flat[index]))
+
+    if orders.ndim == 0 and order >= 0 and np.all(np.isfinite(result)):
+        return result.astype(np.int64)
+    return result
+
+
 def doy2datetime(year: int, doy: int) -> datetime:
     """
     年と通日からUTCで00:00の時刻を持つdatetimeオブジェクトにする。
@@ -160,20 +290,113 @@ def doy_string2datetime(doy_string: str) -> datetime:
         """
     if re.match(r"\d{7}", doy_string) is None:
         raise UsageError(f"input string {doy_string} cannot be converted to datetime (module {__name__}).")
-    return datetime.strptime(doy_string + '000000+0000', '%Y%j%H%M%S%z')
+    return doy_base(int(doy_string[0:4]), int(doy_string[4:7]))
+
+
+@lru_cache(maxsize=64)
+def doy_base(year: int, doy: int) -> datetime:
+    """
+    年と通日から、その日のUTC 00:00のdatetimeオブジェクトを得る。
+    日ごとにキャッシュする。
+    Args:
+        year(int): 年
+        doy(int): 通日
+
+    Returns:
+        datetimeオブジェクト(datetime.datetime)
+
+    Raises:
+        ValueError: 通日がその年の範囲外
+    """
+    day_start: datetime = datetime(year, 1, 1, tzinfo=UTC) + timedelta(days=doy - 1)
+    if doy < 1 or day_start.year != year:
+        raise ValueError(f"day of year {doy} is out of range in {year}.")
+    return day_start
+
+
+def doy_time2datetime(year: int, doy: int, hour: int, minute: int, second: int) -> datetime:
+    """
+    年・通日・時分秒からUTCのdatetimeオブジェクトを得る。strptimeを使わない。
+    Args:
+        year(int): 年
+        doy(int): 通日
+        hour(int): 時
+        minute(int): 分
+        second(int): 秒
+
+    Returns:
+        datetimeオブジェクト(datetime.datetime)
+
+    Raises:
+        ValueError: 範囲外の値
+    """
+    return doy_base(year, doy).replace(hour=hour, minute=minute, second=second)
 
 
 def time_string2datetime(time_string: str) -> datetime:
     """
     UTC時刻文字列をdatetimeにする。
-    例えば20201026012345をdatetime(2020, 10, 26, 1, 23, 45, {UTC})にする。
+    例えば2020300012345をdatetime(2020, 10, 26, 1, 23, 45, {UTC})にする。
     Args:
-        time_string(str): UTC時刻文字列
+        time_string(str): UTC時刻文字列(YYYYJJJHHMMSS)
 
     Returns:
         datetimeオブジェクト(datetime.datetime)
+
+    Raises:
+        ValueError: YYYYJJJHHMMSSの形でない
+    """
+    if len(time_string) != 13 or not time_string.isdigit():
+        raise ValueError(f"time string {time_string} is not in YYYYJJJHHMMSS form.")
+    return doy_time2datetime(int(time_string[0:4]), int(time_string[4:7]),
+                             int(time_string[7:9]), int(time_string[9:11]), int(time_string[11:13]))
+
+
+def vex_time_string2datetime(time_string: str) -> datetime:
+    """
+    vex形式のUTC時刻文字列をdatetimeにする。
+    例えば2020y300d01h23m45sをdatetime(2020, 10, 26, 1, 23, 45, {UTC})にする。
+    Args:
+        time_string(str): UTC時刻文字列(YYYYyJJJdHHhMMmSSs)
+
+    Returns:
+        datetimeオブジェクト(datetime.datetime)
+
+    Raises:
+        ValueError: YYYYyJJJdHHhMMmSSsの形でない
+    """
+    if len(time_string) != 18 or time_string[4] + time_string[8] + time_string[11] + time_string[14] \
+            + time_string[17] != "ydhms":
+        raise ValueError(f"time string {time_string} is not in YYYYyJJJdHHhMMmSSs form.")
+    return doy_time2datetime(int(time_string[0:4]), int(time_string[5:8]),
+                             int(time_string[9:11]), int(time_string[12:14]), int(time_string[15:17]))
+
+
+def string_digits(strings: Union[List[str], np.ndarray], width: int) -> np.ndarray:
+    """
+    同じ長さの文字列の配列を、各文字を数字とみなした整数の2次元配列にする。
+    Args:
+        strings(Union[List[str], numpy.ndarray]): 文字列の配列
+        width(int): 文字列の長さ
+
+    Returns:
+        (文字列数, width)の整数配列(numpy.ndarray)。数字でない文字の値は意味を持たない。
+    """
+    return np.asarray(strings, dtype=f"U{width}").view(np.uint32).reshape(-1, width).astype(np.int64) - ord("0")
+
+
+def digits2number(digits: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """
+    string_digitsの結果の[start, stop)の桁を10進の整数にする。
+    Args:
+        digits(numpy.ndarray): string_digitsの結果
+        start(int): 開始桁
+        stop(int): 終了桁(含まない)
+
+    Returns:
+        整数配列(numpy.ndarray)
     """
-    return datetime.strptime(time_string + "+0000", "%Y%j%H%M%S%z")
+    return digits[:, start:stop] @ (10 ** np.arange(stop - start - 1, -1, -1, dtype=np.int64))
 
 
 def datetime2time_string(date_time: datetime) -> str:
@@ -259,16 +482,192 @@ def get_now() -> datetime:
     return datetime.now(tz=UTC)
 
 
-def async_execution(tasks):
+current_deadline: ContextVar[Optional[float]] = \
+    ContextVar("current_deadline", default=None)  # ブロッキングする通信を打ち切る時刻(time.monotonic)
+current_executor: ContextVar[Optional[Executor]] = \
+    ContextVar("current_executor", default=None)  # run_blockingが使うエクゼキュータ
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Generator[None, None, None]:
+    """
+    このコンテキストの中で、ブロッキングする通信を打ち切る時刻を設定する。
+    すでに設定されていれば、早いほうの時刻にする。
+    Args:
+        deadline(float, optional): 打ち切る時刻(time.monotonic)。Noneなら今の設定のまま。
+    """
+    token = current_deadline.set(earlier_deadline(current_deadline.get(), deadline))
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+@contextmanager
+def executor_scope(executor: Optional[Executor]) -> Generator[None, None, None]:
+    """
+    このコンテキストの中で、run_blockingが使うエクゼキュータを設定する。
+    Args:
+        executor(concurrent.futures.Executor, optional): エクゼキュータ。Noneならループの既定。
+    """
+    token = current_executor.set(executor)
+    try:
+        yield
+    finally:
+        current_executor.reset(token)
+
+
+def earlier_deadline(deadline1: Optional[float], deadline2: Optional[float]) -> Optional[float]:
+    """
+    2つの打ち切り時刻の早いほう
+    Args:
+        deadline1(float, optional): 打ち切り時刻(time.monotonic)。Noneなら無制限。
+        deadline2(float, optional): 打ち切り時刻(time.monotonic)。Noneなら無制限。
+
+    Returns:
+        早いほうの打ち切り時刻。どちらも無制限ならNone。(Optional[float])
+    """
+    if deadline1 is None:
+        return deadline2
+    return deadline1 if deadline2 is None else min(deadline1, deadline2)
+
+
+def timeout2deadline(timeout: Optional[float]) -> Optional[float]:
+    """
+    タイムアウト秒数を、今からの打ち切り時刻にする
+    Args:
+        timeout(float, optional): タイムアウト秒数。Noneなら無制限。
+
+    Returns:
+        打ち切り時刻(time.monotonic)。無制限ならNone。(Optional[float])
+    """
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def remaining_time() -> Optional[float]:
+    """
+    設定された打ち切り時刻までの残り秒数
+    Returns:
+        残り秒数。打ち切り時刻が設定されていなければNone。(Optional[float])
+
+    Raises:
+        DataReadError: 打ち切り時刻を過ぎた
+    """
+    deadline: Optional[float] = current_deadline.get()
+    if deadline is None:
+        return None
+    remaining: float = deadline - time.monotonic()
+    if remaining <= 0.0:
+        raise DataReadError(f"deadline exceeded (module {__name__}).")
+    return remaining
+
+
+def call_before(deadline: Optional[float], function: Callable[..., T], *args: Any) -> T:
+    """
+    打ち切り時刻を設定して関数を呼ぶ。
+    エクゼキュータのスレッドに打ち切り時刻を引き継ぐのに使う。
+    Args:
+        deadline(float, optional): 打ち切り時刻(time.monotonic)
+        function(Callable[..., T]): 関数
+        *args(Any): 関数の引数
+
+    Returns:
+        関数の戻り値(T)
+    """
+    with deadline_scope(deadline):
+        return function(*args)
+
+
+async def run_blocking(function: Callable[..., T], *args: Any, timeout: Optional[float] = None) -> T:
+    """
+    ブロッキングする関数をエクゼキュータ(スレッド)で走らせて待つコルーチン。
+    タイムアウトはスレッドに打ち切り時刻として渡し、
+    通信はその時刻で打ち切られる(remaining_time)。
+    Args:
+        function(Callable[..., T]): 関数
+        *args(Any): 関数の引数
+        timeout(float, optional): タイムアウト秒数。Noneなら無制限。
+
+    Returns:
+        関数の戻り値(T)
+
+    Raises:
+        DataReadError: タイムアウト
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    deadline: Optional[float] = earlier_deadline(current_deadline.get(), timeout2deadline(timeout))
+    wait: Optional[float] = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(current_executor.get(), partial(call_before, deadline, function, *args)), wait)
+    except asyncio.TimeoutError:
+        raise DataReadError(f"{getattr(function, '__name__', function)} timed out "
+                            + f"after {wait if timeout is None else timeout} s (module {__name__}).")
+
+
+async def gather_tasks(awaitables: List[Awaitable[T]]) -> List[T]:
+    """
+    複数のコルーチンを並行に走らせて結果を待つ。
+    どれかが失敗したら残りのタスクをキャンセルしてから例外を送出する。
+    Args:
+        awaitables(List[Awaitable[T]]): コルーチンのリスト
+
+    Returns:
+        各コルーチンの結果のリスト(List[T])
+    """
+    tasks: List[asyncio.Future] = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def async_execution(tasks: List[Awaitable[T]]) -> List[T]:
     """
     タスクの非同期実行
     Args:
-        tasks(List[Callable]): タスクのリスト
+        tasks(List[Awaitable[T]]): コルーチンのリスト
+
+    Returns:
+        各タスクの結果のリスト(List[T])
     """
-    loop = asyncio.get_event_loop()
-    future = asyncio.gather(*tasks)
-    loop.run_until_complete(future)
-    return future.result()
+    return asyncio.run(gather_tasks(tasks))
+
+
+def nearest_indices(sorted_times: List[datetime], query_times: List[datetime],
+                    tolerance: timedelta) -> List[Optional[int]]:
+    """
+    時刻順に並んだ時刻リストから、各問い合わせ時刻に最も近い時刻の添字を探す。
+    問い合わせ時刻が時刻順なら、
+    探索開始位置を前回の位置から進めるので全体でO(n+m)になる。
+    Args:
+        sorted_times(List[datetime.datetime]): 時刻順に並んだ時刻リスト
+        query_times(List[datetime.datetime]): 問い合わせ時刻リスト
+        tolerance(datetime.timedelta): 許容する時刻差
+
+    Returns:
+        各問い合わせ時刻に最も近い時刻の添字(List[Optional[int]])。
+        許容差以内になければNone。
+    """
+    indices: List[Optional[int]] = list()
+    low: int = 0
+    previous_time: Optional[datetime] = None
+    for query_time in query_times:
+        if previous_time is not None and query_time < previous_time:
+            low = 0
+        previous_time = query_time
+        low = bisect_left(sorted_times, query_time, low)
+        candidates: List[int] = [index for index in (low - 1, low) if 0 <= index < len(sorted_times)]
+        if len(candidates) == 0:
+            indices.append(None)
+            continue
+        nearest: int = min(candidates, key=lambda index: abs(sorted_times[index] - query_time))
+        indices.append(nearest if abs(sorted_times[nearest] - query_time) <= tolerance else None)
+        low = max(low - 1, 0)
+    return indices
 
 
 def wind_direction2octas(direction_degree: float) -> str:
@@ -316,9 +715,9 @@ def egrep_or_str(or_string_list: List[str]) -> str:
     return reduce(lambda ss, s: ss + f'|{s}', or_string_list[1:], start_string)
 
 
-def egrep_command_remote_remote(file: p.PurePath, or_str: Union[str, List[str]]) -> str:
+def egrep_command(file: p.PurePath, or_str: Union[str, List[str]]) -> str:
     """
-    リモートサーバからさらにリモートのサーバ上のファイルの問い合わせをするときの、
+    リモートサーバ上のファイルの問い合わせをするときの、
     egrepによるファイル内の文字列検索コマンドの生成
     Args:
         file(pathlib.PurePath: 対象ファイル
@@ -329,20 +728,22 @@ def egrep_command_remote_remote(file: p.PurePath, or_str: Union[str, List[str]])
     """
     if type(or_str) is str:
         return f"egrep {or_str} {str(file)}"
-    return rf'egrep "\"{egrep_or_str(or_str)}"\" {str(file)}'
+    return rf'egrep "{egrep_or_str(or_str)}" {str(file)}'
 
 
-def egrep_command(file: p.PurePath, or_str: Union[str, List[str]]) -> str:
+def egrep_files_command(files: List[p.PurePath], or_str: Union[str, List[str]]) -> str:
     """
-    リモートサーバ上のファイルの問い合わせをするときの、
-    egrepによるファイル内の文字列検索コマンドの生成
+    リモートサーバ上の複数ファイルをまとめて問い合わせるときの、
+    egrepによるファイル内の文字列検索コマンドの生成。
+    出力の各行は"ファイルパス:行"の形になる。
     Args:
-        file(pathlib.PurePath: 対象ファイル
+        files(List[pathlib.PurePath]): 対象ファイルリスト
         or_str(Union[str, List[str]]): 検索文字列、またはor検索をしたい文字列リスト
 
     Returns:
          検索コマンド
     """
+    file_str: str = " ".join(str(file) for file in files)
     if type(or_str) is str:
-        return f"egrep {or_str} {str(file)}"
-    return rf'egrep "{egrep_or_str(or_str)}" {str(file)}'
+        return f"egrep -H {or_str} {file_str}"
+    return rf'egrep -H "{egrep_or_str(or_str)}" {file_str}'
@@ -4,7 +4,7 @@ VERAStatus module
 data records to be handled.
 """
 from __future__ import annotations
-__all__ = ["VERAStatus", "ObservationInfo", "Observations", "Weather", "SecZData"]
+__all__ = ["VERAStatus", "StationStatus", "ObservationInfo", "Observations", "Weather", "SecZData"]
 
 import dataclasses
 from datetime import datetime
@@ -20,6 +20,17 @@ class VERAStatus:
     secZ_list: List[SecZData]  # secZ information
 
 
+@dataclasses.dataclass
+class StationStatus:
+    station: str  # station name
+    status: Optional[VERAStatus]  # status, None if the query failed
+    error: Optional[str] = None  # error message of the failed query
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status is not None
+
+
 @total_ordering
 @dataclasses.dataclass(frozen=True)
 class ObservationInfo:
@@ -74,7 +85,7 @@ class SecZData:
     system_temperature: float  # システム雑音温度(K)
     band: str  # 測定バンド
     misc: str  # その他
-    weather: Weather  # 気象データ
+    weather: Optional[Weather]  # 気象データ。測定時刻近くのデータがなければNone。
 
     @property
     def output_str(self) -> str:
@@ -82,7 +93,7 @@ class SecZData:
                f"optical depth #1: {-self.optical_depth0:.2f}\n" \
                f"receiver temperature: {self.receiver_temperature:.0f}K\n" \
                f"system temperature: {self.system_temperature:.0f}K\n"\
-               + self.weather.output_str
+               + ("no weather data\n" if self.weather is None else self.weather.output_str)
 
 
 @total_ordering
@@ -11,7 +11,7 @@ import pathlib as p
 from typing import Dict, List, Union, Any, Optional, Match, Generator
 
 from .Server import ServerSettings, download_files, FileStat, FileWithStat, get_command_output
-from .Utility import UTC, egrep_command
+from .Utility import UTC, egrep_command, egrep_files_command, doy_base, vex_time_string2datetime
 from .VERAStatus import ObservationInfo
 
 
@@ -55,46 +55,40 @@ def download_files_between(date_start: datetime, date_end: datetime,
     return downloaded_file_paths_stat
 
 
-def schedule_files_between(date_start: datetime, date_end: datetime,
-                           server_settings: ServerSettings) -> List[p.PurePath]:
+def date_predicate(file: p.PurePath, date_start: date, date_end: date) -> bool:
     """
-    サーバにある、指定された期間の日の間にある観測ファイルのリスト
-
-    Note:
-        date_end(期間終了日)は含まない。
-
+    観測ファイル名からわかる観測開始日が、指定された期間の日の間にあるかどうか
     Args:
+        file(pathlib.PurePath): 観測ファイルパス
         date_start(datetime.datetime): 期間開始日の任意の時刻
         date_end(datetime.datetime): 期間終了日の任意の時刻
-        server_settings(ServerSettings): サーバ設定
 
     Returns:
-        スケジュールファイルリスト(List[pathlib.PurePath])
+        期間開始時刻の日(date_from.date)<=観測名の日<期間終了時刻の日(date_end.date)ならTrue(bool)
+        期間終了時刻の日は含まない。
     """
-    files: List[p.PurePath] = \
-        [server_settings.schedule_directory / path for path
-         in get_command_output(server_settings, f"ls {server_settings.schedule_directory}")
-         if date_predicate(p.PurePosixPath(path), date_start.date(), date_end.date())]
-    return files
+    observation_date: Optional[date] = schedule_file_date(file)
+    if observation_date is None:
+        return False
+    return file.suffix == ".vex" and date_start <= observation_date < date_end
 
 
-def date_predicate(file: p.PurePath, date_start: date, date_end: date) -> bool:
+def schedule_file_date(file: p.PurePath) -> Optional[date]:
     """
-    観測ファイル名からわかる観測開始日が、指定された期間の日の間にあるかどうか
+    観測ファイル名からわかる観測開始日
     Args:
         file(pathlib.PurePath): 観測ファイルパス
-        date_start(datetime.datetime): 期間開始日の任意の時刻
-        date_end(datetime.datetime): 期間終了日の任意の時刻
 
     Returns:
-        期間開始時刻の日(date_from.date)<=観測名の日<期間終了時刻の日(date_end.date)ならTrue(bool)
-        期間終了時刻の日は含まない。
+        観測開始日(datetime.date)。ファイル名から読めなければNone。
     """
+    date_string: str = file.name[1:6]
+    if len(date_string) != 5 or not date_string.isdigit():
+        return None
     try:
-        observation_date = datetime.strptime(f"20{file.name[1:6]}", "%Y%j").date()
+        return doy_base(2000 + int(date_string[0:2]), int(date_string[2:5])).date()
     except ValueError:
-        return False
-    return file.suffix == ".vex" and date_start <= observation_date < date_end
+        return None
 
 
 def make_observation_info(vex_file: p.Path, file_stat: FileStat) -> ObservationInfo:
@@ -144,7 +138,7 @@ def vex_time2datetime(time_string: str) -> datetime:
     Returns:
         datetimeオブジェクト(datetime.datetime)
     """
-    return datetime.strptime(time_string + "+0000", "%Yy%jd%Hh%Mm%Ss%z")
+    return vex_time_string2datetime(time_string)
 
 
 def vex_lines2observation_info(obs_info_lines: Dict[str, Any],
@@ -199,6 +193,52 @@ def schedule_file2observation_info(server_settings: ServerSettings,
     return vex_lines2observation_info(obs_info_lines)
 
 
+def split_lines_by_file(lines: List[str], files: List[p.PurePath]) -> Dict[p.PurePath, List[str]]:
+    """
+    "ファイルパス:行"の形の複数ファイル検索結果を、
+    ファイルごとの行リストに分ける。
+    Args:
+        lines(List[str]): 検索結果の行リスト
+        files(List[pathlib.PurePath]): 検索対象ファイルリスト
+
+    Returns:
+        ファイルごとの行リスト(Dict[pathlib.PurePath, List[str]])
+    """
+    file_lines: Dict[p.PurePath, List[str]] = {file: [] for file in files}
+    file_names: Dict[str, p.PurePath] = {str(file): file for file in files}
+    for line in lines:
+        file_name, separator, content = line.partition(":")
+        if separator == "" or file_name not in file_names:
+            continue
+        file_lines[file_names[file_name]].append(content)
+    return file_lines
+
+
+def schedule_files2observation_info(server_settings: ServerSettings,
+                                    schedule_files: List[p.PurePath],
+                                    file_stats: Optional[List[FileStat]] = None) -> List[ObservationInfo]:
+    """
+    サーバ上の複数のスケジュールファイルの内容を、
+    1回のコマンドでまとめて取得して観測情報にする
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        schedule_files(List[pathlib.PurePath]): スケジュールファイルのサーバ上のパスのリスト
+        file_stats(List[FileStat], optional): 各スケジュールファイルの情報。
+            あれば最終更新時刻を観測情報に入れる。
+
+    Returns:
+        観測情報リスト(List[ObservationInfo])
+    """
+    if len(schedule_files) == 0:
+        return list()
+    lines: List[str] = get_command_output(
+        server_settings,
+        egrep_files_command(schedule_files, list(vex_file_keywords().values())))
+    stats: List[Optional[FileStat]] = [None] * len(schedule_files) if file_stats is None else file_stats
+    return [vex_lines2observation_info(extract_obs_info(file_lines), file_stat)
+            for file_lines, file_stat in zip(split_lines_by_file(lines, schedule_files).values(), stats)]
+
+
 def correct_names(observation_info_dict: Dict[str, Any]) -> None:
     """
     観測情報辞書にPI情報がない（＝元のスケジュールに書いてない）などの
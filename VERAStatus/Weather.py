@@ -5,15 +5,20 @@ Weatherモジュール
 """
 from __future__ import annotations
 
-__all__ = ["Weather", "require_weather_list", "log_file_weather_server",
-           "query_command_weather_server"]
+__all__ = ["Weather", "require_weather_between", "require_weather_at", "join_weather", "log_file_weather_server",
+           "query_command_weather_server_range"]
 
-from datetime import datetime
+from bisect import bisect_left
+import dataclasses
+from datetime import datetime, timedelta
 import pathlib as p
-from typing import Dict, List
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
-from .Server import get_command_output, ServerSettings
-from .Utility import datetime2doy_string, datetime2time_string, egrep_command_remote_remote
+from .Cache import CacheEntry, day_cache
+from .Log import LogTail, log_tail
+from .Server import ServerSettings, stream_command_output
+from .Utility import datetime2doy_string, datetime2time_string, doy_string2datetime, incremented_day, \
+    nearest_indices, time_string2datetime
 
 from .VERAStatus import Weather
 
@@ -31,18 +36,27 @@ def log_file_weather_server(date_time: datetime) -> p.PurePath:
     return p.PurePosixPath("/usr2/log/days") / date_str / f"{date_str}.WS.log"
 
 
-def query_command_weather_server(date_time_list: List[datetime]) -> str:
+def query_command_weather_server_range(date_from: datetime, date_until: datetime, nested: bool = True) -> str:
     """
-    時刻リストから、気象ログの該当行を取得するための、気象データサーバ(clock)用コマンドを生成
+    時刻範囲の気象ログの行をまとめて取得するための、
+    気象データサーバ(clock)用コマンドを生成
     Args:
-        date_time_list(List[datetime.datetime]): 時刻リスト
+        date_from(datetime.datetime): 開始時刻(含む)
+        date_until(datetime.datetime): 終了時刻(含む)
+        nested(bool, optional): Trueなら"ssh clock -f"に渡す形、
+            Falseなら気象データサーバで直接実行する形
 
     Returns:
         コマンド(str)
     """
-    time_str_list: List[str] = [datetime2time_string(date_time) for date_time in date_time_list]
-    return egrep_command_remote_remote(
-        log_file_weather_server(date_time_list[0]), time_str_list) + rf" | grep -v \;"
+    condition: str = f"$1>={datetime2time_string(date_from)}&&$1<={datetime2time_string(date_until)}"
+    if not nested:
+        return f"awk '{condition}' {log_file_weather_server(date_from)} | grep -v \\;"
+    # grepも気象データサーバで走らせる。
+    # 手元でパイプにつなぐと終了ステータスがgrepのものになり、
+    # "ssh clock"の失敗が出力なしの成功に見えてしまう。
+    return r'"awk ' + "'" + condition.replace("$", r"\$") \
+        + "' " + f"{log_file_weather_server(date_from)} | grep -v ';'" + '"'
 
 
 def uniq_lines(lines_raw: List[List[str]]) -> List[List[str]]:
@@ -59,24 +73,253 @@ def uniq_lines(lines_raw: List[List[str]]) -> List[List[str]]:
     return [[time_str] + values for time_str, values in lines_dict.items()]
 
 
-def require_weather_list(server_settings: ServerSettings, date_time_list: List[datetime]) -> List[Weather]:
+def merge_weather_list(weather_list1: List[Weather], weather_list2: List[Weather]) -> List[Weather]:
+    """
+    気象データリストを時刻順に併合する。
+    同じ時刻のデータはあとのリストのものを採用する。
+    Args:
+        weather_list1(List[Weather]): 気象データリスト
+        weather_list2(List[Weather]): 気象データリスト
+
+    Returns:
+        時刻順の気象データリスト(List[Weather])
+    """
+    weather_dict: Dict[datetime, Weather] = {weather.date_time: weather for weather in weather_list1}
+    weather_dict.update({weather.date_time: weather for weather in weather_list2})
+    return sorted(weather_dict.values())
+
+
+def query_weather_lines(server_settings: ServerSettings, command: Callable[[bool], str]) -> List[List[str]]:
+    """
+    気象データサーバ(clock)上でコマンドを走らせ、
+    空白でsplitされた気象データの行を得る。
+    気象データサーバが設定されていれば踏み台経由で直接、
+    なければサーバから"ssh clock"で実行する。
+    出力は届いた行から順にsplitする。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        command(Callable[[bool], str]): "ssh clock -f"に渡す形ならTrueを受けて、
+            気象データサーバ用コマンドを返す関数
+
+    Returns:
+        気象データの文字列リスト(List[List[str]])
+    """
+    lines: Iterable[str] = \
+        stream_command_output(server_settings, "ssh clock -f " + command(True)) \
+        if server_settings.weather_server is None else \
+        stream_command_output(server_settings.weather_server, command(False))
+    return [line.split() for line in lines if line.strip() != ""]
+
+
+def require_weather_between(server_settings: ServerSettings, date_from: datetime, date_until: datetime,
+                            partial_day: timedelta = timedelta(hours=1)) -> List[Weather]:
+    """
+    時刻範囲の気象データを、ログに記録された間隔のまま取得する。
+    範囲が日をまたげば、日ごとのログファイルから取得してつなげる。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        date_from(datetime.datetime): 開始時刻(含む)
+        date_until(datetime.datetime): 終了時刻(含む)
+        partial_day(datetime.timedelta, optional): 書き込みの終わった日で、
+            範囲がこれより短くキャッシュもなければ、
+            1日分ではなく範囲だけを取得する
+
+    Returns:
+        時刻順の気象データリスト(List[Weather])
+    """
+    weather_list: List[Weather] = list()
+    day_start: datetime = doy_string2datetime(datetime2doy_string(date_from))
+    while day_start <= date_until:
+        next_day_start: datetime = incremented_day(day_start)
+        weather_list += require_weather_day(server_settings, day_start, max(date_from, day_start),
+                                            min(date_until, next_day_start - timedelta(seconds=1)), partial_day)
+        day_start = next_day_start
+    return weather_list
+
+
+def require_weather_day(server_settings: ServerSettings, day_start: datetime,
+                        date_from: datetime, date_until: datetime, partial_day: timedelta) -> List[Weather]:
+    """
+    1日のログファイルの中の時刻範囲の気象データを取得する。
+    書き込み中の日は前回から追記された分だけを取得する。
+    書き込みの終わった日は1日分をまとめて取得してキャッシュする。
+    ただし範囲がその日の一部にしかかからず、キャッシュもなければ、
+    範囲だけを取得する。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        day_start(datetime.datetime): 日の開始時刻
+        date_from(datetime.datetime): 開始時刻(含む)。その日の中。
+        date_until(datetime.datetime): 終了時刻(含む)。その日の中。
+        partial_day(datetime.timedelta): 範囲だけを取得する範囲の長さの上限
+
+    Returns:
+        時刻順の気象データリスト(List[Weather])
+    """
+    if not day_cache.is_closed(day_start):
+        return [weather for weather in require_weather_growing(server_settings, day_start)
+                if date_from <= weather.date_time <= date_until]
+    entry: Optional[CacheEntry] = day_cache.load(server_settings, day_start, "weather_day")
+    if entry is None and (not day_cache.enabled or date_until - date_from < partial_day):
+        return fetch_weather_between(server_settings, date_from, date_until)
+    if entry is None:
+        weather_list: List[Weather] = fetch_weather_between(
+            server_settings, day_start, incremented_day(day_start) - timedelta(seconds=1))
+        # 空の結果は取得の失敗かもしれないのでキャッシュしない
+        if len(weather_list) > 0:
+            day_cache.store(server_settings, day_start, "weather_day", weather_list)
+    else:
+        weather_list = entry.records
+    return [weather for weather in weather_list if date_from <= weather.date_time <= date_until]
+
+
+def require_weather_growing(server_settings: ServerSettings, day: datetime) -> List[Weather]:
+    """
+    書き込み中の日の気象データを、前回の問い合わせから追記された分だけ取得して、
+    それまでの分に合わせて得る。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        day(datetime.datetime): 日の任意の時刻
+
+    Returns:
+        その日のこれまでの時刻順の気象データリスト(List[Weather])
+    """
+    tail: LogTail = log_tail(server_settings, "weather", log_file_weather_server(day))
+    if server_settings.weather_server is not None:
+        return tail.update(server_settings.weather_server, lines2weather_list, append_weather_list)
+    return tail.update(server_settings, lines2weather_list, append_weather_list,
+                       lambda command: f"ssh clock -f '{command}'")
+
+
+def lines2weather_list(lines: List[str]) -> List[Weather]:
+    """
+    気象ログの行を気象データにする。コメント行(";"を含む)と空行は飛ばす。
+    Args:
+        lines(List[str]): 気象ログの行リスト
+
+    Returns:
+        時刻順の気象データリスト(List[Weather])
+    """
+    return sorted(line2weather(line) for line in
+                  uniq_lines([line.split() for line in lines if ";" not in line and line.strip() != ""]))
+
+
+def append_weather_list(weather_list: List[Weather], new_weather_list: List[Weather]) -> List[Weather]:
+    """
+    時刻順の気象データリストに、あとから記録された気象データを足す。
+    新しい分がすべてあとの時刻なら連結し、そうでなければ時刻で併合する。
+    Args:
+        weather_list(List[Weather]): 時刻順の気象データリスト
+        new_weather_list(List[Weather]): 時刻順の新しい気象データリスト
+
+    Returns:
+        時刻順の気象データリスト(List[Weather])
+    """
+    if len(weather_list) == 0 or len(new_weather_list) == 0 \
+            or weather_list[-1].date_time < new_weather_list[0].date_time:
+        return weather_list + new_weather_list
+    return merge_weather_list(weather_list, new_weather_list)
+
+
+def fetch_weather_between(server_settings: ServerSettings,
+                          date_from: datetime, date_until: datetime) -> List[Weather]:
+    """
+    時刻範囲の気象データを気象データサーバへの問い合わせで得る。
+    Args:
+        server_settings(ServerSettings): サーバ設定
+        date_from(datetime.datetime): 開始時刻(含む)
+        date_until(datetime.datetime): 終了時刻(含む)
+
+    Returns:
+        時刻順の気象データリスト(List[Weather])
+    """
+    lines: List[List[str]] = uniq_lines(query_weather_lines(
+        server_settings, lambda nested: query_command_weather_server_range(date_from, date_until, nested)))
+    return sorted([line2weather(line) for line in lines])
+
+
+def require_weather_at(server_settings: ServerSettings, date_time_list: List[datetime],
+                       tolerance: timedelta = timedelta(seconds=30),
+                       interpolate: bool = False) -> List[Optional[Weather]]:
     """
-    時刻リストに対応する気象データリストをサーバから取得する。
+    時刻リストを含む範囲の気象データを1回で取得し、
+    各時刻に最も近い気象データを対応させる。
     Args:
-        server_settings: サーバ設定
-        date_time_list: 時刻リスト
+        server_settings(ServerSettings): サーバ設定
+        date_time_list(List[datetime.datetime]): 時刻リスト
+        tolerance(datetime.timedelta, optional): 許容する時刻差
+        interpolate(bool, optional): Trueなら前後の気象データから線形補間する。
 
     Returns:
-        気象データリスト(List[Weather])
+        各時刻に対応する気象データ。許容差以内になければNone。(List[Optional[Weather]])
     """
     if len(date_time_list) == 0:
         return list()
-    lines_raw: List[List[str]] = \
-        [line.split() for line
-         in get_command_output(
-            server_settings, "ssh clock -f " + query_command_weather_server(date_time_list))]
-    lines: List[List[str]] = uniq_lines(lines_raw)
-    return sorted([line2weather(line) for line in lines])
+    weather_list: List[Weather] = require_weather_between(
+        server_settings, min(date_time_list) - tolerance, max(date_time_list) + tolerance)
+    return join_weather(date_time_list, weather_list, tolerance, interpolate)
+
+
+def join_weather(date_time_list: List[datetime], weather_list: List[Weather],
+                 tolerance: timedelta = timedelta(seconds=30),
+                 interpolate: bool = False) -> List[Optional[Weather]]:
+    """
+    各時刻に、許容差以内で最も近い時刻の気象データを対応させる。
+    Args:
+        date_time_list(List[datetime.datetime]): 時刻リスト
+        weather_list(List[Weather]): 時刻順の気象データリスト
+        tolerance(datetime.timedelta, optional): 許容する時刻差
+        interpolate(bool, optional): Trueなら、
+            前後の気象データが許容差以内にあるとき線形補間した値にする。
+
+    Returns:
+        各時刻に対応する気象データ。許容差以内になければNone。(List[Optional[Weather]])
+    """
+    weather_times: List[datetime] = [weather.date_time for weather in weather_list]
+    joined: List[Optional[Weather]] = \
+        [None if index is None else weather_list[index]
+         for index in nearest_indices(weather_times, date_time_list, tolerance)]
+    if not interpolate:
+        return joined
+    return [weather if weather is None or weather.date_time == date_time
+            else interpolated_weather(weather_list, weather_times, date_time, tolerance) or weather
+            for date_time, weather in zip(date_time_list, joined)]
+
+
+def interpolated_weather(weather_list: List[Weather], weather_times: List[datetime],
+                         date_time: datetime, tolerance: timedelta) -> Optional[Weather]:
+    """
+    前後の気象データから、時刻での値を線形補間する。
+    風向は角度の差が小さくなる向きに補間し、雨フラグは近い方の値をとる。
+    Args:
+        weather_list(List[Weather]): 時刻順の気象データリスト
+        weather_times(List[datetime.datetime]): 気象データの時刻リスト
+        date_time(datetime.datetime): 時刻
+        tolerance(datetime.timedelta): 前後の気象データとの許容する時刻差
+
+    Returns:
+        補間された気象データ(Optional[Weather])。
+        前後の気象データが許容差以内になければNone。
+    """
+    after_index: int = bisect_left(weather_times, date_time)
+    if after_index == 0 or after_index == len(weather_list):
+        return None
+    before: Weather = weather_list[after_index - 1]
+    after: Weather = weather_list[after_index]
+    if date_time - before.date_time > tolerance or after.date_time - date_time > tolerance:
+        return None
+    ratio: float = (date_time - before.date_time) / (after.date_time - before.date_time)
+
+    def interpolate_value(field_name: str) -> float:
+        value_before: float = getattr(before, field_name)
+        difference: float = getattr(after, field_name) - value_before
+        if field_name == "wind_direction":
+            difference = (difference + 180.0) % 360.0 - 180.0
+            return (value_before + ratio * difference) % 360.0
+        return value_before + ratio * difference
+
+    values: Dict[str, Any] = {field.name: interpolate_value(field.name) for field in dataclasses.fields(Weather)
+                              if field.name not in ("date_time", "rain_flag")}
+    return Weather(date_time=date_time, rain_flag=(before if ratio < 0.5 else after).rain_flag, **values)
 
 
 def line2weather(line: List[str]) -> Weather:
@@ -88,7 +331,7 @@ def line2weather(line: List[str]) -> Weather:
     Returns:
         気象データ(Weather)
     """
-    return Weather(datetime.strptime(line[0] + "+0000", "%Y%j%H%M%S%z"),
+    return Weather(time_string2datetime(line[0]),
                    *[float(value) for value in line[1:11]],
                    bool(line[11]),
                    *[float(value) for value in line[12:]])
@@ -0,0 +1,148 @@
+"""Overview:
+    statusd.py : serve the latest VERA station and hydrogen maser status over a local HTTP/JSON API
+
+Usage:
+    statusd.py [--setting file] [--host address] [--port number] [--interval seconds]
+               [--maser-interval seconds]
+
+    statusd.py -h | --help
+
+Options:
+    --setting file            : the path to the setting file
+    --host address            : the address to listen on [default: 127.0.0.1]
+    --port number             : the port to listen on [default: 8080]
+    --interval seconds        : refresh interval of the station status [default: 300]
+    --maser-interval seconds  : refresh interval of the hydrogen maser status [default: 10]
+    -h --help                 : Show this screen and exit.
+
+Endpoints:
+    GET /status               : names, ETags and refresh times of the held statuses
+    GET /status/vlbi          : today's status of the "VLBI" host
+    GET /status/stations      : today's status of each station in the "stations" section
+    GET /status/maser         : the latest hydrogen maser status
+    Responses carry an ETag; a request with a matching If-None-Match gets 304 Not Modified.
+
+"""
+from __future__ import annotations
+
+import dataclasses
+import pathlib as p
+import sys
+from typing import Any, Dict, List
+
+from docopt import docopt
+from schema import Schema, Or, And, Use, Optional, SchemaError
+
+from VERAStatus.Daemon import RefreshJob, StatusDaemon
+from VERAStatus.HydrogenMaserServer import get_latest_status, read_settings
+from VERAStatus.Query import get_status_today, get_station_statuses
+from VERAStatus.Server import server_settings_dict2settings, station_settings_dict2settings
+from VERAStatus.Utility import Error, DataReadError, read_json, get_now, doy_string2datetime, \
+    datetime2doy_string, incremented_day
+
+
+def main() -> None:
+    """
+    Main Procedure
+    """
+    try:
+        options: Options = read_options()
+        daemon: StatusDaemon = StatusDaemon(refresh_jobs(read_json(options.setting_file), options),
+                                            options.host, options.port)
+        print(f"serving on http://{daemon.address[0]}:{daemon.address[1]}/status")
+        sys.stdout.flush()
+        daemon.serve_forever()
+
+    except Error as e:
+        print(e.args[0])
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+def refresh_jobs(settings_dict: Dict[str, Any], options: Options) -> List[RefreshJob]:
+    """
+    設定ファイルにあるサーバごとの取得ジョブ
+    Args:
+        settings_dict(Dict[str, Any]): 設定辞書
+        options(Options): オプション設定
+
+    Returns:
+        取得ジョブのリスト(List[RefreshJob])
+    """
+    jobs: List[RefreshJob] = list()
+    if "VLBI" in settings_dict:
+        server_settings = server_settings_dict2settings(settings_dict["VLBI"])
+        # 止まった通信で取得ジョブが止まって古い状態を出し続けないよう、
+        # 取得は更新間隔で打ち切る
+        jobs.append(RefreshJob("vlbi", lambda: get_status_today(get_now(), server_settings, options.interval),
+                               options.interval))
+    stations = station_settings_dict2settings(settings_dict)
+    if len(stations) > 0:
+        def get_today_station_statuses():
+            today = doy_string2datetime(datetime2doy_string(get_now()))
+            return get_station_statuses(today, incremented_day(today), stations,
+                                        timeout=options.interval, station_timeout=options.interval)
+        jobs.append(RefreshJob("stations", get_today_station_statuses, options.interval))
+    if "H_maser_settings" in settings_dict:
+        maser_settings = read_settings(settings_dict["H_maser_settings"])
+        jobs.append(RefreshJob("maser", lambda: get_latest_status(maser_settings), options.maser_interval))
+    if len(jobs) == 0:
+        raise DataReadError("The setting file has none of the VLBI, stations and H_maser_settings sections.")
+    return jobs
+
+
+@dataclasses.dataclass
+class Options:
+    """
+    オプション格納
+    """
+    setting_file: p.Path
+    host: str  # 待ち受けアドレス
+    port: int  # 待ち受けポート
+    interval: float  # 局の状態の更新間隔(秒)
+    maser_interval: float  # 水素メーザの状態の更新間隔(秒)
+
+
+def read_options() -> Options:
+    """
+    コマンドラインオプションの設定を読む。
+
+    Returns:
+        オプション設定(Options)
+    """
+    args: Dict[str, Any] = docopt(__doc__)
+    schema = Schema({
+        "--setting": Or(None, And(Use(p.Path), lambda path: path.is_file(),
+                                  error=f"The specified file {args['--setting']}"
+                                        + " does not exist.\n")),
+        "--host": str,
+        "--port": And(Use(int), lambda port: 0 <= port < 65536,
+                      error=f"The specified port {args['--port']} is not a port number.\n"),
+        "--interval": And(Use(float), lambda interval: interval > 0.0,
+                          error=f"The specified interval {args['--interval']} is not a positive number.\n"),
+        "--maser-interval": And(Use(float), lambda interval: interval > 0.0,
+                                error=f"The specified interval {args['--maser-interval']}"
+                                      + " is not a positive number.\n"),
+        Optional("--help"): bool,
+    })
+
+    try:
+        args = schema.validate(args)
+        if args["--setting"] is None:
+            default_setting: p.Path = p.Path(__file__).parent.parent / "work" / "settings.json"
+            if not default_setting.is_file():
+                raise DataReadError(f"The default setting file {default_setting} does not exist.")
+            args["--setting"] = default_setting
+
+    except SchemaError as e:
+        print(e.args[0])
+        exit(1)
+
+    return Options(args["--setting"], args["--host"], args["--port"], args["--interval"],
+                   args["--maser-interval"])
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
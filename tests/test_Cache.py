@@ -0,0 +1,95 @@
+from datetime import datetime
+import os
+import pathlib as p
+import stat
+
+import pytest
+
+from VERAStatus import Cache
+from VERAStatus.Cache import DayCache, cached_day
+from VERAStatus.Server import ServerSettings
+from VERAStatus.Utility import UTC, DataWriteError, get_now, private_directory
+
+
+def settings() -> ServerSettings:
+    return ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/home/username/schedule"))
+
+
+def test_is_closed(tmp_path):
+    cache = DayCache(tmp_path)
+    assert cache.is_closed(datetime(2020, 10, 26, 12, 0, 0, tzinfo=UTC))
+    assert not cache.is_closed(get_now())
+
+
+def test_store_load_invalidate(tmp_path):
+    cache = DayCache(tmp_path)
+    day = datetime(2020, 10, 26, tzinfo=UTC)
+    assert cache.load(settings(), day, "secz") is None
+    cache.store(settings(), day, "secz", [1, 2, 3])
+    cache.store(settings(), day, "weather", [4])
+    assert cache.load(settings(), day, "secz").records == [1, 2, 3]
+    assert stat.S_IMODE(os.stat(tmp_path).st_mode) == 0o700
+    assert sorted(file.name for file in cache.server_directory(settings()).iterdir()) == \
+           ["2020300.secz.pickle", "2020300.weather.pickle"]
+    cache.invalidate(settings(), day)
+    assert cache.load(settings(), day, "secz") is None
+    assert cache.load(settings(), day, "weather") is None
+
+
+def test_invalidate_removed_file(tmp_path, monkeypatch):
+    cache = DayCache(tmp_path)
+    day = datetime(2020, 10, 26, tzinfo=UTC)
+    cache.store(settings(), day, "secz", [1, 2, 3])
+    cache.store(settings(), day, "weather", [4])
+    files = sorted(cache.server_directory(settings()).glob("*.pickle"))
+    files[0].unlink()
+    with monkeypatch.context() as patch:
+        patch.setattr(p.Path, "glob", lambda self, pattern: iter(files))
+        cache.invalidate(settings(), day)
+    assert list(cache.server_directory(settings()).iterdir()) == []
+    assert cache.load(settings(), day, "weather") is None
+
+
+def test_cached_day_cacheable(tmp_path, monkeypatch):
+    monkeypatch.setattr(Cache, "day_cache", DayCache(tmp_path))
+    day = datetime(2020, 10, 26, tzinfo=UTC)
+    fetched = []
+
+    def fetch():
+        fetched.append(day)
+        return [len(fetched)]
+
+    assert cached_day(settings(), day, "secz", fetch, lambda records: records != [1]) == [1]
+    assert cached_day(settings(), day, "secz", fetch, lambda records: records != [1]) == [2]
+    assert cached_day(settings(), day, "secz", fetch, lambda records: records != [1]) == [2]
+    assert len(fetched) == 2
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = DayCache(tmp_path, max_bytes=10 ** 9)
+    days = [datetime(2020, 10, 26 + i, tzinfo=UTC) for i in range(3)]
+    for index, day in enumerate(days):
+        cache.store(settings(), day, "secz", list(range(100)))
+        os.utime(cache.path(settings(), day, "secz"), (1000 + index, 1000 + index))
+    cache.load(settings(), days[0], "secz")
+    cache.max_bytes = 2 * cache.path(settings(), days[0], "secz").stat().st_size
+    cache.evict()
+    assert cache.load(settings(), days[0], "secz") is not None
+    assert cache.load(settings(), days[1], "secz") is None
+    assert cache.load(settings(), days[2], "secz") is not None
+
+
+def test_private_directory_rejects_shared(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    assert private_directory(shared) == shared
+    assert stat.S_IMODE(os.stat(shared).st_mode) == 0o700
+    link = tmp_path / "link"
+    link.symlink_to(shared)
+    with pytest.raises(DataWriteError):
+        private_directory(link)
+    cache = DayCache(link)
+    day = datetime(2020, 10, 26, tzinfo=UTC)
+    cache.store(settings(), day, "secz", [1])
+    assert cache.load(settings(), day, "secz") is None
@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+import json
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from VERAStatus.Daemon import HotCache, RefreshJob, StatusDaemon, to_json_value, etag_matches
+from VERAStatus.VERAStatus import VERAStatus
+
+
+def test_to_json_value():
+    status = {"time": datetime(2020, 10, 6, 1, 31, 2, tzinfo=timezone.utc), "values": (np.float64(1.5), 2),
+              "status": VERAStatus([], [])}
+    assert to_json_value(status) == {"time": "2020-10-06T01:31:02+00:00", "values": [1.5, 2],
+                                     "status": {"observations": [], "secZ_list": []}}
+    assert to_json_value({"values": [float("nan"), np.float64("nan"), np.float32(0.5)]}) == \
+           {"values": [None, None, 0.5]}
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"abc"', '"xyz", W/"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"abc"', '*')
+    assert not etag_matches('"abc"', '"xyz"')
+    assert not etag_matches('"abc"', '')
+
+
+def test_hot_cache_etag():
+    cache = HotCache()
+    first = cache.update("maser", {"a": 1})
+    second = cache.update("maser", {"a": 1})
+    assert first.etag == second.etag and first.modified == second.modified
+    assert second.refreshed >= first.refreshed
+    cache.fail("maser", "timed out")
+    assert cache.get("maser").error == "timed out" and cache.get("maser").body == b'{"a": 1}'
+    assert cache.update("maser", {"a": 2}).etag != first.etag
+    assert cache.get("maser").error is None
+    assert cache.get("vlbi") is None
+    assert json.loads(cache.update("maser", {"a": np.float64("nan")}).body) == {"a": None}
+
+
+def request(url, etag=None):
+    headers = {} if etag is None else {"If-None-Match": etag}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_status_daemon_http():
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return {"count": 1}
+
+    daemon = StatusDaemon([RefreshJob("maser", fetch, 60.0)], port=0)
+    daemon.refresh(daemon.jobs[0])
+    daemon.start()
+    try:
+        base = f"http://{daemon.address[0]}:{daemon.address[1]}"
+        status, headers, body = request(base + "/status/maser")
+        assert status == 200 and json.loads(body) == {"count": 1}
+        for _ in range(3):
+            status, _, body = request(base + "/status/maser", headers["ETag"])
+            assert status == 304 and body == b""
+        assert request(base + "/status/maser", "W/" + headers["ETag"])[0] == 304
+        assert request(base + "/status/maser", "*")[0] == 304
+        assert request(base + "/status/maser", '"other"')[0] == 200
+        assert request(base + "/status/vlbi")[0] == 503
+        assert request(base + "/other")[0] == 404
+        assert "maser" in json.loads(request(base + "/status")[2])
+        assert len(fetches) <= 2
+    finally:
+        daemon.stop()
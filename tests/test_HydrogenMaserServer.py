@@ -0,0 +1,262 @@
+from datetime import datetime, timedelta
+import os
+from typing import List, Generator
+
+import pytest
+
+from VERAStatus import HydrogenMaserServer
+from VERAStatus.HydrogenMaserServer import line2status, lines2columns, status_parameters, line2time, \
+    read_lines_between, read_last_line, seek_time, aggregate_columns, merge_aggregates, StatusFollower, MaserSettings, \
+    FileCatalog, get_status, get_status_columns, convert_archives, archive_path, read_archive_between, \
+    is_archive_up_to_date, get_latest_status
+from VERAStatus.Utility import JST
+
+
+@pytest.fixture
+def maser_lines() -> Generator[List[str], None, None]:
+    yield ["\t".join(["44130.52", f"2 01026123{minute}{ten_seconds}"]
+                     + [f"{index * 1.23456 + minute:.5f}" for index in range(len(status_parameters()) - 2)]) + "\n"
+           for minute in range(3) for ten_seconds in range(6)]
+
+
+def test_lines2columns(maser_lines):
+    columns = lines2columns(maser_lines)
+    assert len(columns) == len(maser_lines)
+    assert columns.to_status_list() == [line2status(line) for line in maser_lines]
+
+
+def test_lines2columns_drops_malformed_rows(maser_lines):
+    malformed = [maser_lines[0].split("\t", 3)[0] + "\t" + maser_lines[0].split("\t", 3)[1] + "\n",
+                 maser_lines[1].replace("2 01026123", "2 01326123"),
+                 maser_lines[2].replace("2 01026123", "2 01131123"),
+                 maser_lines[3].replace("2 01026123", "2 0102612x"),
+                 maser_lines[4].replace("\t1.23456", "\t1.2e"),
+                 maser_lines[5][:len(maser_lines[5]) // 2] + "\n"]
+    columns = lines2columns(malformed + maser_lines[6:])
+    assert columns.to_status_list() == [line2status(line) for line in maser_lines[6:]]
+
+
+def test_read_lines_between(maser_lines, tmp_path):
+    path = tmp_path / "hm_only_mdata2010261230.txt"
+    path.write_text("".join(maser_lines))
+    date_from = datetime(2020, 10, 26, 12, 30, 30, tzinfo=JST)
+    date_until = datetime(2020, 10, 26, 12, 31, 20, tzinfo=JST)
+    lines = read_lines_between(path, date_from, date_until)
+    assert lines == [line.rstrip("\n") for line in maser_lines if date_from <= line2time(line) < date_until]
+    for linear_scan_bytes in (1, 100):
+        with open(path, "rb") as f:
+            assert seek_time(f, date_from, path.stat().st_size, linear_scan_bytes) == \
+                   len("".join(maser_lines[:3]).encode())
+    assert read_lines_between(path, datetime(2021, 1, 1, tzinfo=JST), datetime(2021, 1, 2, tzinfo=JST)) == []
+
+
+def test_read_lines_between_skips_unreadable_lines(maser_lines, tmp_path):
+    unreadable = ["\n", maser_lines[0].split("\t", 1)[0] + "\n", maser_lines[0][:12] + "\n"]
+    lines_with_unreadable = maser_lines[:3] + unreadable + maser_lines[3:8] + unreadable + maser_lines[8:]
+    (tmp_path / "data" / "2010").mkdir(parents=True)
+    path = tmp_path / "data" / "2010" / "hm_only_mdata20102612300.txt"
+    path.write_text("".join(lines_with_unreadable))
+    date_from = datetime(2020, 10, 26, 12, 30, 30, tzinfo=JST)
+    date_until = datetime(2020, 10, 26, 12, 31, 20, tzinfo=JST)
+    expected = [line2status(line) for line in maser_lines if date_from <= line2time(line) < date_until]
+    assert [line2time(line) for line in unreadable] == [None, None, None]
+    for linear_scan_bytes in (1, 100, 4096):
+        with open(path, "rb") as f:
+            assert seek_time(f, date_from, path.stat().st_size, linear_scan_bytes) == \
+                   len("".join(lines_with_unreadable[:6]).encode())
+            assert seek_time(f, date_until, path.stat().st_size, linear_scan_bytes) == \
+                   len("".join(lines_with_unreadable[:14]).encode())
+    assert lines2columns(read_lines_between(path, date_from, date_until)).to_status_list() == expected
+    settings = MaserSettings(tmp_path / "data", tmp_path / "catalog.pickle")
+    assert get_status(settings, date_from, date_until, step_interval=1) == expected
+
+
+def test_read_last_line(maser_lines, tmp_path):
+    path = tmp_path / "hm_only_mdata2010261230.txt"
+    path.write_text("".join(maser_lines))
+    assert read_last_line(path, block_size=7) == maser_lines[-1].rstrip("\n")
+    path.write_text("".join(maser_lines[:2]) + "\n" + maser_lines[2][:12] + "\n" + maser_lines[3][:50])
+    for block_size in (7, 4096):
+        assert read_last_line(path, block_size=block_size) == maser_lines[1].rstrip("\n")
+    path.write_text(maser_lines[0][:50])
+    assert read_last_line(path, block_size=7) is None
+    path.write_text("")
+    assert read_last_line(path) is None
+
+
+def test_get_latest_status(maser_lines, tmp_path):
+    (tmp_path / "data" / "2010").mkdir(parents=True)
+    path = tmp_path / "data" / "2010" / "hm_only_mdata20102612300.txt"
+    path.write_text("".join(maser_lines[:4]) + maser_lines[4][:len(maser_lines[4]) // 2])
+    assert get_latest_status(MaserSettings(tmp_path / "data", tmp_path / "catalog.pickle")) == \
+           line2status(maser_lines[3])
+
+
+def test_aggregate_columns(maser_lines):
+    columns = lines2columns(maser_lines)
+    aggregate = aggregate_columns(columns, timedelta(minutes=1))
+    assert len(aggregate) == 3
+    assert aggregate.count.tolist() == [6, 6, 6]
+    statuses = [line2status(line) for line in maser_lines]
+    for minute in range(3):
+        values = [status["ion_pump_current"] for status in statuses[minute * 6:(minute + 1) * 6]]
+        assert aggregate.minimum["ion_pump_current"][minute] == min(values)
+        assert aggregate.maximum["ion_pump_current"][minute] == max(values)
+        assert aggregate.mean("ion_pump_current")[minute] == pytest.approx(sum(values) / len(values))
+        assert aggregate.last["ion_pump_current"][minute] == values[-1]
+
+    halves = [aggregate_columns(columns.select(slice(None, 9)), timedelta(minutes=1)),
+              aggregate_columns(columns.select(slice(9, None)), timedelta(minutes=1))]
+    merged = merge_aggregates(halves)
+    assert merged.count.tolist() == [6, 6, 6]
+    for label in aggregate.minimum:
+        assert merged.minimum[label].tolist() == aggregate.minimum[label].tolist()
+        assert merged.maximum[label].tolist() == aggregate.maximum[label].tolist()
+        assert merged.last[label].tolist() == aggregate.last[label].tolist()
+        assert merged.mean(label).tolist() == pytest.approx(aggregate.mean(label).tolist())
+    assert merged.to_status_list()[1]["time"] == datetime(2020, 10, 26, 12, 31, 0, tzinfo=JST)
+
+
+def test_status_follower(maser_lines, tmp_path):
+    directory = tmp_path / "2010"
+    directory.mkdir()
+    first_file = directory / "hm_only_mdata20102612300.txt"
+    first_file.write_text("".join(maser_lines[:2]))
+    follower = StatusFollower(MaserSettings(tmp_path))
+    assert follower.poll() == []
+
+    with open(first_file, "a") as f:
+        f.write(maser_lines[2] + maser_lines[3][:10])
+    assert follower.poll() == [line2status(maser_lines[2])]
+    with open(first_file, "a") as f:
+        f.write(maser_lines[3][10:])
+    assert follower.poll() == [line2status(maser_lines[3])]
+
+    (directory / "hm_only_mdata20102612310.txt").write_text(maser_lines[6])
+    assert follower.poll() == [line2status(maser_lines[6])]
+    assert follower.poll() == []
+
+
+
+def test_status_follower_starts_after_partial_line(maser_lines, tmp_path):
+    directory = tmp_path / "2010"
+    directory.mkdir()
+    path = directory / "hm_only_mdata20102612300.txt"
+    path.write_text("".join(maser_lines[:2]) + maser_lines[2][:10])
+    follower = StatusFollower(MaserSettings(tmp_path))
+    assert follower.poll() == []
+    with open(path, "a") as f:
+        f.write(maser_lines[2][10:] + maser_lines[3])
+    assert follower.poll() == [line2status(maser_lines[2]), line2status(maser_lines[3])]
+
+
+def test_status_follower_keeps_rows_on_parse_failure(maser_lines, tmp_path, monkeypatch):
+    directory = tmp_path / "2010"
+    directory.mkdir()
+    path = directory / "hm_only_mdata20102612300.txt"
+    path.write_text("")
+    follower = StatusFollower(MaserSettings(tmp_path))
+    path.write_text("".join(maser_lines[:2]))
+
+    def failing_lines2columns(lines):
+        raise MemoryError()
+
+    monkeypatch.setattr(HydrogenMaserServer, "lines2columns", failing_lines2columns)
+    with pytest.raises(MemoryError):
+        follower.poll()
+    monkeypatch.undo()
+    assert follower.poll() == [line2status(line) for line in maser_lines[:2]]
+
+
+def test_status_follower_drops_partial_line_on_rotation(maser_lines, tmp_path):
+    directory = tmp_path / "2010"
+    directory.mkdir()
+    first_file = directory / "hm_only_mdata20102612300.txt"
+    first_file.write_text(maser_lines[0])
+    follower = StatusFollower(MaserSettings(tmp_path), from_beginning=True)
+    assert follower.poll() == [line2status(maser_lines[0])]
+    with open(first_file, "a") as f:
+        f.write(maser_lines[1][:30])
+    assert follower.poll() == []
+    (directory / "hm_only_mdata20102612310.txt").write_text(maser_lines[6])
+    assert follower.poll() == [line2status(maser_lines[6])]
+
+
+def test_file_catalog(tmp_path):
+    for directory, names in {"2010": ["hm_only_mdata20102600000.txt", "hm_only_mdata20102612000.txt"],
+                             "2011": ["hm_only_mdata20110100000.txt"]}.items():
+        (tmp_path / "data" / directory).mkdir(parents=True)
+        for name in names:
+            (tmp_path / "data" / directory / name).write_text("")
+    settings = MaserSettings(tmp_path / "data", tmp_path / "catalog.pickle")
+    catalog = FileCatalog(settings).refresh()
+    assert [path.name for path in catalog.paths] == \
+           ["hm_only_mdata20102600000.txt", "hm_only_mdata20102612000.txt", "hm_only_mdata20110100000.txt"]
+    for date_from, date_until, names in [
+            (datetime(2020, 10, 26, 6, tzinfo=JST), datetime(2020, 10, 26, 13, tzinfo=JST),
+             ["hm_only_mdata20102600000.txt", "hm_only_mdata20102612000.txt"]),
+            (datetime(2020, 10, 1, tzinfo=JST), datetime(2020, 10, 26, 1, tzinfo=JST),
+             ["hm_only_mdata20102600000.txt"]),
+            (datetime(2020, 11, 2, tzinfo=JST), datetime(2020, 11, 3, tzinfo=JST),
+             ["hm_only_mdata20110100000.txt"]),
+            (datetime(2020, 10, 26, 12, tzinfo=JST), datetime(2020, 11, 1, tzinfo=JST),
+             ["hm_only_mdata20102600000.txt", "hm_only_mdata20102612000.txt"])]:
+        assert [path.name for path in catalog.files_between(date_from, date_until)] == names
+
+    (tmp_path / "data" / "2011" / "hm_only_mdata20110200000.txt").write_text("")
+    reloaded = FileCatalog(settings)
+    assert len(reloaded.paths) == 3
+    assert reloaded.refresh().latest().name == "hm_only_mdata20110200000.txt"
+
+
+def test_get_status_with_processes(maser_lines, tmp_path):
+    (tmp_path / "data" / "2010").mkdir(parents=True)
+    (tmp_path / "data" / "2010" / "hm_only_mdata20102612300.txt").write_text("".join(maser_lines[:9]))
+    (tmp_path / "data" / "2010" / "hm_only_mdata20102612313.txt").write_text("".join(maser_lines[9:]))
+    settings = MaserSettings(tmp_path / "data", tmp_path / "catalog.pickle")
+    date_from = datetime(2020, 10, 26, 12, 30, 10, tzinfo=JST)
+    date_until = datetime(2020, 10, 26, 12, 32, 40, tzinfo=JST)
+    expected = [line2status(line) for line in maser_lines if date_from <= line2time(line) < date_until]
+    assert get_status(settings, date_from, date_until, step_interval=1) == expected
+    assert get_status(settings, date_from, date_until, step_interval=1, processes=2) == expected
+    assert get_status_columns(settings, date_from, date_until, processes=2).to_status_list() == expected
+
+
+def test_archive(maser_lines, tmp_path):
+    (tmp_path / "data" / "2010").mkdir(parents=True)
+    source = tmp_path / "data" / "2010" / "hm_only_mdata20102612300.txt"
+    source.write_text("".join(maser_lines))
+    settings = MaserSettings(tmp_path / "data", tmp_path / "catalog.pickle", tmp_path / "archive")
+    assert convert_archives(settings) == []
+    assert convert_archives(settings, include_latest=True) == [tmp_path / "archive" / "2010" /
+                                                               "hm_only_mdata20102612300.npy"]
+    assert convert_archives(settings, include_latest=True) == []
+
+    date_from = datetime(2020, 10, 26, 12, 30, 10, tzinfo=JST)
+    date_until = datetime(2020, 10, 26, 12, 32, 40, tzinfo=JST)
+    expected = [line2status(line) for line in maser_lines if date_from <= line2time(line) < date_until]
+    archive = archive_path(source, settings.archive_directory)
+    assert read_archive_between(archive, date_from, date_until).to_status_list() == expected
+    assert get_status(settings, date_from, date_until, step_interval=1) == expected
+
+    os.utime(archive, (0, 0))
+    assert not is_archive_up_to_date(source, archive)
+    assert get_status(settings, date_from, date_until, step_interval=1) == expected
+
+
+def test_archive_default_directory(maser_lines, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    (tmp_path / "data" / "2010").mkdir(parents=True)
+    (tmp_path / "data" / "2010" / "hm_only_mdata20102612300.txt").write_text("".join(maser_lines))
+    date_from = datetime(2020, 10, 26, 12, 30, 10, tzinfo=JST)
+    date_until = datetime(2020, 10, 26, 12, 32, 40, tzinfo=JST)
+    expected = [line2status(line) for line in maser_lines if date_from <= line2time(line) < date_until]
+    assert get_status(MaserSettings(tmp_path / "data", tmp_path / "catalog.pickle"), date_from, date_until,
+                      step_interval=1) == expected
+    assert not (tmp_path / "cache").exists()
+    settings = MaserSettings(tmp_path / "data")
+    archives = convert_archives(settings, include_latest=True)
+    assert len(archives) == 1
+    assert tmp_path / "cache" / "VERAStatus" / "maser" in archives[0].parents
+    assert sorted(file.name for file in (tmp_path / "data" / "2010").iterdir()) == ["hm_only_mdata20102612300.txt"]
+    assert get_status(settings, date_from, date_until, step_interval=1) == expected
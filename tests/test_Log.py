@@ -0,0 +1,109 @@
+import io
+import pathlib as p
+import shutil
+import subprocess
+from datetime import datetime, timezone
+
+import pytest
+
+from VERAStatus import Log
+from VERAStatus.Log import dispatch_lines, extract_keys, extract_lines, iterate_lines, LogTail, log_tail
+from VERAStatus.Server import ServerSettings
+from VERAStatus.Utility import DataReadError
+
+LOG_TEXT = """2020280013102/TSYS1/ -0.349626  -0.742586  300.250  330.684  585.524  K  5187.000
+2020280013103;source=w3oh,033640.0,-010512.0,2000.0
+2020280013110/TSYS2/ 1.0 2.0
+2020280013120/TSYS1/ 0.1 0.2 300.0 330.0 585.0 K 5188.000
+"""
+
+
+def test_iterate_lines_is_lazy():
+    lines = iterate_lines(io.StringIO(LOG_TEXT), "TSYS1")
+    date_time, value = next(lines)
+    assert date_time == datetime(2020, 10, 6, 1, 31, 2, tzinfo=timezone.utc)
+    assert value.split()[0] == "-0.349626"
+    assert [value.split()[-1] for _, value in lines] == ["5188.000"]
+
+
+def test_iterate_lines_bytes():
+    lines = io.BytesIO(LOG_TEXT.encode())
+    assert [date_time.second for date_time, _ in iterate_lines(lines, "TSYS2")] == [10]
+
+
+def test_extract_lines():
+    assert extract_lines(LOG_TEXT.splitlines(), "TSYS1") == \
+           list(iterate_lines(io.StringIO(LOG_TEXT), "TSYS1"))
+    assert extract_lines(LOG_TEXT.splitlines(), "TSYS") == list()
+
+
+def test_extract_keys_single_pass():
+    consumed = list()
+
+    def lines():
+        for line in LOG_TEXT.splitlines():
+            consumed.append(line)
+            yield line
+
+    extracted = extract_keys(lines(), ["TSYS1", "TSYS2", "TSYS3"])
+    assert len(consumed) == 4
+    assert [len(extracted[key]) for key in ("TSYS1", "TSYS2", "TSYS3")] == [2, 1, 0]
+    assert extracted["TSYS1"] == extract_lines(LOG_TEXT.splitlines(), "TSYS1")
+
+
+def test_dispatch_lines_typed():
+    outputs = dispatch_lines(io.StringIO(LOG_TEXT), {
+        "TSYS1": lambda date_time, value: float(value.split()[-1]),
+        "TSYS2": lambda date_time, value: date_time.second})
+    assert outputs == {"TSYS1": [5187.0, 5188.0], "TSYS2": [10]}
+
+
+def test_log_tail_apply():
+    tail = LogTail(p.PurePosixPath("/usr2/log/days/2020280/2020280.SECZ.log"))
+    assert tail.apply(b"", str.split, lambda records, new: records + new)
+    assert tail.records == [] and tail.offset == 0
+    assert tail.apply(b"100 15\nline1\nline2\npa", lambda lines: lines, lambda records, new: records + new)
+    assert tail.records == ["line1", "line2"] and tail.offset == 12 and tail.inode == 100
+    assert tail.apply(b"100 26\npartial\nline4\n", lambda lines: lines, lambda records, new: records + new)
+    assert tail.records == ["line1", "line2", "partial", "line4"] and tail.offset == 26
+    assert not tail.apply(b"101 30\n", lambda lines: lines, lambda records, new: records + new)
+    assert tail.records == [] and tail.offset == 0 and tail.inode is None
+
+
+
+def test_log_tail_apply_keeps_position_on_parse_failure():
+    tail = LogTail(p.PurePosixPath("/usr2/log/days/2020280/2020280.SECZ.log"))
+
+    def failing_parse(lines):
+        raise DataReadError("weather fetch timed out")
+
+    with pytest.raises(DataReadError):
+        tail.apply(b"100 12\nline1\nline2\n", failing_parse, lambda records, new: records + new)
+    assert tail.records == [] and tail.offset == 0 and tail.inode is None
+    assert tail.apply(b"100 12\nline1\nline2\n", lambda lines: lines, lambda records, new: records + new)
+    assert tail.records == ["line1", "line2"] and tail.offset == 12 and tail.inode == 100
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+def test_log_tail_update(tmp_path, monkeypatch):
+    commands = []
+
+    def get_command_bytes(server_settings, command):
+        commands.append(command)
+        return subprocess.run(["bash", "-c", command], capture_output=True, check=True).stdout
+
+    monkeypatch.setattr(Log, "get_command_bytes", get_command_bytes)
+    file = tmp_path / "2020280.SECZ.log"
+    settings = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/schedule"))
+    tail = log_tail(settings, "secz", p.PurePosixPath(file))
+    parse = lambda lines: [value for _, value in iterate_lines(lines, "TSYS2")]
+    assert tail.update(settings, parse) == []
+    file.write_text(LOG_TEXT[:100])
+    assert tail.update(settings, parse) == []
+    with open(file, "a") as f:
+        f.write(LOG_TEXT[100:])
+    assert tail.update(settings, parse) == ["1.0 2.0"]
+    assert f"+{LOG_TEXT.index('2020280013103') + 1} " in commands[-1]
+    file.write_text(LOG_TEXT.splitlines()[2] + "\n")
+    assert tail.update(settings, parse) == ["1.0 2.0"]
+    assert log_tail(settings, "secz", p.PurePosixPath(file)) is tail
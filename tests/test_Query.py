@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+import pathlib as p
+
+from VERAStatus import Query
+from VERAStatus.Server import ServerSettings
+
+SETTINGS = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/home/username/schedule"))
+
+
+def test_days_in_range():
+    date_from = datetime(2020, 12, 31, 12, tzinfo=timezone.utc)
+    assert Query.days_in_range(date_from, datetime(2021, 1, 2, 0, 0, 1, tzinfo=timezone.utc)) == \
+           [datetime(2020, 12, 31, tzinfo=timezone.utc), datetime(2021, 1, 1, tzinfo=timezone.utc),
+            datetime(2021, 1, 2, tzinfo=timezone.utc)]
+    assert Query.days_in_range(date_from, datetime(2021, 1, 1, tzinfo=timezone.utc)) == \
+           [datetime(2020, 12, 31, tzinfo=timezone.utc)]
+
+
+class FakeSecZ:
+    def __init__(self, date_time):
+        self.date_time = date_time
+
+
+def test_get_status_between(monkeypatch):
+    schedule_requests = []
+
+    async def get_observations_async(date_from, date_until, server_settings, timeout):
+        schedule_requests.append((date_from, date_until))
+        return [3, 1, 2]
+
+    async def generate_secz_async(day, server_settings, timeout):
+        return [FakeSecZ(day + timedelta(hours=2)), FakeSecZ(day + timedelta(hours=1))]
+
+    monkeypatch.setattr(Query.Sched, "get_observations_async", get_observations_async)
+    monkeypatch.setattr(Query.SecZ, "generate_secz_async", generate_secz_async)
+    date_from = datetime(2020, 10, 6, tzinfo=timezone.utc)
+    status = Query.get_status_between(date_from, date_from + timedelta(days=3), SETTINGS, max_concurrency=2)
+    assert schedule_requests == [(date_from, date_from + timedelta(days=3))]
+    assert status.observations == [1, 2, 3]
+    assert [secz.date_time for secz in status.secZ_list] == \
+           [date_from + timedelta(days=day, hours=hour) for day in range(3) for hour in (1, 2)]
+
+
+def test_get_station_statuses_partial_failure(monkeypatch):
+    import asyncio
+    from VERAStatus.Utility import DataReadError
+    from VERAStatus.VERAStatus import VERAStatus
+
+    async def get_status_between_async(date_from, date_until, server_settings, timeout, max_concurrency):
+        if server_settings.host == "iriki":
+            raise DataReadError("connection refused")
+        if server_settings.host == "ogasawara":
+            await asyncio.sleep(10)
+        await asyncio.sleep(0.05)
+        return VERAStatus([], [])
+
+    monkeypatch.setattr(Query, "get_status_between_async", get_status_between_async)
+    stations = {name: ServerSettings(host, 22, "username", "pass_word", p.PurePosixPath("/schedule"))
+                for name, host in [("MIZ", "mizusawa"), ("IRK", "iriki"), ("OGA", "ogasawara"),
+                                   ("ISG", "ishigaki")]}
+    date_from = datetime(2020, 10, 6, tzinfo=timezone.utc)
+    statuses = Query.get_station_statuses(date_from, date_from + timedelta(days=1), stations, station_timeout=0.5)
+    assert list(statuses) == ["MIZ", "IRK", "OGA", "ISG"]
+    assert statuses["MIZ"].succeeded and statuses["ISG"].succeeded
+    assert statuses["IRK"].error == "IRK: connection refused"
+    assert "timed out" in statuses["OGA"].error
+
+
+def test_get_station_statuses_stops_blocking_work(monkeypatch):
+    import time
+    from VERAStatus.Utility import remaining_time, run_blocking
+    from VERAStatus.VERAStatus import VERAStatus
+
+    def stalled_read():
+        while True:
+            remaining_time()
+            time.sleep(0.01)
+
+    async def get_status_between_async(date_from, date_until, server_settings, timeout, max_concurrency):
+        await run_blocking(stalled_read)
+        return VERAStatus([], [])
+
+    monkeypatch.setattr(Query, "get_status_between_async", get_status_between_async)
+    stations = {"MIZ": SETTINGS}
+    date_from = datetime(2020, 10, 6, tzinfo=timezone.utc)
+    start = time.monotonic()
+    statuses = Query.get_station_statuses(date_from, date_from + timedelta(days=1), stations, station_timeout=0.3)
+    assert time.monotonic() - start < 1.0
+    assert not statuses["MIZ"].succeeded
+
+
+def test_get_station_statuses_does_not_wait_for_stragglers(monkeypatch):
+    import time
+    from VERAStatus.Utility import run_blocking
+    from VERAStatus.VERAStatus import VERAStatus
+
+    async def get_status_between_async(date_from, date_until, server_settings, timeout, max_concurrency):
+        # 打ち切り時刻を見ないブロッキング処理
+        await run_blocking(time.sleep, 1.5)
+        return VERAStatus([], [])
+
+    monkeypatch.setattr(Query, "get_status_between_async", get_status_between_async)
+    date_from = datetime(2020, 10, 6, tzinfo=timezone.utc)
+    start = time.monotonic()
+    statuses = Query.get_station_statuses(date_from, date_from + timedelta(days=1), {"MIZ": SETTINGS},
+                                          station_timeout=0.3)
+    assert time.monotonic() - start < 1.0
+    assert "timed out" in statuses["MIZ"].error
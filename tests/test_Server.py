@@ -1,5 +1,16 @@
 import pathlib as p
-from VERAStatus.Server import server_settings_dict2settings, ServerSettings
+import socket
+import threading
+import time
+
+import pytest
+import paramiko
+from paramiko import SFTPAttributes
+
+import VERAStatus.Server
+from VERAStatus.Server import server_settings_dict2settings, ServerSettings, ConnectionPool, iterate_command, \
+    get_files_parallel, DownloadReport, connect
+from VERAStatus.Utility import DataReadError, deadline_scope
 
 
 def test_server_settings_dict2settings():
@@ -11,3 +22,301 @@ def test_server_settings_dict2settings():
          "schedule_path": "/home/username/schedule"}) ==
             ServerSettings("192.168.1.1", 22, "username", "pass_word",
                            p.PurePosixPath("/home/username/schedule")))
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+def test_connection_pool_reuses_connection():
+    settings = ServerSettings("192.168.1.1", 22, "username", "pass_word",
+                              p.PurePosixPath("/home/username/schedule"))
+    created = []
+
+    def connector(_):
+        created.append(FakeClient())
+        return created[-1]
+
+    pool = ConnectionPool(max_size=1, connector=connector, health_check=lambda c: c.alive)
+    with pool.connection(settings) as client1:
+        pass
+    with pool.connection(settings) as client2:
+        pass
+    assert client1 is client2
+    assert len(created) == 1
+
+    client2.alive = False
+    with pool.connection(settings) as client3:
+        pass
+    assert client3 is not client2
+    assert client2.closed
+    pool.close_all()
+    assert client3.closed
+
+
+def test_connection_pool_idle_timeout():
+    settings = ServerSettings("192.168.1.1", 22, "username", "pass_word",
+                              p.PurePosixPath("/home/username/schedule"))
+    pool = ConnectionPool(idle_timeout=0.0, connector=lambda _: FakeClient(),
+                          health_check=lambda c: True)
+    with pool.connection(settings) as client1:
+        pass
+    with pool.connection(settings) as client2:
+        pass
+    assert client1 is not client2
+    assert client1.closed
+
+
+class FakeJumpTransport:
+    def __init__(self):
+        self.channels = []
+
+    def open_channel(self, kind, destination, source, timeout=None):
+        self.channels.append(destination)
+        return object()
+
+
+class FakeJumpClient(FakeClient):
+    def __init__(self):
+        super().__init__()
+        self.transport = FakeJumpTransport()
+
+    def get_transport(self):
+        return self.transport
+
+
+def test_connect_proxy_reuses_pooled_jump_client(monkeypatch):
+    jump = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/home/username/schedule"))
+    settings = ServerSettings("clock", 22, "weather", "pass_word", p.PurePosixPath("/home/username/schedule"),
+                              proxy=jump)
+    created = []
+
+    def connector(_):
+        created.append(FakeJumpClient())
+        return created[-1]
+
+    pool = ConnectionPool(connector=connector, health_check=lambda c: c.alive)
+    monkeypatch.setattr(VERAStatus.Server, "connection_pool", pool)
+    monkeypatch.setattr(paramiko.SSHClient, "connect", lambda self, **kwargs: None)
+    client1 = connect(settings)
+    client1.close()
+    client1.close()
+    assert [pooled.client for pooled in pool._idle[jump]] == [created[0]]
+    client2 = connect(settings)
+    client2.close()
+    assert len(created) == 1
+    assert created[0].transport.channels == [("clock", 22), ("clock", 22)]
+    assert not created[0].closed
+    pool.close_all()
+    assert created[0].closed
+
+
+def proxied_pool(monkeypatch, idle_timeout):
+    jump = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/home/username/schedule"))
+    settings = ServerSettings("clock", 22, "weather", "pass_word", p.PurePosixPath("/home/username/schedule"),
+                              proxy=jump)
+    created = []
+
+    def connector(server_settings):
+        if server_settings.proxy is not None:
+            return connect(server_settings)
+        created.append(FakeJumpClient())
+        return created[-1]
+
+    pool = ConnectionPool(idle_timeout=idle_timeout, connector=connector, health_check=lambda c: True)
+    monkeypatch.setattr(VERAStatus.Server, "connection_pool", pool)
+    monkeypatch.setattr(paramiko.SSHClient, "connect", lambda self, **kwargs: None)
+    return pool, settings, created
+
+
+def test_connection_pool_expires_proxied_client(monkeypatch):
+    pool, settings, created = proxied_pool(monkeypatch, 0.0)
+    with pool.connection(settings):
+        pass
+    thread = threading.Thread(target=pool.acquire, args=(settings,), daemon=True)
+    thread.start()
+    thread.join(timeout=5.0)
+    assert not thread.is_alive()
+    assert created[0].closed
+
+
+def test_connection_pool_close_all_closes_jump_client(monkeypatch):
+    pool, settings, created = proxied_pool(monkeypatch, 300.0)
+    with pool.connection(settings):
+        pass
+    pool.close_all()
+    assert created[0].closed
+    assert pool._idle == {}
+
+
+class FakeChannel:
+    def __init__(self, chunks, stderr=b"", exit_status=0):
+        self.chunks = list(chunks)
+        self.stderr = stderr
+        self.exit_status = exit_status
+        self.received = 0
+        self.command = None
+        self.closed = False
+        self.timeout = None
+        self.status_event = threading.Event()
+        self.status_event.set()
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def exec_command(self, command):
+        self.command = command
+
+    def recv(self, size):
+        if len(self.chunks) == 0:
+            return b""
+        self.received += 1
+        return self.chunks.pop(0)
+
+    def recv_stderr_ready(self):
+        return len(self.chunks) == 0 and len(self.stderr) > 0
+
+    def recv_stderr(self, size):
+        stderr, self.stderr = self.stderr, b""
+        return stderr
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTransport:
+    def __init__(self, channel):
+        self.channel = channel
+
+    def is_active(self):
+        return True
+
+    def open_session(self, window_size=None, timeout=None):
+        return self.channel
+
+
+class FakeSSH:
+    def __init__(self, channel):
+        self.transport = FakeTransport(channel)
+
+    def get_transport(self):
+        return self.transport
+
+
+def test_iterate_command_streams_lines():
+    channel = FakeChannel([b"2020280013102 a\n20202", "80013103 °C\n".encode()[:-3],
+                           "80013103 °C\n".encode()[-3:], b"last"])
+    lines = iterate_command(FakeSSH(channel), "grep a file", accepted_exit_statuses=(0, 1))
+    assert next(lines) == "2020280013102 a"
+    assert channel.received == 1
+    assert list(lines) == ["2020280013103 °C", "last"]
+    assert channel.command == "grep a file"
+    assert channel.closed
+
+
+def test_iterate_command_exit_status():
+    channel = FakeChannel([b"partial\n"], stderr=b"grep: file: Permission denied\n", exit_status=2)
+    with pytest.raises(DataReadError, match="status 2: grep: file: Permission denied"):
+        list(iterate_command(FakeSSH(channel), "grep a file", accepted_exit_statuses=(0, 1)))
+    channel = FakeChannel([b"partial\n"], stderr=b"ignored", exit_status=2)
+    assert list(iterate_command(FakeSSH(channel), "ls")) == ["partial"]
+
+
+class StalledChannel(FakeChannel):
+    def __init__(self):
+        super().__init__([])
+        self.status_event.clear()
+
+    def recv(self, size):
+        time.sleep(self.timeout)
+        raise socket.timeout()
+
+
+def test_iterate_command_deadline():
+    channel = StalledChannel()
+    start = time.monotonic()
+    with deadline_scope(time.monotonic() + 0.3):
+        with pytest.raises(DataReadError, match="deadline exceeded"):
+            list(iterate_command(FakeSSH(channel), "grep a file", poll_interval=0.2))
+    assert time.monotonic() - start < 0.6
+    assert channel.closed
+
+
+def test_server_settings_dict2settings_weather_server():
+    settings = server_settings_dict2settings(
+        {"host": "192.168.1.1",
+         "port": 22,
+         "user": "username",
+         "password": "pass_word",
+         "schedule_path": "/home/username/schedule",
+         "weather_server": {"host": "clock", "user": "weather"}})
+    base = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/home/username/schedule"))
+    assert settings.weather_server == ServerSettings("clock", 22, "weather", "pass_word",
+                                                     p.PurePosixPath("/home/username/schedule"), proxy=base)
+    assert settings.weather_server.proxy.weather_server is None
+    assert hash(settings.weather_server) != hash(settings)
+
+
+class FakeSFTP:
+    def __init__(self, contents, opened):
+        self.contents = contents
+        opened.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def get_channel(self):
+        return FakeChannel([])
+
+    def chdir(self, path):
+        self.directory = path
+
+    def get(self, remote_path, local_path):
+        with open(local_path, "wb") as f:
+            f.write(self.contents[remote_path])
+
+
+class FakeSFTPClient:
+    def __init__(self, contents):
+        self.contents = contents
+        self.opened = []
+
+    def open_sftp(self):
+        return FakeSFTP(self.contents, self.opened)
+
+
+def file_attributes(name, size):
+    attributes = SFTPAttributes()
+    attributes.filename = name
+    attributes.st_size = size
+    return attributes
+
+
+def test_get_files_parallel(tmp_path):
+    contents = {f"r{index}.vex": bytes(index * 100) for index in range(1, 8)}
+    remote_files = [file_attributes(name, len(data)) for name, data in contents.items()]
+    ssh = FakeSFTPClient(contents)
+    downloaded = []
+    get_files_parallel(ssh, p.PurePosixPath("/schedule"), remote_files, tmp_path, downloaded, parallel=3)
+    assert len(ssh.opened) == 3
+    assert [file.name for file, _ in downloaded] == list(contents)
+    assert all(file.read_bytes() == contents[file.name] for file, _ in downloaded)
+    assert [stat.st_size for _, stat in downloaded] == [len(data) for data in contents.values()]
+
+
+def test_download_report_throughput():
+    assert DownloadReport(2, 1000, 0.5).throughput == 2000.0
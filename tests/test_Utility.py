@@ -1,7 +1,15 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
+import pathlib as p
+import time
+
+import numpy as np
+import pytest
 
 from VERAStatus.Utility import in_jst, UTC, JST, incremented_day, decremented_day, round_float, doy2datetime, \
-    datetime2year_doy_string, datetime2year_doy, datetime2doy_string, datetime2doy, string_lines2string
+    datetime2year_doy_string, datetime2year_doy, datetime2doy_string, datetime2doy, string_lines2string, \
+    egrep_files_command, async_execution, run_blocking, DataReadError, nearest_indices, \
+    round_array, time_string2datetime, vex_time_string2datetime, remaining_time
 
 
 def test_in_jst():
@@ -57,3 +65,79 @@ def test_datetime2doy():
 
 def test_string_lines2string():
     assert string_lines2string(["line1", "line2", "line3"]) == "line1\nline2\nline3\n"
+
+
+def test_egrep_files_command():
+    assert egrep_files_command([p.PurePosixPath("/a/r1.vex"), p.PurePosixPath("/a/r2.vex")], ["x", "y"]) == \
+           'egrep -H "x|y" /a/r1.vex /a/r2.vex'
+
+
+def test_async_execution():
+    async def slow_value(value, delay):
+        await asyncio.sleep(delay)
+        return value
+
+    assert async_execution([slow_value(1, 0.02), slow_value(2, 0.01), run_blocking(sum, [1, 2])]) == [1, 2, 3]
+
+
+def test_async_execution_timeout():
+    with pytest.raises(DataReadError):
+        async_execution([run_blocking(time.sleep, 0.2, timeout=0.01)])
+
+
+def test_async_execution_deadline():
+    def stall():
+        while True:
+            remaining_time()
+            time.sleep(0.02)
+
+    start = time.monotonic()
+    with pytest.raises(DataReadError):
+        async_execution([run_blocking(stall, timeout=0.2)])
+    assert time.monotonic() - start < 0.5
+
+
+def test_nearest_indices():
+    times = [datetime(2020, 10, 26, 0, 0, second, tzinfo=UTC) for second in (0, 10, 20, 40)]
+    queries = [datetime(2020, 10, 26, 0, 0, second, tzinfo=UTC) for second in (0, 4, 6, 20, 29, 31, 55)]
+    assert nearest_indices(times, queries, timedelta(seconds=5)) == [0, 0, 1, 2, None, None, None]
+    assert nearest_indices(times, queries, timedelta(seconds=15)) == [0, 0, 1, 2, 2, 3, 3]
+    assert nearest_indices(times, list(reversed(queries)), timedelta(seconds=5)) == \
+           [None, None, None, 2, 1, 0, 0]
+    assert nearest_indices([], queries[:1], timedelta(seconds=5)) == [None]
+
+
+def test_round_array():
+    values = [0.15, 0.149999, 12.49999, 12.5, -0.15, -12.5]
+    assert round_array(np.array(values), -1).tolist() == [round_float(value, -1) for value in values]
+    assert round_array(np.array(values), 0).tolist() == [round_float(value, 0) for value in values]
+    assert round_array(np.array([[0.15, 12.5], [0.25, -0.0015]]), np.array([-1, -3])).tolist() == \
+           [[round_float(0.15, -1), round_float(12.5, -3)], [round_float(0.25, -1), round_float(-0.0015, -3)]]
+
+
+def test_round_array_matches_round_float():
+    values = [k / 1000 + 0.0005 for k in range(-2000, 2000)] + [0.1 * k for k in range(-100, 100)]
+    assert round_array(values, -3).tolist() == [round_float(value, -3) for value in values]
+    assert round_array(values, -1).tolist() == [round_float(value, -1) for value in values]
+    assert round_array(values, 0).tolist() == [round_float(value, 0) for value in values]
+
+
+def test_round_array_keeps_nan():
+    rounded = round_array(np.array([1.4, np.nan, 2.5]), 0)
+    assert rounded.dtype == np.float64
+    assert rounded[0] == 1 and np.isnan(rounded[1]) and rounded[2] == 3
+    assert np.isnan(round_array(np.array([np.nan]), -2)[0])
+
+
+def test_time_string2datetime():
+    assert time_string2datetime("2020300012345") == datetime(2020, 10, 26, 1, 23, 45, tzinfo=UTC)
+    assert time_string2datetime("2020366235959") == datetime(2020, 12, 31, 23, 59, 59, tzinfo=UTC)
+    for invalid in ["2019366000000", "2020300246000", "202030001234", "2020y300d01h23m45s"]:
+        with pytest.raises(ValueError):
+            time_string2datetime(invalid)
+
+
+def test_vex_time_string2datetime():
+    assert vex_time_string2datetime("2020y300d01h23m45s") == datetime(2020, 10, 26, 1, 23, 45, tzinfo=UTC)
+    with pytest.raises(ValueError):
+        vex_time_string2datetime("2020300012345")
@@ -9,7 +9,7 @@ from VERAStatus.Server import FileStat
 from VERAStatus.Utility import UTC
 from VERAStatus.VERAStatus import ObservationInfo
 from VERAStatus.Vex import date_predicate, correct_names, extract_obs_info, \
-    vex_lines2observation_info, vex_time2datetime
+    vex_lines2observation_info, vex_time2datetime, split_lines_by_file
 
 
 @pytest.fixture
@@ -129,3 +129,88 @@ def test_vex_lines2observation_info(vex_dict_example1, vex_dict_example2):
 def test_vex_time2datetime():
     assert vex_time2datetime("2020y300d01h23m45s") == \
            datetime(2020, 10, 26, 1, 23, 45, tzinfo=UTC)
+
+
+def test_split_lines_by_file():
+    files = [p.PurePosixPath("/sched/r20300a.vex"), p.PurePosixPath("/sched/r20300b.vex")]
+    lines = ["/sched/r20300a.vex:     exper_name = r20300a;",
+             "/sched/r20300b.vex:     exper_name = r20300b;",
+             "/sched/r20300a.vex:     ref $IF = IF_Q:Vm:Vr:Vo:Vs;"]
+    assert split_lines_by_file(lines, files) == {
+        files[0]: ["     exper_name = r20300a;", "     ref $IF = IF_Q:Vm:Vr:Vo:Vs;"],
+        files[1]: ["     exper_name = r20300b;"]}
+
+
+def test_schedule_index(tmp_path, monkeypatch):
+    from paramiko import SFTPAttributes
+    import VERAStatus.ScheduleIndex as ScheduleIndex
+    from VERAStatus.Server import ServerSettings
+
+    def attributes(name, mtime, size):
+        file_stat = SFTPAttributes()
+        file_stat.filename, file_stat.st_mtime, file_stat.st_size = name, mtime, size
+        return file_stat
+
+    listing = [attributes("r20290a.vex", 100, 10), attributes("r20291b.vex", 100, 10),
+               attributes("r20292a.vex", 100, 10), attributes("r20291b.txt", 100, 10)]
+    parsed = []
+
+    def schedule_files2observation_info(server_settings, files, file_stats):
+        parsed.append([file.name for file in files])
+        return [ObservationInfo(file.name[:-4], "", datetime(2020, 10, 16, tzinfo=UTC),
+                                datetime(2020, 10, 16, tzinfo=UTC), "", "", "K",
+                                datetime.fromtimestamp(file_stat.st_mtime, tz=UTC))
+                for file, file_stat in zip(files, file_stats)]
+
+    monkeypatch.setattr(ScheduleIndex, "list_directory", lambda server_settings, directory: list(listing))
+    monkeypatch.setattr(ScheduleIndex, "schedule_files2observation_info", schedule_files2observation_info)
+    settings = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/schedule"))
+    index = ScheduleIndex.ScheduleIndex(settings, tmp_path / "schedule.index", refresh_interval=0.0)
+
+    observations = index.observations_between(date(2020, 10, 17), date(2020, 10, 19))
+    assert [observation.observation_ID for observation in observations] == ["r20291b", "r20292a"]
+    assert parsed == [["r20290a.vex", "r20291b.vex", "r20292a.vex"]]
+
+    listing[1] = attributes("r20291b.vex", 200, 12)
+    del listing[2]
+    assert [observation.observation_ID for observation in
+            index.observations_between(date(2020, 1, 1), date(2021, 1, 1))] == ["r20290a", "r20291b"]
+    assert parsed[1:] == [["r20291b.vex"]]
+
+    reloaded = ScheduleIndex.ScheduleIndex(settings, tmp_path / "schedule.index", refresh_interval=0.0)
+    assert reloaded.observations_between(date(2020, 10, 17), date(2020, 10, 18))[0].timestamp == \
+           datetime.fromtimestamp(200, tz=UTC)
+    assert len(parsed) == 2
+
+
+def test_schedule_index_skips_malformed_file(tmp_path, monkeypatch):
+    from paramiko import SFTPAttributes
+    import VERAStatus.ScheduleIndex as ScheduleIndex
+    from VERAStatus.Server import ServerSettings
+
+    def attributes(name, mtime, size):
+        file_stat = SFTPAttributes()
+        file_stat.filename, file_stat.st_mtime, file_stat.st_size = name, mtime, size
+        return file_stat
+
+    listing = [attributes("r20290a.vex", 100, 10), attributes("r20291b.vex", 100, 10)]
+    parsed = []
+
+    def schedule_files2observation_info(server_settings, files, file_stats):
+        parsed.append([file.name for file in files])
+        if any(file.name == "r20291b.vex" for file in files):
+            raise KeyError("exper_nominal_start")
+        return [ObservationInfo(file.name[:-4], "", datetime(2020, 10, 16, tzinfo=UTC),
+                                datetime(2020, 10, 16, tzinfo=UTC), "", "", "K",
+                                datetime.fromtimestamp(file_stat.st_mtime, tz=UTC))
+                for file, file_stat in zip(files, file_stats)]
+
+    monkeypatch.setattr(ScheduleIndex, "list_directory", lambda server_settings, directory: list(listing))
+    monkeypatch.setattr(ScheduleIndex, "schedule_files2observation_info", schedule_files2observation_info)
+    settings = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/schedule"))
+    index = ScheduleIndex.ScheduleIndex(settings, tmp_path / "schedule.index", refresh_interval=0.0)
+    assert [observation.observation_ID for observation in
+            index.observations_between(date(2020, 1, 1), date(2021, 1, 1))] == ["r20290a"]
+    assert parsed == [["r20290a.vex", "r20291b.vex"], ["r20290a.vex"], ["r20291b.vex"]]
+    index.observations_between(date(2020, 1, 1), date(2021, 1, 1))
+    assert len(parsed) == 3
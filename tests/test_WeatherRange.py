@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+import pathlib as p
+
+from VERAStatus import Weather as Weather_
+from VERAStatus.Cache import DayCache
+from VERAStatus.Server import ServerSettings
+from VERAStatus.Utility import UTC
+from VERAStatus.VERAStatus import Weather
+from VERAStatus.Weather import join_weather, require_weather_at, require_weather_between
+
+
+def weather_at(date_time, temperature=10.0):
+    return Weather(date_time, 1.0, 1.0, 2.0, 2.0, 90.0, temperature, temperature, 50.0, 50.0, 1000.0, False,
+                   0.0, 0.0)
+
+
+def test_join_weather_nearest():
+    day = datetime(2020, 10, 26, tzinfo=UTC)
+    weather_list = [weather_at(day + timedelta(seconds=second), second) for second in (0, 10, 20, 60)]
+    joined = join_weather([day + timedelta(seconds=second) for second in (4, 6, 20, 40, 100)], weather_list,
+                          timedelta(seconds=30))
+    assert [None if weather is None else weather.temperature1 for weather in joined] == [0, 10, 20, 20, None]
+    interpolated = join_weather([day + timedelta(seconds=5)], weather_list, timedelta(seconds=30), True)
+    assert interpolated[0].temperature1 == 5.0 and interpolated[0].date_time == day + timedelta(seconds=5)
+
+
+def test_require_weather_at_midnight(monkeypatch, tmp_path):
+    requests = []
+
+    def fetch_weather_between(server_settings, date_from, date_until):
+        requests.append((date_from, date_until))
+        weather_list = []
+        date_time = date_from
+        while date_time <= date_until:
+            weather_list.append(weather_at(date_time))
+            date_time += timedelta(seconds=10)
+        return weather_list
+
+    monkeypatch.setattr(Weather_, "fetch_weather_between", fetch_weather_between)
+    monkeypatch.setattr(Weather_, "day_cache", DayCache(tmp_path))
+    settings = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/schedule"))
+    day = datetime(2020, 10, 26, tzinfo=UTC)
+    times = [day + timedelta(seconds=10), day + timedelta(hours=12)]
+    assert [weather.date_time for weather in require_weather_at(settings, times)] == times
+    assert requests == [(day - timedelta(seconds=20), day - timedelta(seconds=1)),
+                        (day, day + timedelta(days=1, seconds=-1))]
+    requests.clear()
+    assert [weather.date_time for weather in require_weather_at(settings, times)] == times
+    assert requests == [(day - timedelta(seconds=20), day - timedelta(seconds=1))]
+
+
+def test_require_weather_day_does_not_cache_empty(monkeypatch, tmp_path):
+    requests = []
+
+    def fetch_weather_between(server_settings, date_from, date_until):
+        requests.append((date_from, date_until))
+        return []
+
+    monkeypatch.setattr(Weather_, "fetch_weather_between", fetch_weather_between)
+    monkeypatch.setattr(Weather_, "day_cache", DayCache(tmp_path))
+    settings = ServerSettings("192.168.1.1", 22, "username", "pass_word", p.PurePosixPath("/schedule"))
+    day = datetime(2020, 10, 26, tzinfo=UTC)
+    whole_day = (day, day + timedelta(days=1, seconds=-1))
+    assert require_weather_between(settings, *whole_day) == []
+    assert require_weather_between(settings, *whole_day) == []
+    assert requests == [whole_day, whole_day]
@@ -2,13 +2,19 @@
     vfsinfo.py : test for vfs data acquisition
 
 Usage:
-    vfsinfo.py [-d YYYYJJJ | --date YYYYJJJ] [-s file | --setting file]
+    vfsinfo.py [-d YYYYJJJ | --date YYYYJJJ | --from YYYYJJJ [--until YYYYJJJ]] [-s file | --setting file]
+               [--stations NAMES [--station-timeout SECONDS]]
 
     vfsinfo.py -h | --help
 
 Options:
     -d, --date YYYYJJJ  : doy JJJ in year YYYY for data acquisition.
+    --from YYYYJJJ      : the first day of the range for data acquisition.
+    --until YYYYJJJ     : the last day (inclusive) of the range. Defaults to the --from day.
     -s, --setting file     : the path to the setting file
+    --stations NAMES    : comma-separated station names in the "stations" section of the setting file,
+                          or "all". The stations are queried concurrently.
+    --station-timeout SECONDS : timeout of the query for each station.
     -h --help          : Show this screen and exit.
 
 """
@@ -18,17 +24,18 @@ import dataclasses
 from datetime import datetime
 import pathlib as p
 import sys
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from docopt import docopt
-from schema import Schema, And, Use, Or, SchemaError
+from schema import Schema, And, Use, Or, Optional as OptionalKey, SchemaError
 
 import VERAStatus.Schedule as Sched
 import VERAStatus.SecZ as SecZ
-from VERAStatus.Query import get_status_today_synchronous
-from VERAStatus.Server import ServerSettings, server_settings_dict2settings
-from VERAStatus.Utility import DataReadError, read_json, Error
-from VERAStatus.VERAStatus import VERAStatus
+from VERAStatus.Query import get_status_between, get_status_today, get_station_statuses
+from VERAStatus.Server import ServerSettings, server_settings_dict2settings, station_settings_dict2settings
+from VERAStatus.Utility import DataReadError, read_json, Error, incremented_day, UsageError, \
+    datetime2doy_string, doy_string2datetime
+from VERAStatus.VERAStatus import VERAStatus, StationStatus
 
 
 def main() -> None:
@@ -37,11 +44,16 @@ def main() -> None:
     """
     try:
         options: Options = read_options()
+        if options.stations is not None:
+            if not display_stations(options):
+                sys.exit(1)
+            return
         server_setting: ServerSettings = \
             server_settings_dict2settings(read_json(options.setting_file)["VLBI"])
-        today: datetime = options.date
-        # # info = q.get_status_today(today)
-        status: VERAStatus = get_status_today_synchronous(today, server_setting)
+        if options.date_until is None:
+            status: VERAStatus = get_status_today(options.date, server_setting)
+        else:
+            status = get_status_between(options.date, incremented_day(options.date_until), server_setting)
 
         Sched.display_schedule(status.observations)
         SecZ.display_secz(status.secZ_list)
@@ -51,13 +63,47 @@ def main() -> None:
         sys.exit(1)
 
 
+def display_stations(options: Options) -> bool:
+    """
+    複数局の状態を並行して取得し、局ごとにディスプレイ出力
+    Args:
+        options(Options): オプション設定
+
+    Returns:
+        すべての局で取得に成功すればTrue(bool)
+    """
+    all_stations: Dict[str, ServerSettings] = station_settings_dict2settings(read_json(options.setting_file))
+    names: List[str] = list(all_stations) if options.stations == ["all"] else options.stations
+    unknown: List[str] = [name for name in names if name not in all_stations]
+    if len(unknown) > 0:
+        raise UsageError(f"The stations {', '.join(unknown)} are not in the setting file {options.setting_file}.")
+    date_from: datetime = doy_string2datetime(datetime2doy_string(options.date))
+    date_until: datetime = incremented_day(
+        date_from if options.date_until is None else options.date_until)
+    statuses: Dict[str, StationStatus] = get_station_statuses(
+        date_from, date_until, {name: all_stations[name] for name in names},
+        station_timeout=options.station_timeout)
+    for name in names:
+        print(f'###########\n  {name}\n###########')
+        station_status: StationStatus = statuses[name]
+        if not station_status.succeeded:
+            print(station_status.error)
+            continue
+        Sched.display_schedule(station_status.status.observations)
+        SecZ.display_secz(station_status.status.secZ_list)
+    return all(station_status.succeeded for station_status in statuses.values())
+
+
 @dataclasses.dataclass
 class Options:
     """
     オプション格納
     """
-    date: datetime  # 観測情報取得日
+    date: datetime  # 観測情報取得日(期間指定では開始日)
     setting_file: p.Path
+    date_until: Optional[datetime] = None  # 期間指定の最終日(含む)。1日だけならNone。
+    stations: Optional[List[str]] = None  # 局名リスト。1局だけならNone。
+    station_timeout: Optional[float] = None  # 局ごとのタイムアウト秒数
 
 
 def read_options() -> Options:
@@ -72,6 +118,17 @@ def read_options() -> Options:
         "--date": Or(None, And(Use(lambda s: datetime.strptime(s + "+0000", "%Y%j%z"),
                                    error=f"The specified date {args['--date']}"
                                          + f" is not in YYYYJJJ form.\n"))),
+        "--from": Or(None, And(Use(lambda s: datetime.strptime(s + "+0000", "%Y%j%z"),
+                                   error=f"The specified date {args['--from']}"
+                                         + " is not in YYYYJJJ form.\n"))),
+        "--until": Or(None, And(Use(lambda s: datetime.strptime(s + "+0000", "%Y%j%z"),
+                                    error=f"The specified date {args['--until']}"
+                                          + " is not in YYYYJJJ form.\n"))),
+        "--stations": Or(None, Use(lambda s: [name.strip() for name in s.split(",") if name.strip() != ""])),
+        "--station-timeout": Or(None, And(Use(float), lambda seconds: seconds > 0,
+                                          error=f"The station timeout {args['--station-timeout']}"
+                                                + " is not a positive number.\n")),
+        OptionalKey("--help"): bool,
         "--setting": Or(None, And(Use(p.Path), lambda path: path.is_file(),
                                   error=f"The specified file {args['--setting']}"
                                         + " does not exist.\n")),
@@ -79,6 +136,13 @@ def read_options() -> Options:
 
     try:
         args = schema.validate(args)
+        if args["--from"] is not None:
+            args["--date"] = args["--from"]
+            if args["--until"] is None:
+                args["--until"] = args["--from"]
+            if args["--until"] < args["--from"]:
+                print(f"The last day {args['--until']:%Y%j} precedes the first day {args['--from']:%Y%j}.")
+                exit(1)
         if args["--date"] is None:
             args["--date"] = datetime.utcnow()
         if args["--setting"] is None:
@@ -91,7 +155,8 @@ def read_options() -> Options:
         print(e.args[0])
         exit(1)
 
-    return Options(args["--date"], args["--setting"])
+    return Options(args["--date"], args["--setting"], args["--until"], args["--stations"],
+                   args["--station-timeout"])
 
 
 if __name__ == '__main__':